@@ -0,0 +1,247 @@
+# -*- coding:utf-8 -*-
+
+"""Local stand-in of the file upload API of BloodHound CE, to test the uploads without an instance.
+
+It implements the endpoints used by IDMHound (start a job, upload a file to it, end it), checks the signature of each
+request against a known API token, or its JWT, and can answer some of the uploads with a server error to exercise the
+retries. The files uploaded are kept in memory, by job.
+
+With --check, it runs the upload of a synthetic realm split into chunks against itself, with failures injected, and
+checks that every request was signed, that the failed uploads were retried and that the chunks uploaded hold exactly
+the nodes and edges of the Opengraph file written locally.
+
+    python -m benchmarks.bloodhound --port 8080
+    python -m benchmarks.bloodhound --check --size 5000 --fail-every 3
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.realm import generate, scale
+from idmhound.collectors import ldap
+from idmhound.graph.output import OutputOptions
+from idmhound.graph.upload import BloodHoundClient, Uploader
+from idmhound.graph.utils import save_opengraph
+
+# API token accepted by default.
+TOKEN_ID, TOKEN_KEY = "00000000-0000-4000-b000-000000000001", "idmhound-stand-in-key"
+
+# Largest difference between the date of a signed request and the clock of the stand-in.
+MAX_SKEW = timedelta(hours=1)
+
+
+def signature(key: str, method: str, uri: str, date: str, body: bytes) -> str:
+    """Compute the signature of a request, as the BloodHound API does: the key signs the request, then the hour of the
+    request date, then the body.
+    :return: signature, base64 encoded."""
+
+    digester = hmac.new(key.encode(), f"{method}{uri}".encode(), hashlib.sha256)
+    digester = hmac.new(digester.digest(), date[:13].encode(), hashlib.sha256)
+    digester = hmac.new(digester.digest(), body, hashlib.sha256)
+    return base64.b64encode(digester.digest()).decode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answer the requests of the file upload API, over persistent connections."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args):
+
+        pass
+
+    def reply(self, status: int, document: dict = None):
+        """Send a response with a JSON body."""
+
+        body = json.dumps(document).encode() if document is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authenticated(self, body: bytes) -> bool:
+        """Check the JWT or the signature of the request."""
+
+        authorization = self.headers.get("Authorization", "")
+        if self.server.jwt and authorization == f"Bearer {self.server.jwt}":
+            return True
+        if authorization != f"bhesignature {self.server.token_id}":
+            return False
+        date = self.headers.get("RequestDate", "")
+        try:
+            if abs(datetime.now().astimezone() - datetime.fromisoformat(date)) > MAX_SKEW:
+                return False
+        except ValueError:
+            return False
+        expected = signature(self.server.token_key, self.command, self.path, date, body)
+        return hmac.compare_digest(expected, self.headers.get("Signature", ""))
+
+    def do_POST(self):
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+        if not self.authenticated(body):
+            with server.lock:
+                server.stats["rejected"] += 1
+            return self.reply(401, {"errors": [{"message": "invalid signature"}]})
+
+        parts = self.path.split("/")
+        if self.path == "/api/v2/file-upload/start":
+            with server.lock:
+                job = len(server.jobs) + 1
+                server.jobs[job] = {"files": [], "ended": False}
+            return self.reply(201, {"data": {"id": job}})
+        if len(parts) < 5 or parts[:4] != ["", "api", "v2", "file-upload"] or not parts[4].isdigit():
+            return self.reply(404, {"errors": [{"message": "not found"}]})
+        job = server.jobs.get(int(parts[4]))
+        if job is None or job["ended"]:
+            return self.reply(400, {"errors": [{"message": "unknown or ended job"}]})
+        if len(parts) == 6 and parts[5] == "end":
+            job["ended"] = True
+            return self.reply(200)
+        if len(parts) != 5:
+            return self.reply(404, {"errors": [{"message": "not found"}]})
+
+        with server.lock:
+            server.stats["uploads"] += 1
+            failing = server.fail_every > 0 and server.stats["uploads"] % server.fail_every == 0
+            if failing:
+                server.stats["failed"] += 1
+        if failing:
+            return self.reply(503, {"errors": [{"message": "injected failure"}]})
+        try:
+            document = json.loads(body)
+        except ValueError:
+            return self.reply(400, {"errors": [{"message": "invalid JSON"}]})
+        with server.lock:
+            job["files"].append(document)
+        self.reply(202)
+
+
+class Server(ThreadingHTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int, token_id: str = TOKEN_ID, token_key: str = TOKEN_KEY, jwt: str = "",
+                 fail_every: int = 0):
+
+        super().__init__(("127.0.0.1", port), Handler)
+        self.token_id = token_id
+        self.token_key = token_key
+        self.jwt = jwt
+        self.fail_every = fail_every
+        self.jobs = {}
+        self.stats = {"requests": 0, "rejected": 0, "uploads": 0, "failed": 0}
+        self.lock = threading.Lock()
+
+    def url(self) -> str:
+        """Returns the URL of the stand-in."""
+
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def start(port: int = 0, fail_every: int = 0) -> Server:
+    """Start the stand-in in a thread.
+    :param port: port to listen on, 0 for any free port.
+    :param fail_every: answer every n-th upload with a server error, 0 to never fail.
+    :return: server, running."""
+
+    server = Server(port, fail_every=fail_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def graph_of(documents: list) -> tuple[set, set]:
+    """Returns the IDs of the nodes and the keys of the edges of Opengraph documents."""
+
+    nodes, edges = set(), set()
+    for document in documents:
+        graph = document["graph"]
+        nodes.update(node["id"] for node in graph["nodes"])
+        edges.update((edge["kind"], edge["start"]["value"], edge["end"]["value"]) for edge in graph["edges"])
+    return nodes, edges
+
+
+def check(size: int, chunk_items: int, fail_every: int, workers: int) -> bool:
+    """Upload a synthetic realm to the stand-in and check the requests and the files received.
+    :param size: number of entries of the synthetic realm.
+    :param chunk_items: number of nodes or edges per uploaded document.
+    :param fail_every: answer every n-th upload with a server error.
+    :param workers: number of concurrent uploads.
+    :return: True if all the checks passed."""
+
+    model = ldap.parse_model(generate("lab.lo", **scale(size), allow_all=False), "lab.lo",
+                             "S-1-5-21-3623811015-3361044348-30300820")
+    model.resolve()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "idmhound.json")
+        save_opengraph(path, *model.opengraph())
+        with open(path) as local:
+            expected = graph_of([json.load(local)])
+
+    server = start(fail_every=fail_every)
+    client = BloodHoundClient(server.url(), TOKEN_ID, TOKEN_KEY, retries=3, backoff=0.01)
+    with Uploader(client, workers) as uploader:
+        save_opengraph("idmhound.json", *model.opengraph(), OutputOptions(max_items=chunk_items, uploader=uploader))
+
+    files = [document for job in server.jobs.values() for document in job["files"]]
+    received = graph_of(files)
+    results = [("requests signed", server.stats["rejected"] == 0),
+               ("failed uploads injected", server.stats["failed"] > 0 or fail_every == 0),
+               ("jobs ended", all(job["ended"] for job in server.jobs.values())),
+               ("documents split into chunks", len(files) > 1),
+               ("chunks within the size", all(len(document["graph"]["nodes"]) + len(document["graph"]["edges"])
+                                             <= chunk_items for document in files)),
+               ("nodes uploaded", received[0] == expected[0]),
+               ("edges uploaded", received[1] == expected[1])]
+
+    # A request signed with another key is rejected without being retried.
+    rejected = server.stats["rejected"]
+    try:
+        BloodHoundClient(server.url(), TOKEN_ID, "wrong-key", retries=3, backoff=0.01).start()
+        results.append(("wrong key rejected", False))
+    except ConnectionError:
+        results.append(("wrong key rejected", server.stats["rejected"] == rejected + 1))
+    server.shutdown()
+
+    print(f"{len(expected[0])} nodes and {len(expected[1])} edges uploaded in {len(files)} documents, "
+          f"{server.stats['requests']} requests, {server.stats['failed']} uploads failed and retried.")
+    for name, passed in results:
+        print(f"{name:<30} {'ok' if passed else 'FAILED'}")
+    return all(passed for _, passed in results)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Serve a stand-in of the BloodHound CE file upload API.")
+    parser.add_argument("-p", "--port", action="store", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument("--fail-every", action="store", type=int, default=0, help="Answer every n-th upload with a server error, 0 to never fail.")
+    parser.add_argument("--check", action="store_true", default=False, help="Upload a synthetic realm to the stand-in and check what it received.")
+    parser.add_argument("-s", "--size", action="store", type=int, default=5000, help="Number of entries of the synthetic realm, with --check.")
+    parser.add_argument("--chunk-items", action="store", type=int, default=2000, help="Number of nodes or edges per uploaded document, with --check.")
+    parser.add_argument("--upload-workers", action="store", type=int, default=2, help="Number of concurrent uploads, with --check.")
+    args = parser.parse_args()
+
+    if args.check:
+        logging.disable(logging.WARNING)
+        sys.exit(0 if check(args.size, args.chunk_items, args.fail_every or 3, args.upload_workers) else 1)
+    server = start(args.port, args.fail_every)
+    print(f"Serving the BloodHound upload API on {server.url()}, token ID {TOKEN_ID} and key {TOKEN_KEY}.")
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# -*- coding:utf-8 -*-
+
+"""Benchmark of the memory retained by the parsed nodes and edges.
+
+Each entry of the synthetic realm gets its own copy of its strings, as when they are decoded from the wire, and the
+entries are released once parsed. The memory still allocated afterwards is the memory held by the parsed objects.
+--baseline measures the same resolved objects stored the way they were before the nodes packed their attributes: a
+dictionary per object, a string per attribute, and the members and edges holding the IDs of their nodes.
+
+    python -m benchmarks.memory --size 1000000
+    python -m benchmarks.memory --size 1000000 --baseline
+"""
+
+import gc
+import pickle
+import argparse
+import logging
+import tracemalloc
+from benchmarks.realm import generate, scale
+from idmhound.collectors import ldap
+from idmhound.graph.edges import Edges
+from idmhound.graph.index import Field
+from idmhound.graph.utils import DNIndex, member_lookup
+
+
+class Plain():
+    """Node or edge holding its attributes in a per-instance dictionary."""
+
+    # Classes of the rebuilt objects, by class of the parsed object, so that the dictionaries of the objects of a same
+    # class share their keys.
+    classes = {}
+
+    @classmethod
+    def of(cls, realm_object, attributes: dict) -> "Plain":
+        """Build the object of the class matching a parsed object.
+        :param realm_object: parsed object.
+        :param attributes: attributes of the object.
+        :return: rebuilt object."""
+
+        if type(realm_object) not in cls.classes:
+            cls.classes[type(realm_object)] = type(type(realm_object).__name__, (cls,), {})
+        rebuilt = cls.classes[type(realm_object)]()
+        for name, value in attributes.items():
+            setattr(rebuilt, name, value)
+        return rebuilt
+
+
+def copy(value: str) -> str:
+    """Returns a copy of a string, as held by an object built from its own LDAP entry."""
+
+    return value.encode().decode()
+
+
+def plain(realm_object, ids: dict) -> Plain:
+    """Rebuild a parsed object with a string per attribute, its members and its start and end nodes being the IDs of the
+    rebuilt nodes.
+    :param realm_object: parsed node or edge.
+    :param ids: IDs of the rebuilt nodes, by parsed node.
+    :return: rebuilt object."""
+
+    if isinstance(realm_object, Edges):
+        return Plain.of(realm_object, {"ipaUniqueID": copy(str(realm_object.ipaUniqueID)), "desc": "",
+                                       "kinds": [copy(kind) for kind in realm_object.kinds],
+                                       "starts": [ids[node] for node in realm_object.starts],
+                                       "ends": [ids[node] for node in realm_object.ends]})
+    names = [name for cls in reversed(type(realm_object).__mro__) for name, attribute in vars(cls).items()
+             if isinstance(attribute, Field) and name != "rdn"]
+    # The domain SID is the same string for all the nodes.
+    attributes = {"dn": copy(realm_object.get_dn()), "domainsid": realm_object.domainsid,
+                  "enabled": realm_object.enabled} | {name: copy(getattr(realm_object, name)) for name in names}
+    attributes["ipaUniqueID"] = ids[realm_object]
+    if hasattr(realm_object, "member"):
+        # The members of the HBAC service and sudo command groups are names.
+        attributes["member"] = [copy(node) if isinstance(node, str) else ids[node] for node in realm_object.member]
+    if hasattr(realm_object, "spn"):
+        attributes["spn"] = [copy(spn) for spn in realm_object.spn]
+        attributes["hasspn"] = realm_object.hasspn
+    return Plain.of(realm_object, attributes)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the memory retained by the parsed objects.")
+    parser.add_argument("-s", "--size", action="store", type=int, default=1000000, help="Number of entries of the synthetic realm.")
+    parser.add_argument("-d", "--domain", action="store", default="lab.lo", help="Name of the synthetic realm.")
+    parser.add_argument("-l", "--legacy", action="store_true", default=False, help="Measure the legacy parser.")
+    parser.add_argument("-b", "--both-formats", action="store_true", default=False, help="Measure the model of both formats, legacy nodes included.")
+    parser.add_argument("--baseline", action="store_true", default=False, help="Measure the parsed objects stored with a dictionary and a string per attribute.")
+    args = parser.parse_args()
+    if args.baseline and args.both_formats:
+        parser.error("--baseline cannot be used with --both-formats")
+    logging.disable(logging.INFO)
+
+    records = [pickle.dumps(entry) for entry in generate(args.domain, **scale(args.size))]
+    gc.collect()
+    tracemalloc.start()
+    entries = (pickle.loads(record) for record in records)
+    sid = "S-1-5-21-3623811015-3361044348-30300820"
+    if args.both_formats:
+        model = ldap.parse_model(entries, args.domain, sid)
+        index = model.resolve()
+        legacy = model.legacy()
+        parsed = [*model.opengraph(), *legacy[:4]]
+    elif args.legacy:
+        parsed = ldap.legacy_parse(entries, args.domain, sid)
+        domains, users, groups, computers, hbac, sudoer, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = parsed
+        index = DNIndex(users + computers + groups + hbacservices + hbacservicesgroups + sudocmds + sudocmdgroups)
+        for subjects in (groups, hbacservicesgroups, hbac, sudocmdgroups, sudoer):
+            member_lookup(index, subjects)
+    else:
+        parsed = ldap.parse(entries, args.domain, sid)
+        domains, users, groups, computers, hbac, sudoer, membership, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = parsed
+        index = DNIndex(users + computers + groups + hbacservices + hbacservicesgroups + sudocmds + sudocmdgroups)
+        for subjects in (groups, membership, hbacservicesgroups, hbac, sudocmdgroups, sudoer):
+            member_lookup(index, subjects)
+    del index
+    if args.baseline:
+        # The members and the edges reference the IDs of the rebuilt nodes.
+        ids = {realm_object: copy(realm_object.get_id()) for objects in parsed for realm_object in objects
+               if not isinstance(realm_object, Edges)}
+        parsed = [[plain(realm_object, ids) for realm_object in objects] for objects in parsed]
+        del ids
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    objects = sum(len(objects) for objects in parsed)
+    print(f"Synthetic realm of {len(records)} entries, {objects} parsed objects.")
+    print(f"Retained memory: {current / 2 ** 20:,.1f} MiB, {current / objects:,.0f} bytes per object.")
+    print(f"Peak memory:     {peak / 2 ** 20:,.1f} MiB.")
+
+
+if __name__ == "__main__":
+    main()
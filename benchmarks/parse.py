@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+
+"""Micro-benchmark of the classification of the LDAP entries.
+
+Compares the former cascade of regular expressions, which rebuilt the attributes dictionary of the entry for each
+branch, with the single-pass classifier of the parser.
+
+    python -m benchmarks.parse --size 500000
+"""
+
+import re
+import time
+import argparse
+import logging
+from benchmarks.realm import entries, generate, scale
+from idmhound.collectors import ldap
+
+
+def cascade(entry, ldap_realm: str) -> str | None:
+    """Classify an entry the way the parser used to, for comparison.
+    :param entry: LDAP entry.
+    :param ldap_realm: realm as a DN suffix.
+    :return: type of the entry."""
+
+    dn = entry.entry_dn
+    if re.match(f"cn=.+,cn=ad,cn=etc{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaNTDomainGUID", "ipaNTFlatName"]):
+        return "domain"
+    elif re.match(f"uid=.+,cn=users,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID"]):
+        return "user"
+    elif re.match(f"cn=.+,cn=(hostgroups|groups),cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
+        return "group"
+    elif re.match(f"fqdn=.+,cn=computers,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"]):
+        return "computer"
+    elif re.match(f"ipaUniqueID=.+,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(entry["ipaEnabledFlag"]) == "True":
+        return "hbac"
+    elif re.match(f"ipaUniqueID=.+,cn=sudorules,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(entry["ipaEnabledFlag"]) == "True":
+        return "sudorule"
+    elif re.match(f"krbprincipalname=.+,cn=services,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["krbPrincipalName", "managedBy"]):
+        return "service"
+    elif re.match(f"cn=.+,cn=hbacservicegroups,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
+        return "hbacservicegroup"
+    elif re.match(f"cn=.+,cn=hbacservices,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID"]):
+        return "hbacservice"
+    elif re.match(f"cn=.+,cn=sudocmdgroups,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
+        return "sudocmdgroup"
+    elif re.match(f"ipaUniqueID=.+,cn=sudocmds,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["sudoCmd", "ipaUniqueID"]):
+        return "sudocmd"
+    return None
+
+
+def single_pass(entry, ldap_realm: str) -> str | None:
+    """Classify an entry with the classifier of the parser, reading the attributes once.
+    :param entry: LDAP entry.
+    :param ldap_realm: realm as a DN suffix.
+    :return: type of the entry."""
+
+    kind = ldap.classify(entry.entry_dn, ldap_realm)
+    if kind is not None:
+        entry.entry_attributes_as_dict
+    return kind
+
+
+def measure(function, data: list, *args) -> float:
+    """Run a function on every entry and measure the throughput.
+    :param function: function to run.
+    :param data: list of entries.
+    :return: entries per second."""
+
+    start = time.perf_counter()
+    for entry in data:
+        function(entry, *args)
+    return len(data) / (time.perf_counter() - start)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the classification of the LDAP entries.")
+    parser.add_argument("-s", "--size", action="store", type=int, default=500000, help="Number of entries of the synthetic realm.")
+    parser.add_argument("-d", "--domain", action="store", default="lab.lo", help="Name of the synthetic realm.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    data = entries(args.size, args.domain)
+    ldap_realm = "".join([",dc=" + dc for dc in args.domain.split(".")])
+    print(f"Synthetic realm of {len(data)} entries.")
+    print(f"Regex cascade:       {measure(cascade, data, ldap_realm):>12,.0f} entries/s")
+    print(f"Single-pass:         {measure(single_pass, data, ldap_realm):>12,.0f} entries/s")
+
+    # The parsers read the (DN, attributes) tuples of the search responses, not the ldap3-like entries.
+    records = generate(args.domain, **scale(args.size))
+    for name, function in [("parse", ldap.parse), ("legacy_parse", ldap.legacy_parse)]:
+        start = time.perf_counter()
+        function(records, args.domain, "S-1-5-21-3623811015-3361044348-30300820")
+        print(f"{name + ':':<20} {len(data) / (time.perf_counter() - start):>12,.0f} entries/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding:utf-8 -*-
+
+"""Benchmark of the offline path queries.
+
+Parses a synthetic realm, builds its path graph and times shortest path, reachability and reverse reachability
+queries between random users, groups and hosts. The rules applying to all users and all hosts of the synthetic realm
+produce millions of edges from a few hundred thousand entries.
+
+    python -m benchmarks.paths --size 20000 --allow-all
+"""
+
+import time
+import random
+import argparse
+import logging
+import statistics
+from benchmarks.realm import generate, scale
+from idmhound.collectors import ldap
+from idmhound.graph.closure import effective_membership
+from idmhound.graph.paths import parsed_graph
+
+
+def measure(query, arguments: list) -> tuple[float, float, float]:
+    """Run a query on each set of arguments and measure its latency.
+    :param query: query to run.
+    :param arguments: arguments of each run.
+    :return: median, 95th percentile and maximum latency, in milliseconds."""
+
+    latencies = []
+    for args in arguments:
+        start = time.perf_counter()
+        query(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95)], latencies[-1]
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the offline path queries.")
+    parser.add_argument("-s", "--size", action="store", type=int, default=20000, help="Number of entries of the synthetic realm.")
+    parser.add_argument("-d", "--domain", action="store", default="lab.lo", help="Name of the synthetic realm.")
+    parser.add_argument("-q", "--queries", action="store", type=int, default=200, help="Number of queries of each type.")
+    parser.add_argument("-e", "--effective-membership", action="store_true", default=False, help="Add the EffectiveMemberOf edges.")
+    parser.add_argument("--allow-all", action="store_true", default=False, help="Include rules applying to all users and all hosts.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    model = ldap.parse_model(generate(args.domain, **scale(args.size), allow_all=args.allow_all), args.domain,
+                             "S-1-5-21-3623811015-3361044348-30300820")
+    model.resolve()
+    effective = []
+    if args.effective_membership:
+        effective = effective_membership(model.groups)
+    start = time.perf_counter()
+    graph = parsed_graph(*model.opengraph(effective))
+    print(f"Synthetic realm of {args.size} entries: {len(graph)} nodes, {graph.edge_count()} edges traversed.")
+    print(f"Build:               {time.perf_counter() - start:>10.2f} s")
+
+    random.seed(0)
+    users = [user.get_id() for user in random.choices(model.users, k=args.queries)]
+    hosts = [computer.get_id() for computer in random.choices(model.computers, k=args.queries)]
+    groups = [group.get_id() for group in random.choices(model.groups, k=args.queries)]
+    print(f"{'Query':<20} {'median':>10} {'p95':>10} {'max':>10}")
+    for name, query, arguments in [("path user -> host", graph.shortest_path, list(zip(users, hosts))),
+                                   ("reach user", graph.reachable, [(user,) for user in users]),
+                                   ("who group", graph.reaching, [(group, ["User"]) for group in groups]),
+                                   ("who host", graph.reaching, [(host, ["User"]) for host in hosts])]:
+        print(f"{name:<20} " + " ".join(f"{latency:>7.2f} ms" for latency in measure(query, arguments)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# -*- coding:utf-8 -*-
+
+"""Synthetic FreeIPA / Red Hat IdM realm used by the benchmarks."""
+
+import random
+from copy import deepcopy
+from datetime import datetime
+
+
+class Attribute():
+    """Mimics an ldap3 attribute of an entry."""
+
+    def __init__(self, key: str, values: list):
+        self.key = key
+        self.values = values
+
+    @property
+    def value(self):
+        return self.values[0] if len(self.values) == 1 else self.values
+
+    def __str__(self):
+        return str(self.values[0]) if len(self.values) == 1 else str(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __eq__(self, other):
+        return self.value == other
+
+
+class Entry():
+    """Mimics an ldap3 entry, including the copy of the attributes made by entry_attributes_as_dict."""
+
+    def __init__(self, dn: str, attributes: dict):
+        self.entry_dn = dn
+        self.attributes = attributes
+
+    @property
+    def entry_attributes_as_dict(self) -> dict:
+        return dict((key, deepcopy(values)) for key, values in self.attributes.items())
+
+    def __getitem__(self, item: str) -> Attribute:
+        for key, values in self.attributes.items():
+            if key.lower() == item.lower():
+                return Attribute(key, values)
+        raise KeyError(item)
+
+
+def scale(size: int) -> dict:
+    """Split a number of entries between the types of objects, in proportions close to a production realm.
+    :param size: approximate number of entries of the realm.
+    :return: keyword arguments of generate."""
+
+    counts = {"groups": max(1, int(size * 0.05)), "computers": max(1, int(size * 0.15)),
+              "hostgroups": max(1, int(size * 0.01)), "services": int(size * 0.07),
+              "hbac": max(2, int(size * 0.005)), "sudorules": max(2, int(size * 0.005)),
+              "sudocmds": max(1, int(size * 0.005))}
+    return counts | {"users": max(1, size - sum(counts.values()))}
+
+
+def generate(realm: str = "lab.lo", users: int = 700, groups: int = 50, computers: int = 150, hostgroups: int = 10,
+             services: int = 70, hbac: int = 5, sudorules: int = 5, sudocmds: int = 5, seed: int = 0,
+             allow_all: bool = True) -> list:
+    """Generate the entries of a synthetic realm.
+    Groups and hostgroups are nested, HBAC and sudo rules use both members and "all" categories.
+    :param realm: name of the realm.
+    :param users: number of users.
+    :param groups: number of user groups.
+    :param computers: number of computers.
+    :param hostgroups: number of hostgroups.
+    :param services: number of services.
+    :param hbac: number of HBAC rules.
+    :param sudorules: number of sudo rules.
+    :param sudocmds: number of sudo commands.
+    :param seed: seed of the random generator.
+    :param allow_all: make the first HBAC and sudo rules apply to all users and all hosts, like allow_all. The number of
+    edges is then quadratic in the size of the realm, otherwise each category is combined with a few members.
+    :return: list of (DN, attributes) tuples."""
+
+    rand = random.Random(seed)
+    base = ",".join("dc=" + dc for dc in realm.split("."))
+    sid = "S-1-5-21-3623811015-3361044348-30300820"
+    flat_name = realm.split(".")[0].upper()
+    krb_realm = realm.upper()
+    now = datetime(2026, 1, 1)
+    entries = [(f"cn={realm},cn=ad,cn=etc,{base}", {"cn": [realm], "ipaNTDomainGUID": ["6a1f8e8e-0000-4000-8000-000000000001"],
+                                                     "ipaNTFlatName": [flat_name], "ipaNTSecurityIdentifier": [sid]})]
+
+    user_dns = []
+    for i in range(users):
+        dn = f"uid=user{i},cn=users,cn=accounts,{base}"
+        user_dns.append(dn)
+        attributes = {"uid": [f"user{i}"], "cn": [f"User {i}"], "gecos": [f"User {i}"], "sn": [f"{i}"],
+                      "homeDirectory": [f"/home/user{i}"], "loginShell": ["/bin/bash"], "uidNumber": [100000 + i],
+                      "ipaUniqueID": [f"00000000-0000-4000-8000-{i:012d}"],
+                      "ipaNTSecurityIdentifier": [f"{sid}-{1000 + i}"],
+                      "krbCanonicalName": [f"user{i}@{krb_realm}"], "krbPrincipalName": [f"user{i}@{krb_realm}"]}
+        if i % 10:
+            attributes["krbLastPwdChange"] = [now]
+        if i % 5 == 0:
+            attributes["description"] = [f"Synthetic user {i}"]
+        entries.append((dn, attributes))
+
+    computer_dns = []
+    for i in range(computers):
+        fqdn = f"host{i}.{realm}"
+        dn = f"fqdn={fqdn},cn=computers,cn=accounts,{base}"
+        computer_dns.append(dn)
+        entries.append((dn, {"cn": [fqdn], "fqdn": [fqdn], "ipaUniqueID": [f"00000000-0000-4000-9000-{i:012d}"],
+                             "krbCanonicalName": [f"host/{fqdn}@{krb_realm}"],
+                             "krbPrincipalName": [f"host/{fqdn}@{krb_realm}"], "krbLastPwdChange": [now]}))
+
+    for i in range(services):
+        host = rand.randrange(computers)
+        spn = f"HTTP{i}/host{host}.{realm}@{krb_realm}"
+        entries.append((f"krbprincipalname={spn},cn=services,cn=accounts,{base}",
+                        {"krbPrincipalName": [spn], "managedBy": [computer_dns[host]]}))
+
+    group_dns = []
+    for i in range(groups):
+        dn = f"cn=group{i},cn=groups,cn=accounts,{base}"
+        members = rand.sample(user_dns, min(users, rand.randint(1, 50)))
+        if group_dns and rand.random() < 0.5:
+            members.append(rand.choice(group_dns))
+        group_dns.append(dn)
+        attributes = {"cn": [f"group{i}"], "ipaUniqueID": [f"00000000-0000-4000-a000-{i:012d}"], "member": members}
+        if i % 2:
+            attributes["ipaNTSecurityIdentifier"] = [f"{sid}-{500000 + i}"]
+        entries.append((dn, attributes))
+    entries.append((f"cn=Default SMB Group,cn=groups,cn=accounts,{base}",
+                    {"cn": ["Default SMB Group"], "ipaUniqueID": ["00000000-0000-4000-a000-ffffffffffff"],
+                     "ipaNTSecurityIdentifier": [f"{sid}-1"]}))
+
+    hostgroup_dns = []
+    for i in range(hostgroups):
+        dn = f"cn=hostgroup{i},cn=hostgroups,cn=accounts,{base}"
+        members = rand.sample(computer_dns, min(computers, rand.randint(1, 50)))
+        if hostgroup_dns and rand.random() < 0.5:
+            members.append(rand.choice(hostgroup_dns))
+        hostgroup_dns.append(dn)
+        entries.append((dn, {"cn": [f"hostgroup{i}"], "ipaUniqueID": [f"00000000-0000-4000-b000-{i:012d}"],
+                             "member": members}))
+
+    service_dns = []
+    for name in ["sshd", "login", "sudo", "ftp", "xrdp-sesman", "gnome-remote-desktop"]:
+        dn = f"cn={name},cn=hbacservices,cn=hbac,{base}"
+        service_dns.append(dn)
+        entries.append((dn, {"cn": [name], "ipaUniqueID": [f"00000000-0000-4000-c000-{len(service_dns):012d}"]}))
+    service_group = f"cn=Remote,cn=hbacservicegroups,cn=hbac,{base}"
+    entries.append((service_group, {"cn": ["Remote"], "ipaUniqueID": ["00000000-0000-4000-c100-000000000001"],
+                                    "member": [service_dns[0], service_dns[4], service_dns[5]]}))
+
+    for i in range(hbac):
+        attributes = {"ipaUniqueID": [f"00000000-0000-4000-d000-{i:012d}"], "ipaEnabledFlag": [i % 10 != 9]}
+        if i == 0 and allow_all:
+            attributes.update(userCategory=["all"], hostCategory=["all"], serviceCategory=["all"])
+        elif i == 0:
+            attributes.update(userCategory=["all"], serviceCategory=["all"],
+                              memberHost=rand.sample(computer_dns, min(computers, 3)))
+        elif i == 1 and not allow_all:
+            attributes.update(hostCategory=["all"], memberUser=rand.sample(user_dns, min(users, 3)),
+                              memberService=[rand.choice(service_dns + [service_group])])
+        else:
+            attributes["memberUser"] = rand.sample(user_dns, min(users, 3)) + rand.sample(group_dns, min(groups, 2))
+            attributes["memberHost"] = rand.sample(computer_dns, min(computers, 3)) + [rand.choice(hostgroup_dns)]
+            attributes["memberService"] = [rand.choice(service_dns + [service_group])]
+        entries.append((f"ipaUniqueID=00000000-0000-4000-d000-{i:012d},cn=hbac,{base}", attributes))
+
+    command_dns = []
+    for i in range(sudocmds):
+        dn = f"ipaUniqueID=00000000-0000-4000-e000-{i:012d},cn=sudocmds,cn=sudo,{base}"
+        command_dns.append(dn)
+        entries.append((dn, {"sudoCmd": [f"/usr/bin/command{i}"], "ipaUniqueID": [f"00000000-0000-4000-e000-{i:012d}"]}))
+    # The parser only reads the docker command group.
+    command_group = f"cn=docker,cn=sudocmdgroups,cn=sudo,{base}"
+    entries.append((command_group, {"cn": ["docker"], "ipaUniqueID": ["00000000-0000-4000-e100-000000000001"],
+                                    "member": command_dns[:3]}))
+
+    for i in range(sudorules):
+        attributes = {"ipaUniqueID": [f"00000000-0000-4000-f000-{i:012d}"], "ipaEnabledFlag": [True]}
+        if i == 0 and allow_all:
+            attributes.update(userCategory=["all"], hostCategory=["all"], cmdCategory=["all"],
+                              ipaSudoRunAsUserCategory=["all"])
+        elif i == 0:
+            attributes.update(userCategory=["all"], cmdCategory=["all"], ipaSudoRunAsUserCategory=["all"],
+                              memberHost=rand.sample(computer_dns, min(computers, 2)))
+        elif i == 1 and not allow_all:
+            attributes.update(hostCategory=["all"], memberUser=rand.sample(user_dns, min(users, 2)),
+                              memberAllowCmd=[command_group], ipaSudoRunAs=[user_dns[0]])
+        else:
+            attributes["memberUser"] = rand.sample(user_dns, min(users, 2)) + [rand.choice(group_dns)]
+            attributes["memberHost"] = rand.sample(computer_dns, min(computers, 2))
+            attributes["memberAllowCmd"] = [rand.choice(command_dns), command_group]
+            attributes["ipaSudoRunAs"] = [user_dns[0], group_dns[0]]
+        entries.append((f"ipaUniqueID=00000000-0000-4000-f000-{i:012d},cn=sudorules,cn=sudo,{base}", attributes))
+
+    return entries
+
+
+def entries(size: int, realm: str = "lab.lo") -> list:
+    """Generate the entries of a synthetic realm as ldap3-like entries.
+    :param size: approximate number of entries of the realm.
+    :param realm: name of the realm.
+    :return: list of entries."""
+
+    return [Entry(dn, attributes) for dn, attributes in generate(realm, **scale(size))]
+
+
+if __name__ == "__main__":
+    pass
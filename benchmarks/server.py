@@ -0,0 +1,281 @@
+# -*- coding:utf-8 -*-
+
+"""Local LDAP stand-in serving a synthetic realm over TCP, so that the LDAP backends are measured on the same server.
+
+It implements the small part of LDAPv3 used by the collection: anonymous and simple binds, searches with the base,
+one-level and subtree scopes, the filters of the targeted searches (and, or, not, equality, presence, greater or
+equal) and the Simple Paged Results control. The entries are encoded once per set of requested attributes, the server
+runs in its own process and its cost stays small next to the decoding of the responses by the client.
+
+    python -m benchmarks.server --size 10000
+"""
+
+import argparse
+import multiprocessing
+import socketserver
+from datetime import datetime
+from benchmarks.realm import generate, scale
+
+PAGED_RESULTS_OID = b"1.2.840.113556.1.4.319"
+
+
+def encode_length(length: int) -> bytes:
+    """Encode a BER length, in the short form below 128 bytes."""
+
+    if length < 0x80:
+        return bytes([length])
+    size = (length.bit_length() + 7) // 8
+    return bytes([0x80 | size]) + length.to_bytes(size, "big")
+
+
+def tlv(tag: int, value: bytes) -> bytes:
+    """Encode a BER tag, length and value."""
+
+    return bytes([tag]) + encode_length(len(value)) + value
+
+
+def encode_integer(value: int, tag: int = 0x02) -> bytes:
+    """Encode a BER integer, or an enumerated value with the 0x0a tag."""
+
+    return tlv(tag, value.to_bytes(max(1, (value.bit_length() + 8) // 8), "big", signed=True))
+
+
+def read_tlv(data: bytes, offset: int) -> tuple[int, bytes, int]:
+    """Decode the BER tag, length and value at an offset.
+    :return: tag, value and offset of the next element."""
+
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    return tag, data[offset:offset + length], offset + length
+
+
+def read_all(data: bytes) -> list[tuple[int, bytes]]:
+    """Decode the elements of a constructed BER value."""
+
+    elements, offset = [], 0
+    while offset < len(data):
+        tag, value, offset = read_tlv(data, offset)
+        elements.append((tag, value))
+    return elements
+
+
+def encode_value(value) -> bytes:
+    """Encode an attribute value of the synthetic realm as the string an IdM server would return."""
+
+    if isinstance(value, datetime):
+        return value.strftime("%Y%m%d%H%M%SZ").encode()
+    if isinstance(value, bool):
+        return b"TRUE" if value else b"FALSE"
+    return str(value).encode()
+
+
+class Realm():
+    """Entries of a synthetic realm, indexed by DN, with their encoding for each set of requested attributes."""
+
+    def __init__(self, realm: str, size: int, allow_all: bool):
+
+        self.base = ",".join("dc=" + dc for dc in realm.split("."))
+        self.entries = {}
+        for dn, attributes in generate(realm, **scale(size), allow_all=allow_all):
+            attributes = {"objectClass": ["top"]} | attributes
+            self.entries[dn.lower()] = (dn, {name: [encode_value(value) for value in values]
+                                              for name, values in attributes.items()})
+        self.encoded = {}
+
+    def search(self, base: str, scope: int, search_filter: tuple) -> list[str]:
+        """Returns the DN of the entries matching a search, in a stable order."""
+
+        base = base.lower()
+        matches = []
+        for key, (dn, attributes) in self.entries.items():
+            if scope == 0:
+                inside = key == base
+            elif scope == 1:
+                inside = key.partition(",")[2] == base
+            else:
+                inside = key == base or key.endswith("," + base)
+            if inside and matches_filter(search_filter, attributes):
+                matches.append(key)
+        return matches
+
+    def encode(self, key: str, attributes: tuple) -> bytes:
+        """Encode the body of the SearchResultEntry of an entry, with the requested attributes."""
+
+        if (key, attributes) not in self.encoded:
+            dn, values = self.entries[key]
+            wanted = {name.lower() for name in attributes}
+            selected = [] if "1.1" in wanted else [
+                tlv(0x30, tlv(0x04, name.encode()) + tlv(0x31, b"".join(tlv(0x04, value) for value in vals)))
+                for name, vals in values.items() if not wanted or "*" in wanted or name.lower() in wanted]
+            self.encoded[(key, attributes)] = tlv(0x64, tlv(0x04, dn.encode()) + tlv(0x30, b"".join(selected)))
+        return self.encoded[(key, attributes)]
+
+
+def read_filter(tag: int, value: bytes) -> tuple:
+    """Decode a search filter to a (type, operands) tuple."""
+
+    if tag in (0xa0, 0xa1):
+        return "and" if tag == 0xa0 else "or", [read_filter(*element) for element in read_all(value)]
+    if tag == 0xa2:
+        return "not", read_filter(*read_tlv(value, 0)[:2])
+    if tag == 0x87:
+        return "present", value.decode().lower()
+    if tag in (0xa3, 0xa5, 0xa6):
+        (_, name), (_, assertion) = read_all(value)
+        return {0xa3: "equal", 0xa5: "ge", 0xa6: "le"}[tag], (name.decode().lower(), assertion.lower())
+    raise ValueError(f"Unsupported filter 0x{tag:02x}.")
+
+
+def matches_filter(search_filter: tuple, attributes: dict) -> bool:
+    """Evaluate a filter on the attributes of an entry, case insensitively."""
+
+    kind, operands = search_filter
+    if kind == "and":
+        return all(matches_filter(operand, attributes) for operand in operands)
+    if kind == "or":
+        return any(matches_filter(operand, attributes) for operand in operands)
+    if kind == "not":
+        return not matches_filter(operands, attributes)
+    if kind == "present":
+        return operands == "objectclass" or any(name.lower() == operands for name in attributes)
+    name, assertion = operands
+    values = [value.lower() for key, vals in attributes.items() if key.lower() == name for value in vals]
+    if kind == "equal":
+        return assertion in values
+    if kind == "ge":
+        return any(value >= assertion for value in values)
+    return any(value <= assertion for value in values)
+
+
+class Handler(socketserver.BaseRequestHandler):
+    """LDAP session of a client."""
+
+    def handle(self):
+
+        buffer, results = b"", {}
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            buffer += data
+            while len(buffer) > 2:
+                try:
+                    tag, message, offset = read_tlv(buffer, 0)
+                except IndexError:
+                    break
+                if offset > len(buffer):
+                    break
+                buffer = buffer[offset:]
+                elements = read_all(message)
+                message_id = int.from_bytes(elements[0][1], "big")
+                operation, request = elements[1]
+                controls = read_all(elements[2][1]) if len(elements) > 2 else []
+                if operation == 0x42:
+                    return
+                if operation == 0x60:
+                    authentication = read_all(request)[2][0]
+                    code = 0 if authentication == 0x80 else 7
+                    self.send(message_id, tlv(0x61, encode_integer(code, 0x0a) + tlv(0x04, b"") + tlv(0x04, b"")))
+                elif operation == 0x63:
+                    self.search(message_id, request, controls, results)
+
+    def send(self, message_id: int, *operations: bytes):
+        """Send responses to a request, in a single write.
+        :param message_id: ID of the request.
+        :param operations: protocol operations of the responses, each followed by its controls."""
+
+        self.request.sendall(b"".join(tlv(0x30, encode_integer(message_id) + operation) for operation in operations))
+
+    def search(self, message_id: int, request: bytes, controls: list, results: dict):
+        """Answer a search request, a page at a time if the paged results control is present.
+        :param message_id: ID of the request.
+        :param request: search request.
+        :param controls: controls of the request.
+        :param results: DN of the entries of the paged searches in progress, by cookie."""
+
+        realm = self.server.realm
+        fields = read_all(request)
+        base, scope = fields[0][1].decode(), int.from_bytes(fields[1][1], "big")
+        attributes = tuple(sorted(value.decode() for _, value in read_all(fields[7][1])))
+        paging = None
+        for _, control in controls:
+            control = read_all(control)
+            if control[0][1] == PAGED_RESULTS_OID:
+                size, cookie = read_all(read_all(control[-1][1])[0][1])
+                paging = int.from_bytes(size[1], "big"), cookie[1]
+        if base == "":
+            # Root DSE, read by ldap3 after the bind. No schema is published, the values are not formatted.
+            entry = tlv(0x64, tlv(0x04, b"") + tlv(0x30, b"".join(
+                tlv(0x30, tlv(0x04, name) + tlv(0x31, tlv(0x04, value)))
+                for name, value in [(b"namingContexts", realm.base.encode()), (b"supportedLDAPVersion", b"3"),
+                                    (b"supportedControl", PAGED_RESULTS_OID)])))
+            self.send(message_id, entry, tlv(0x65, encode_integer(0, 0x0a) + tlv(0x04, b"") + tlv(0x04, b"")))
+            return
+        if paging is not None and paging[1]:
+            keys, start = results[paging[1]]
+        else:
+            keys, start = realm.search(base, scope, read_filter(*fields[6])), 0
+        end = start + paging[0] if paging is not None else len(keys)
+        page = keys[start:end]
+        cookie = b""
+        if end < len(keys):
+            cookie = str(len(results)).encode()
+            results[cookie] = (keys, end)
+        done = tlv(0x65, encode_integer(0, 0x0a) + tlv(0x04, b"") + tlv(0x04, b""))
+        response_controls = b""
+        if paging is not None:
+            value = tlv(0x30, encode_integer(0) + tlv(0x04, cookie))
+            response_controls = tlv(0xa0, tlv(0x30, tlv(0x04, PAGED_RESULTS_OID) + tlv(0x04, value)))
+        self.send(message_id, *(realm.encode(key, attributes) for key in page), done + response_controls)
+
+
+class Server(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def run(realm: str, size: int, allow_all: bool, port: int, ready):
+    """Serve a synthetic realm until the process is terminated.
+    :param ready: connection on which the port of the server is sent once it listens."""
+
+    server = Server(("127.0.0.1", port), Handler)
+    server.realm = Realm(realm, size, allow_all)
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def start(realm: str = "lab.lo", size: int = 1000, allow_all: bool = False, port: int = 0) -> tuple:
+    """Start the stand-in in a child process.
+    :param realm: name of the realm.
+    :param size: approximate number of entries of the realm.
+    :param allow_all: include HBAC and sudo rules applying to all users and all hosts.
+    :param port: port to listen on, 0 for any free port.
+    :return: process of the server and its URL."""
+
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run, args=(realm, size, allow_all, port, child), daemon=True)
+    process.start()
+    return process, f"ldap://127.0.0.1:{parent.recv()}"
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Serve a synthetic realm over LDAP.")
+    parser.add_argument("-s", "--size", action="store", type=int, default=10000, help="Number of entries of the synthetic realm.")
+    parser.add_argument("-d", "--domain", action="store", default="lab.lo", help="Name of the synthetic realm.")
+    parser.add_argument("-p", "--port", action="store", type=int, default=3389, help="Port to listen on.")
+    parser.add_argument("--allow-all", action="store_true", default=False, help="Include rules applying to all users and all hosts.")
+    args = parser.parse_args()
+
+    process, url = start(args.domain, args.size, args.allow_all, args.port)
+    print(f"Serving {args.domain} on {url}.")
+    process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# -*- coding:utf-8 -*-
+
+"""Benchmark of the phases of a run on synthetic realms of several sizes.
+
+The synthetic realm is served over TCP by a local LDAP stand-in (benchmarks.server), so that the collection goes through
+the searches and the decoding of the LDAP backends, ldap3 and python-ldap, compared on the same server. Each phase
+(collection, parsing, member lookup and output) is timed and its peak memory is measured with tracemalloc, for the
+Opengraph and the legacy paths. Tracing slows the phases down, use --no-trace to only measure the time. Rules applying to all users and all hosts are left out by default (--allow-all),
+as their edges would dominate the output phase.
+
+    python -m benchmarks.suite --sizes 10000 50000 100000
+    python -m benchmarks.suite --sizes 100000 --backends ldap3 python-ldap --no-trace
+"""
+
+import os
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+import importlib.util
+from benchmarks import server
+from idmhound.collectors import ldap
+from idmhound.collectors.backends import BACKENDS
+from idmhound.graph.utils import *
+
+
+class Phases():
+    """Measure the time and the peak memory of the phases of a run."""
+
+    def __init__(self, trace: bool = True):
+
+        self.trace = trace
+        self.results = []
+
+    def run(self, name: str, function, *args):
+        """Run a phase.
+        :param name: name of the phase.
+        :param function: function running the phase.
+        :param args: arguments of the function.
+        :return: value returned by the function."""
+
+        if self.trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if self.trace else 0
+        tracemalloc.stop()
+        self.results.append((name, elapsed, peak))
+        return result
+
+
+def lookup(index: DNIndex, *subjects: list):
+    """Resolve the member DN of all the subjects."""
+
+    for objects in subjects:
+        member_lookup(index, objects)
+
+
+def bench(url: str, realm: str, page_size: int, legacy: bool, trace: bool, output: str,
+          parse_workers: int = 1, backend: str = "ldap3") -> list:
+    """Run the phases of a collection against the LDAP stand-in.
+    :param url: URL of the stand-in.
+    :param realm: name of the realm.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param legacy: use the legacy parser and output.
+    :param trace: measure the peak memory of the phases.
+    :param output: directory of the output files.
+    :param parse_workers: number of worker processes of the parse.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: list of (phase, time, peak memory) tuples."""
+
+    phases = Phases(trace)
+    base = ",".join("dc=" + dc for dc in realm.split("."))
+    data = phases.run("collect", lambda: list(ldap.collect(url, base, targeted=True, page_size=page_size,
+                                                           backend=backend)))
+    sid = identify_realm_sid(data, realm)
+    if legacy:
+        parsed = phases.run("parse", ldap.legacy_parse, data, realm, sid, False, parse_workers)
+        domains, users, groups, computers, hbac, sudoer, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = parsed
+        index = DNIndex(users + computers + groups + hbacservices + hbacservicesgroups + sudocmds + sudocmdgroups)
+        phases.run("member_lookup", lookup, index, groups, hbacservicesgroups, hbac, sudocmdgroups, sudoer)
+
+        def save():
+            save_json(os.path.join(output, "domains.json"), domains, "domains")
+            save_json(os.path.join(output, "users.json"), users, "users")
+            save_json(os.path.join(output, "groups.json"), groups, "groups")
+            save_json(os.path.join(output, "computers.json"), computers, "computers")
+            save_opengraph_hbac(os.path.join(output, "hbac.json"), hbac)
+            save_opengraph_hbac(os.path.join(output, "sudoer.json"), sudoer)
+    else:
+        parsed = phases.run("parse", ldap.parse, data, realm, sid, False, parse_workers)
+        domains, users, groups, computers, hbac, sudoer, membership, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = parsed
+        index = DNIndex(users + computers + groups + hbacservices + hbacservicesgroups + sudocmds + sudocmdgroups)
+        phases.run("member_lookup", lookup, index, membership, hbacservicesgroups, hbac, sudocmdgroups, sudoer)
+
+        def save():
+            save_opengraph(os.path.join(output, "idmhound.json"), domains + users + groups + computers,
+                           hbac + membership + sudoer)
+    phases.run("output", save)
+    return phases.results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the phases of a run on synthetic realms.")
+    parser.add_argument("-s", "--sizes", action="store", type=int, nargs="+", default=[1000, 10000, 50000], help="Number of entries of the synthetic realms.")
+    parser.add_argument("-d", "--domain", action="store", default="lab.lo", help="Name of the synthetic realms.")
+    parser.add_argument("-ps", "--page-size", action="store", type=int, default=1000, help="Number of entries per page of the collection, 0 to disable paging.")
+    parser.add_argument("--allow-all", action="store_true", default=False, help="Include rules applying to all users and all hosts, whose edges grow quadratically.")
+    parser.add_argument("--parse-workers", action="store", type=int, default=1, help="Number of worker processes of the parse.")
+    parser.add_argument("--backends", action="store", nargs="+", choices=list(BACKENDS), default=["ldap3"], help="LDAP backends to compare.")
+    parser.add_argument("--no-trace", action="store_true", default=False, help="Only measure the time of the phases.")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    for backend in args.backends:
+        if importlib.util.find_spec(BACKENDS[backend].module) is None:
+            parser.error(f"the {backend} backend requires the {backend} package")
+
+    print(f"{'size':>10} {'backend':<12} {'path':<10} {'phase':<15} {'time (s)':>10} {'entries/s':>12} {'peak (MiB)':>11}")
+    for size in args.sizes:
+        process, url = server.start(args.domain, size, args.allow_all)
+        try:
+            for backend in args.backends:
+                for legacy in (False, True):
+                    with tempfile.TemporaryDirectory() as output:
+                        results = bench(url, args.domain, args.page_size, legacy, not args.no_trace, output,
+                                        args.parse_workers, backend)
+                    for phase, elapsed, peak in results:
+                        print(f"{size:>10} {backend:<12} {'legacy' if legacy else 'opengraph':<10} {phase:<15} "
+                              f"{elapsed:>10.2f} {size / elapsed:>12,.0f} "
+                              f"{peak / 2 ** 20 if peak else float('nan'):>11.1f}")
+        finally:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
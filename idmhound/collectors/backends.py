@@ -0,0 +1,223 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.stats import STATS
+
+# Scopes of the searches, named as the ldap3 constants.
+BASE, LEVEL, SUBTREE = "BASE", "LEVEL", "SUBTREE"
+
+# Attribute list requesting no attribute, only the DN of the entries (RFC 4511).
+NO_ATTRIBUTES = "1.1"
+
+PAGED_RESULTS_OID = "1.2.840.113556.1.4.319"
+
+# Result codes of a search that completed: success and noSuchObject, for a container missing from the realm.
+SEARCH_DONE = (0, 32)
+
+
+class Ldap3Backend():
+    """LDAP connection through ldap3, a pure Python client. The entries are read from the search responses, whose
+    values ldap3 formats according to the schema of the server, without building its Entry objects."""
+
+    module = "ldap3"
+
+    def __init__(self, server: str, username: str = "", password: str = "", krb_auth: bool = False):
+
+        self.server = server
+        self.username = username
+        self.password = password
+        self.krb_auth = krb_auth
+        self.conn = None
+        self.bound = False
+
+    @staticmethod
+    def errors() -> tuple:
+        """Returns the exceptions raised when the connection to the server is lost or the bind fails."""
+
+        from ldap3.core.exceptions import LDAPBindError, LDAPCommunicationError
+        return LDAPCommunicationError, LDAPBindError
+
+    @staticmethod
+    def kerberos_errors() -> tuple:
+        """Returns the exceptions raised when a Kerberos bind fails, such as with an expired ticket. ldap3 binds with
+        SASL GSSAPI through the gssapi package, which raises them before any request is sent."""
+
+        try:
+            from gssapi.exceptions import GSSError
+        except ImportError:
+            return ()
+        return GSSError,
+
+    def bind(self) -> bool:
+        """Open the connection and bind.
+        :return: True if the bind succeeded."""
+
+        from ldap3 import Server, Connection, ALL, SASL, GSSAPI
+        server = Server(self.server, get_info=ALL)
+        # The attributes requested by the targeted searches but missing from an entry must stay absent, the parser
+        # tells the "all" categories from the member attributes by their presence.
+        if self.krb_auth:
+            self.conn = Connection(server, authentication=SASL, sasl_mechanism=GSSAPI, return_empty_attributes=False)
+        elif self.username.split(",")[0] != "uid=" and self.password != "":
+            self.conn = Connection(server, user=self.username, password=self.password, return_empty_attributes=False)
+        else:
+            self.conn = Connection(server, return_empty_attributes=False)
+        with STATS.phase("bind"):
+            self.bound = self.conn.bind()
+        return self.bound
+
+    def search(self, base: str, search_filter: str, attributes: list, scope: str = SUBTREE, page_size: int = 0,
+               cookie: bytes = None) -> tuple[list, bytes | None, int]:
+        """Run an LDAP search, or fetch a page of its results.
+        :param base: base of the LDAP request.
+        :param search_filter: filter of the LDAP request.
+        :param attributes: attributes to retrieve.
+        :param scope: scope of the LDAP request.
+        :param page_size: number of entries per page, 0 to disable paging.
+        :param cookie: paged results cookie of the page, None for the first page.
+        :return: entries as (DN, attributes) tuples, cookie of the next page (None after the last page) and result
+        code of the search."""
+
+        self.conn.search(search_base=base, search_filter=search_filter, search_scope=scope, attributes=attributes,
+                         paged_size=page_size or None, paged_cookie=cookie)
+        from idmhound.collectors.ldap import ATTRIBUTE_NAMES
+        entries = []
+        for item in self.conn.response or []:
+            if item["type"] == "searchResEntry":
+                # The attributes are a case insensitive dictionary, the parser reads a plain dictionary keyed by the
+                # names it knows, whatever their case on the server.
+                entries.append((item["dn"], canonical(item["attributes"], ATTRIBUTE_NAMES)))
+        cookie = self.conn.result.get("controls", {}).get(PAGED_RESULTS_OID, {}).get("value", {}).get("cookie")
+        return entries, cookie or None, self.conn.result.get("result")
+
+    def unbind(self):
+        """Close the connection."""
+
+        self.conn.unbind()
+
+
+class PythonLdapBackend():
+    """LDAP connection through python-ldap, a binding of the C libldap of OpenLDAP, which decodes the responses much
+    faster than ldap3. The values are decoded as UTF-8 strings (binary values stay bytes), without the schema formatting
+    of ldap3: booleans stay TRUE or FALSE, numbers and dates stay strings and single values are lists of one value. The
+    names of the attributes are spelled as with ldap3, as the parser reads them."""
+
+    module = "ldap"
+
+    def __init__(self, server: str, username: str = "", password: str = "", krb_auth: bool = False):
+
+        self.server = server
+        self.username = username
+        self.password = password
+        self.krb_auth = krb_auth
+        self.conn = None
+        self.bound = False
+
+    @staticmethod
+    def errors() -> tuple:
+        """Returns the exceptions raised when the connection to the server is lost."""
+
+        import ldap
+        return ldap.SERVER_DOWN, ldap.CONNECT_ERROR, ldap.TIMEOUT
+
+    @staticmethod
+    def kerberos_errors() -> tuple:
+        """Returns the exceptions raised when a Kerberos bind fails, such as with an expired ticket: libsasl reports
+        the GSSAPI error as a local error, and the server rejects an expired service ticket as invalid credentials."""
+
+        import ldap
+        return ldap.LOCAL_ERROR, ldap.INVALID_CREDENTIALS
+
+    def bind(self) -> bool:
+        """Open the connection and bind.
+        :return: True if the bind succeeded."""
+
+        import ldap
+        import ldap.sasl
+        self.conn = ldap.initialize(self.server if "://" in self.server else f"ldap://{self.server}")
+        self.conn.protocol_version = ldap.VERSION3
+        self.conn.set_option(ldap.OPT_REFERRALS, 0)
+        with STATS.phase("bind"):
+            try:
+                if self.krb_auth:
+                    self.conn.sasl_interactive_bind_s("", ldap.sasl.gssapi())
+                elif self.username.split(",")[0] != "uid=" and self.password != "":
+                    self.conn.simple_bind_s(self.username, self.password)
+                else:
+                    self.conn.simple_bind_s("", "")
+                self.bound = True
+            except self.errors() + (self.kerberos_errors() if self.krb_auth else ()):
+                raise
+            except ldap.LDAPError:
+                # Like ldap3, a rejected bind leaves the connection unbound instead of raising, unless it is a failed
+                # Kerberos bind.
+                self.bound = False
+        return self.bound
+
+    def search(self, base: str, search_filter: str, attributes: list, scope: str = SUBTREE, page_size: int = 0,
+               cookie: bytes = None) -> tuple[list, bytes | None, int]:
+        """Run an LDAP search, or fetch a page of its results.
+        :param base: base of the LDAP request.
+        :param search_filter: filter of the LDAP request.
+        :param attributes: attributes to retrieve.
+        :param scope: scope of the LDAP request.
+        :param page_size: number of entries per page, 0 to disable paging.
+        :param cookie: paged results cookie of the page, None for the first page.
+        :return: entries as (DN, attributes) tuples, cookie of the next page (None after the last page) and result
+        code of the search."""
+
+        import ldap
+        from ldap.controls import SimplePagedResultsControl
+        from idmhound.collectors.ldap import ATTRIBUTE_NAMES
+        scopes = {BASE: ldap.SCOPE_BASE, LEVEL: ldap.SCOPE_ONELEVEL, SUBTREE: ldap.SCOPE_SUBTREE}
+        controls = [SimplePagedResultsControl(True, size=page_size, cookie=cookie or b"")] if page_size > 0 else []
+        entries = []
+        message = self.conn.search_ext(base, scopes[scope], search_filter, attributes, serverctrls=controls)
+        while True:
+            # The responses are read one by one: a search ending with an error (e.g. sizeLimitExceeded) raises only
+            # when its final response is read, after the entries the server returned before.
+            try:
+                kind, data, _, controls = self.conn.result3(message, all=0)
+            except self.errors():
+                raise
+            except ldap.LDAPError as error:
+                # Errors of the search are reported by their result code, as ldap3 does.
+                details = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+                return entries, None, details.get("result", -1)
+            entries.extend((dn, {ATTRIBUTE_NAMES.get(name.lower(), name): [decode(value) for value in values]
+                                 for name, values in attrs.items()}) for dn, attrs in data if dn is not None)
+            if kind == ldap.RES_SEARCH_RESULT:
+                break
+        cookie = next((control.cookie for control in controls if control.controlType == PAGED_RESULTS_OID), None)
+        return entries, cookie or None, 0
+
+    def unbind(self):
+        """Close the connection."""
+
+        self.conn.unbind_s()
+
+
+# Backends, by name. Each backend imports its client library when it is first used.
+BACKENDS = {"ldap3": Ldap3Backend, "python-ldap": PythonLdapBackend}
+
+
+def canonical(attrs, names: dict) -> dict:
+    """Returns the attributes of an entry as a dictionary keyed by the spelling of their names the parser reads, the
+    servers returning them in the case they were stored with (e.g. ipaenabledflag in the default HBAC rule of FreeIPA).
+    :param attrs: attributes of the entry, keyed by the names returned by the server.
+    :param names: spelling of the names of the attributes, by lowercase name, the other names are kept as returned.
+    :return: attributes of the entry."""
+
+    return {names.get(name.lower(), name): values for name, values in attrs.items()}
+
+
+def decode(value: bytes) -> str | bytes:
+    """Decode an attribute value as a UTF-8 string, binary values are left as bytes."""
+
+    try:
+        return value.decode()
+    except UnicodeDecodeError:
+        return value
+
+
+if __name__ == "__main__":
+    pass
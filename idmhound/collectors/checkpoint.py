@@ -0,0 +1,173 @@
+# -*- coding:utf-8 -*-
+
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from idmhound.collectors.backends import BACKENDS, LEVEL, SEARCH_DONE, SUBTREE
+from idmhound.collectors.ldap import CONTAINERS, connect
+from idmhound.collectors.snapshot import HEADER, load_raw, read_record, write_record
+from idmhound.stats import STATS
+
+logger = logging.getLogger()
+
+
+class Checkpoint():
+    """Progress of a collection spooled to disk: the searches completed, the offset of the entries of the current search
+    and the size of the spool when the last page was written. It is saved next to the spool after each page, by
+    replacing the file so that it is never left half written."""
+
+    def __init__(self, path: str, searches: list):
+
+        self.path = path
+        self.searches = [[base, search_filter] for base, search_filter, attributes, scope in searches]
+        self.state = {"searches": self.searches, "completed": 0, "start": 0, "offset": 0, "done": False}
+
+    def load(self) -> bool:
+        """Load the checkpoint of a previous run of the same searches.
+        :return: True if the checkpoint exists and matches the searches."""
+
+        try:
+            with open(self.path) as checkpoint:
+                state = json.load(checkpoint)
+        except (OSError, ValueError):
+            return False
+        if state.get("searches") != self.searches:
+            logger.warning(f"{self.path} was saved for other searches, the collection starts over.")
+            return False
+        self.state = state
+        return True
+
+    def save(self, **changes):
+        """Update the checkpoint and save it.
+        :param changes: values of the state to change."""
+
+        self.state.update(changes)
+        with open(self.path + ".tmp", "w") as checkpoint:
+            json.dump(self.state, checkpoint)
+        os.replace(self.path + ".tmp", self.path)
+
+
+def spooled_dns(path: str, start: int, end: int) -> set[str]:
+    """Read the DN of the entries written to a spool between two offsets.
+    :param path: path of the spool.
+    :param start: offset of the first entry.
+    :param end: offset following the last entry.
+    :return: DN of the entries."""
+
+    dns = set()
+    with open(path, "rb") as spool:
+        spool.seek(start)
+        while spool.tell() < end:
+            dn, attributes = read_record(spool)
+            dns.add(dn)
+    return dns
+
+
+def collect_resumable(path: str, server: str, base: str, username: str = "", password: str = "",
+                      krb_auth: bool = False, page_size: int = 0, search_filter: str = "(objectClass=*)",
+                      targeted: bool = False, resume: bool = False, retries: int = 5, backoff: float = 1.0,
+                      backend: str = "ldap3") -> Iterator:
+    """Collect the entries of the realm to a spool on disk, checkpointing the progress after each page. When the
+    connection drops or a page fails, it is opened and bound again after an exponential backoff, and the collection
+    continues where it stopped. A failed Kerberos bind, usually an expired ticket, is not retried: the ticket must be
+    renewed before resuming. A resumed run does not search again the containers already completed. A paged results
+    cookie is only valid on the connection it was returned on, so the interrupted search starts over and skips the
+    entries already spooled.
+    :param path: path of the spool, a raw snapshot, the checkpoint is saved to the same path with .checkpoint appended.
+    :param server: server to connect to.
+    :param base: base of the LDAP request, the naming context of the realm for targeted searches.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param search_filter: filter of the LDAP request, ignored by targeted searches.
+    :param targeted: run one search per container known to the parser instead of a search of the whole tree.
+    :param resume: continue the collection of a previous run from its checkpoint.
+    :param retries: number of failed attempts in a row, without any page collected in between, before giving up.
+    :param backoff: delay before the first reconnection, in seconds, doubled after each failed attempt.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: generator of the spooled entries, as (DN, attributes) tuples.
+    :raise ConnectionError: when the retries are exhausted or the Kerberos bind fails."""
+
+    if targeted:
+        searches = [(f"{container},{base}", container_filter, attributes, LEVEL)
+                    for container, container_filter, attributes in CONTAINERS]
+    else:
+        searches = [(base, search_filter, ["*"], SUBTREE)]
+    checkpoint = Checkpoint(path + ".checkpoint", searches)
+    if resume and checkpoint.load() and os.path.exists(path):
+        logger.info(f"Resuming the collection from {path}: {checkpoint.state['completed']}/{len(searches)} searches completed.")
+        # Entries written after the last checkpoint may be incomplete, they are fetched again.
+        with open(path, "r+b") as spool:
+            spool.truncate(checkpoint.state["offset"])
+    else:
+        with open(path, "wb") as spool:
+            write_record(spool, HEADER)
+            checkpoint.save(offset=spool.tell(), start=spool.tell())
+
+    # Errors after which the connection is opened and bound again: dropped connections and restarted replicas. Binding
+    # again cannot renew an expired Kerberos ticket, a failed Kerberos bind stops the run.
+    retry_errors = BACKENDS[backend].errors() + (ConnectionError,)
+    kerberos_errors = BACKENDS[backend].kerberos_errors() if krb_auth else ()
+    conn, attempt = None, 0
+    with open(path, "ab") as spool:
+        while checkpoint.state["completed"] < len(searches):
+            search_base, search_filter, attributes, scope = searches[checkpoint.state["completed"]]
+            seen = spooled_dns(path, checkpoint.state["start"], checkpoint.state["offset"])
+            try:
+                if conn is None:
+                    conn = connect(server, username, password, krb_auth, backend)
+                    if not conn.bound:
+                        raise ConnectionError(f"Cannot bind to {server}.")
+                if seen:
+                    logger.info(f"The search of {search_base} starts over and skips the {len(seen)} entries already collected.")
+                cookie = None
+                while True:
+                    with STATS.phase("search"):
+                        entries, cookie, result = conn.search(search_base, search_filter, attributes, scope, page_size,
+                                                              cookie)
+                    if result not in SEARCH_DONE:
+                        # A page failing without the connection dropping (busy or unavailable server, exceeded
+                        # limits) is retried the same way, it must not be taken for the end of the search.
+                        raise ConnectionError(f"The search of {search_base} failed with result code {result}.")
+                    for dn, attrs in entries:
+                        if dn not in seen:
+                            seen.add(dn)
+                            write_record(spool, (dn, attrs))
+                    spool.flush()
+                    attempt = 0
+                    if page_size <= 0 or not cookie:
+                        checkpoint.save(completed=checkpoint.state["completed"] + 1, start=spool.tell(),
+                                        offset=spool.tell())
+                        break
+                    checkpoint.save(offset=spool.tell())
+            except kerberos_errors as error:
+                raise ConnectionError(f"Kerberos bind to {server} failed ({error}): the ticket may have expired, renew "
+                                      f"it and resume the collection from the checkpoint with --resume.") from error
+            except retry_errors as error:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                # The entries of the interrupted page are kept, they are skipped when the page is fetched again.
+                spool.flush()
+                checkpoint.save(offset=spool.tell())
+                delay = backoff * 2 ** (attempt - 1)
+                logger.warning(f"Collection from {server} interrupted ({error}), reconnecting in {delay:g}s ({attempt}/{retries}).")
+                try:
+                    if conn is not None:
+                        conn.unbind()
+                except retry_errors:
+                    pass
+                conn = None
+                time.sleep(delay)
+    if conn is not None:
+        conn.unbind()
+    checkpoint.save(done=True)
+
+    return load_raw(path)
+
+
+if __name__ == "__main__":
+    pass
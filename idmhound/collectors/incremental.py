@@ -0,0 +1,253 @@
+# -*- coding:utf-8 -*-
+"""Incremental collection of a realm: only the entries changed since the previous collection are retrieved, and merged
+into a local state store holding all the entries of the realm.
+
+Only the collection is incremental. The graph is built again from all the stored entries on every run: the parse, the
+resolution of the members and the output cost as much as in a full run, whatever the number of changed entries.
+"""
+
+import logging
+import os
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from idmhound.collectors.backends import BASE, LEVEL, NO_ATTRIBUTES, Ldap3Backend, PythonLdapBackend
+from idmhound.collectors.ldap import CONTAINERS, connect, search
+from idmhound.collectors.snapshot import read_record, write_record
+
+logger = logging.getLogger()
+
+# Attributes usable as high-water mark, modifyTimestamp is replicated, entryUSN is local to each server. Entries and
+# attributes holding the current value of each on the server, in the order they are read: the root DSE, then the
+# monitor entry of 389 Directory Server. The entryUSN plugin publishes one lastUSN per backend, as lastUSN;<backend>.
+SERVER_MARKS = {"modifyTimestamp": [("", "currentTime"), ("cn=monitor", "currentTime")], "entryUSN": [("", "lastUSN")]}
+
+# First record of a state store, identifying the format.
+STATE_HEADER = {"format": "idmhound-state", "version": 1}
+
+
+class StateStore():
+    """Local store of the entries of the realm, keyed by DN, and of the high-water mark of the last collection. The
+    store is a file of length-prefixed JSON records, as the snapshots: the header, the state of the last collection,
+    then one (DN, position, attributes) record per entry. It is loaded in memory when opened and written again, by
+    replacing the file, when the high-water mark of a collection is recorded, so that an interrupted collection leaves
+    the previous store as it was."""
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self.state = {}
+        self.stored = {}
+        self.load()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.close()
+
+    def load(self):
+        """Read the store, an unreadable store being ignored: the collection then retrieves all the entries."""
+
+        try:
+            with open(self.path, "rb") as store:
+                if read_record(store) != STATE_HEADER:
+                    raise ValueError(f"{self.path} is not an IDMHound state store.")
+                state = read_record(store)
+                stored = {}
+                while (record := read_record(store)) is not None:
+                    dn, position, attributes = record
+                    stored[dn] = (position, attributes)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError) as error:
+            logger.warning(f"Cannot read the state store {self.path} ({error}), it is ignored.")
+            return
+        self.state, self.stored = state, stored
+
+    def save(self):
+        """Write the store, by replacing the file so that it is never left half written."""
+
+        with open(self.path + ".tmp", "wb") as store:
+            write_record(store, STATE_HEADER)
+            write_record(store, self.state)
+            for dn, (position, attributes) in self.stored.items():
+                write_record(store, (dn, position, attributes))
+        os.replace(self.path + ".tmp", self.path)
+
+    def get_watermark(self, attribute: str, server: str) -> str | None:
+        """Returns the high-water mark of the last collection if it can be reused.
+        :param attribute: attribute used as high-water mark.
+        :param server: server queried.
+        :return: high-water mark, None if a full collection is required."""
+
+        if self.state.get("attribute") != attribute:
+            return None
+        if attribute == "entryUSN" and self.state.get("server") != server:
+            return None
+        return self.state.get("watermark")
+
+    def set_watermark(self, attribute: str, watermark: str | None, server: str):
+        """Record the high-water mark of the collection and save the store, once all the changes are stored.
+        :param attribute: attribute used as high-water mark.
+        :param watermark: value of the attribute on the server when the collection started.
+        :param server: server queried."""
+
+        self.state = {"attribute": attribute, "watermark": watermark, "server": server}
+        self.save()
+
+    def dns(self) -> list:
+        """Returns the DN of the stored entries."""
+
+        return list(self.stored)
+
+    def update(self, dn: str, position: int, attributes: dict):
+        """Store an entry.
+        :param dn: DN of the entry.
+        :param position: position of the container of the entry in CONTAINERS.
+        :param attributes: attributes of the entry."""
+
+        self.stored[dn] = (position, attributes)
+
+    def delete(self, dns: list):
+        """Remove entries from the store.
+        :param dns: DN of the entries to remove."""
+
+        for dn in dns:
+            del self.stored[dn]
+
+    def clear(self):
+        """Remove all the entries and the high-water mark from the store."""
+
+        self.stored.clear()
+        self.state = {}
+
+    def entries(self) -> list:
+        """Returns the stored entries, in the order of a targeted collection.
+        :return: list of LDAP entries, as (DN, attributes) tuples."""
+
+        stored = sorted((position, dn, attributes) for dn, (position, attributes) in self.stored.items())
+        return [(dn, attributes) for _, dn, attributes in stored]
+
+    def close(self):
+
+        self.stored = {}
+
+
+def to_watermark(mark) -> str:
+    """Convert a value of the high-water mark attribute to its LDAP string representation.
+    :param mark: value of the attribute, a datetime if ldap3 knows the schema of modifyTimestamp.
+    :return: value usable in an LDAP filter."""
+
+    if isinstance(mark, list):
+        mark = mark[0]
+    if isinstance(mark, datetime):
+        return mark.astimezone(timezone.utc).strftime("%Y%m%d%H%M%SZ")
+    return str(mark)
+
+
+def newest(marks: list, attribute: str) -> str | None:
+    """Returns the newest of high-water marks.
+    :param marks: values of the high-water mark.
+    :param attribute: attribute used as high-water mark.
+    :return: newest value, None if there is none."""
+
+    if not marks:
+        return None
+    return max(marks, key=int) if attribute == "entryUSN" else max(marks)
+
+
+def server_mark(conn: Ldap3Backend | PythonLdapBackend, attribute: str) -> str | None:
+    """Read the current value of the high-water mark on the server. Read before the first search, it is older than
+    any change made during the collection, which the next collection therefore retrieves.
+    :param conn: bound LDAP connection.
+    :param attribute: attribute used as high-water mark.
+    :return: current value, None if the server does not publish it."""
+
+    for base, name in SERVER_MARKS[attribute]:
+        marks = []
+        for _, attrs in search(conn, base, "(objectClass=*)", [name], 0, BASE):
+            marks += [to_watermark(value) for key, value in attrs.items()
+                      if key.lower().split(";")[0] == name.lower() and value]
+        if marks:
+            # Each backend counts its own USNs unless they are global, the oldest mark never skips a change.
+            return min(marks, key=int) if attribute == "entryUSN" else marks[0]
+    return None
+
+
+def pop(attrs: dict, attribute: str):
+    """Remove an attribute from the attributes of an entry, whatever the case of its name.
+    :param attrs: attributes of an LDAP entry.
+    :param attribute: name of the attribute.
+    :return: value of the attribute, None if it is absent."""
+
+    for name in list(attrs):
+        if name.lower() == attribute.lower():
+            return attrs.pop(name)
+    return None
+
+
+def collect_incremental(path: str, server: str, base: str, username: str = "", password: str = "",
+                        krb_auth: bool = False, page_size: int = 0, attribute: str = "modifyTimestamp",
+                        backend: str = "ldap3") -> list:
+    """Collect the entries changed since the last collection and update the local state store.
+    The first collection, or a collection with a different high-water mark, retrieves all the entries. The high-water
+    mark recorded is the current value on the server before the first search, so that the entries changed while the
+    searches run are retrieved again by the next collection.
+    Deleted entries, and entries no longer matching the filters of the parser, are detected by a DN-only search.
+    :param path: path of the state store.
+    :param server: server to connect to.
+    :param base: naming context of the realm, e.g. dc=lab,dc=lo.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param attribute: attribute used as high-water mark, modifyTimestamp or entryUSN.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: list of all the entries of the store, changed or not, to parse them all again."""
+
+    with StateStore(path) as store:
+        watermark = store.get_watermark(attribute, server)
+        if watermark is None:
+            logger.info(f"No usable high-water mark in {path}, collecting all the entries.")
+            store.clear()
+        else:
+            logger.info(f"Collecting the entries changed since {attribute} {watermark}.")
+
+        conn = connect(server, username, password, krb_auth, backend)
+        try:
+            current = server_mark(conn, attribute)
+            if current is None:
+                logger.warning(f"{server} does not publish its current {attribute}, the newest value collected is "
+                               f"kept: the changes made during the collection may be missed by the next one.")
+            marks, changed = [watermark] if watermark else [], 0
+            for position, (container, search_filter, attributes) in enumerate(CONTAINERS):
+                if watermark is not None:
+                    search_filter = f"(&{search_filter}({attribute}>={watermark}))"
+                for dn, attrs in search(conn, f"{container},{base}", search_filter, attributes + [attribute],
+                                        page_size, LEVEL):
+                    mark = pop(attrs, attribute)
+                    if mark:
+                        marks.append(to_watermark(mark))
+                    store.update(dn, position, attrs)
+                    changed += 1
+
+            deleted = []
+            if watermark is not None:
+                present = set()
+                for container, search_filter, _ in CONTAINERS:
+                    present.update(dn for dn, _ in search(conn, f"{container},{base}", search_filter, [NO_ATTRIBUTES],
+                                                          page_size, LEVEL))
+                deleted = [dn for dn in store.dns() if dn not in present]
+                store.delete(deleted)
+        finally:
+            conn.unbind()
+
+        store.set_watermark(attribute, current or newest(marks, attribute), server)
+        logger.info(f"{changed} entries added or modified, {len(deleted)} entries removed.")
+        return store.entries()
+
+
+if __name__ == "__main__":
+    pass
@@ -1,103 +1,612 @@
 # -*- coding:utf-8 -*-
 
-import re
+import hashlib
 import logging
-import ldap3.abstract.entry
+import threading
+from collections import Counter, deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from idmhound.graph.nodes import *
 from idmhound.graph.legacy_nodes import *
 from idmhound.graph.edges import *
 from idmhound.graph.utils import *
-from ldap3 import Server, Connection, ALL, SUBTREE, SASL, GSSAPI
+from idmhound.graph.model import RealmModel
+from idmhound.graph.output import batches
+from idmhound.collectors.backends import *
+from idmhound.stats import STATS
 
 logger = logging.getLogger()
 
-def collect(server: str, base: str, username: str = "", password: str = "", krb_auth: bool = False) -> list:
+# Number of entries parsed together by a worker process of the parallel parse.
+PARSE_BATCH_SIZE = 2000
+
+# The synthetic RIDs of the legacy objects without a SID are taken from the upper half of the 32-bit RID space, above
+# the ID ranges IdM allocates the RIDs of the users and groups from.
+SYNTHETIC_RIDS = 2 ** 31
+
+# Attributes shared by the objects whose description and status are parsed.
+COMMON_ATTRIBUTES = ["description", "krbLastPwdChange", "krbPasswordExpiration"]
+
+# Containers understood by the parser, with the server-side filter and the attributes the nodes and edges read.
+CONTAINERS = [
+    ("cn=ad,cn=etc", "(objectClass=*)",
+     ["cn", "ipaNTDomainGUID", "ipaNTFlatName", "ipaNTSecurityIdentifier"] + COMMON_ATTRIBUTES),
+    ("cn=users,cn=accounts", "(uid=*)",
+     ["uid", "gecos", "homeDirectory", "ipaUniqueID", "ipaNTSecurityIdentifier", "krbCanonicalName",
+      "krbPrincipalName", "loginShell", "sn", "uidNumber"] + COMMON_ATTRIBUTES),
+    # The Default SMB Group has no member but is used to identify the SID of the realm.
+    ("cn=groups,cn=accounts", "(|(member=*)(cn=Default SMB Group))",
+     ["cn", "ipaUniqueID", "ipaNTSecurityIdentifier", "member"] + COMMON_ATTRIBUTES),
+    ("cn=hostgroups,cn=accounts", "(member=*)", ["cn", "ipaUniqueID", "member"] + COMMON_ATTRIBUTES),
+    ("cn=computers,cn=accounts", "(fqdn=*)",
+     ["cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"] + COMMON_ATTRIBUTES),
+    ("cn=services,cn=accounts", "(managedBy=*)", ["krbPrincipalName", "managedBy"]),
+    ("cn=hbac", "(ipaEnabledFlag=TRUE)",
+     ["ipaUniqueID", "ipaEnabledFlag", "userCategory", "memberUser", "hostCategory", "memberHost",
+      "serviceCategory", "memberService"]),
+    ("cn=hbacservicegroups,cn=hbac", "(member=*)", ["cn", "ipaUniqueID", "member"]),
+    ("cn=hbacservices,cn=hbac", "(objectClass=*)", ["cn", "ipaUniqueID"]),
+    ("cn=sudorules,cn=sudo", "(ipaEnabledFlag=TRUE)",
+     ["cn", "ipaUniqueID", "ipaEnabledFlag", "userCategory", "memberUser", "hostCategory", "memberHost",
+      "cmdCategory", "memberAllowCmd", "ipaSudoRunAsUserCategory", "ipaSudoRunAs"]),
+    ("cn=sudocmdgroups,cn=sudo", "(&(cn=docker)(member=*))", ["cn", "ipaUniqueID", "member"]),
+    ("cn=sudocmds,cn=sudo", "(sudoCmd=*)", ["sudoCmd", "ipaUniqueID"]),
+]
+
+# Spelling of the names of the attributes the parser reads, by lowercase name. The backends return the attributes
+# keyed by these names, whatever their case on the server.
+ATTRIBUTE_NAMES = {name.lower(): name for _, _, attributes in CONTAINERS for name in attributes}
+
+# Type of the entries, keyed by the container they are stored in and by the attribute of their RDN.
+CLASSES = {
+    ("cn=ad,cn=etc", "cn"): "domain",
+    ("cn=users,cn=accounts", "uid"): "user",
+    ("cn=groups,cn=accounts", "cn"): "group",
+    ("cn=hostgroups,cn=accounts", "cn"): "hostgroup",
+    ("cn=computers,cn=accounts", "fqdn"): "computer",
+    ("cn=services,cn=accounts", "krbprincipalname"): "service",
+    ("cn=hbac", "ipauniqueid"): "hbac",
+    ("cn=hbacservicegroups,cn=hbac", "cn"): "hbacservicegroup",
+    ("cn=hbacservices,cn=hbac", "cn"): "hbacservice",
+    ("cn=sudorules,cn=sudo", "ipauniqueid"): "sudorule",
+    ("cn=sudocmdgroups,cn=sudo", "cn"): "sudocmdgroup",
+    ("cn=sudocmds,cn=sudo", "ipauniqueid"): "sudocmd",
+}
+
+def connect(server: str, username: str = "", password: str = "", krb_auth: bool = False,
+            backend: str = "ldap3") -> Ldap3Backend | PythonLdapBackend:
+    """Open and bind an LDAP connection.
+    :param server: server to connect to.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: LDAP connection, bound unless the server rejected the bind."""
+
+    conn = BACKENDS[backend](server, username, password, krb_auth)
+    conn.bind()
+
+    return conn
+
+
+def collect(server: str, base: str, username: str = "", password: str = "", krb_auth: bool = False,
+            page_size: int = 0, search_filter: str = "(objectClass=*)", targeted: bool = False, workers: int = 1,
+            replicas: list[str] = None, backend: str = "ldap3") -> Iterable:
     """Collect data by performing an LDAP query.
     :param server: server to connect to.
     :param base: base of the LDAP request, leave empty to get all data.
     :param username: username to use in the LDAP bind, leave empty for anonymous bind.
     :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
     :param krb_auth: use Kerberos authentication instead of plaintext.
-    :return list: list of LDAP entries."""
-
-    server = Server(server, get_info=ALL)
-    if krb_auth:
-        conn = Connection(server, authentication=SASL, sasl_mechanism=GSSAPI)
-    elif username.split(",")[0] != "uid=" and password != "":
-        conn = Connection(server, user=username, password=password)
+    :param page_size: size of the pages to retrieve, 0 to retrieve all entries in a single search.
+    :param search_filter: filter of the LDAP request, ignored by targeted searches.
+    :param targeted: run one search per container known to the parser instead of a search of the whole tree.
+    :param workers: number of concurrent connections used by targeted searches.
+    :param replicas: additional servers to spread the targeted searches across.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: list of LDAP entries as (DN, attributes) tuples, or a generator of entries when paging is used."""
+
+    if targeted and (workers > 1 or replicas):
+        return collect_parallel([server] + (replicas or []), base, username, password, krb_auth, page_size, workers,
+                                backend)
+    elif targeted:
+        entries = collect_targeted(server, base, username, password, krb_auth, page_size, backend)
     else:
-        conn = Connection(server)
-    conn.bind()
+        entries = collect_subtree(server, base, username, password, krb_auth, page_size, search_filter, backend)
+
+    return entries if page_size > 0 else list(entries)
+
+
+def collect_subtree(server: str, base: str, username: str, password: str, krb_auth: bool, page_size: int = 0,
+                    search_filter: str = "(objectClass=*)", backend: str = "ldap3") -> Iterator:
+    """Collect all the attributes of all the entries below the base.
+    :param server: server to connect to.
+    :param base: base of the LDAP request, leave empty to get all data.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param search_filter: filter of the LDAP request.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: generator of LDAP entries."""
+
+    conn = connect(server, username, password, krb_auth, backend)
+    try:
+        yield from search(conn, base, search_filter, ["*"], page_size)
+    finally:
+        conn.unbind()
+
+
+def collect_targeted(server: str, base: str, username: str, password: str, krb_auth: bool,
+                     page_size: int = 0, backend: str = "ldap3") -> Iterator:
+    """Collect the entries of the containers known to the parser, with only the attributes the parser reads.
+    :param server: server to connect to.
+    :param base: naming context of the realm, e.g. dc=lab,dc=lo.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: generator of LDAP entries."""
+
+    conn = connect(server, username, password, krb_auth, backend)
+    try:
+        for container, search_filter, attributes in CONTAINERS:
+            yield from search(conn, f"{container},{base}", search_filter, attributes, page_size, LEVEL)
+    finally:
+        conn.unbind()
+
+
+def collect_parallel(servers: list[str], base: str, username: str, password: str, krb_auth: bool,
+                     page_size: int = 0, workers: int = 4, backend: str = "ldap3") -> list:
+    """Collect the entries of the containers known to the parser, running the searches concurrently on a pool of
+    connections. The searches are spread across the servers in a round-robin fashion.
+    :param servers: servers (replicas of the realm) to connect to.
+    :param base: naming context of the realm, e.g. dc=lab,dc=lo.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param workers: number of concurrent searches.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: list of LDAP entries, in the same order as a sequential targeted collection."""
+
+    # LDAP connections are not thread-safe, each worker thread binds its own connection to each server.
+    local = threading.local()
+    connections = []
+
+    def run(task: tuple) -> list:
+        index, (container, search_filter, attributes) = task
+        server = servers[index % len(servers)]
+        pool = local.__dict__.setdefault("connections", {})
+        if server not in pool:
+            pool[server] = connect(server, username, password, krb_auth, backend)
+            connections.append(pool[server])
+        return list(search(pool[server], f"{container},{base}", search_filter, attributes, page_size, LEVEL))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run, enumerate(CONTAINERS)))
+    finally:
+        for conn in connections:
+            conn.unbind()
+
+    return [entry for entries in results for entry in entries]
+
+
+def search(conn: Ldap3Backend | PythonLdapBackend, base: str, search_filter: str, attributes: list,
+           page_size: int = 0, search_scope: str = SUBTREE) -> Iterator:
+    """Run an LDAP search, page by page using the Simple Paged Results control if a page size is given.
+    Only the current page is held in memory.
+    A search the server ends with an error raises ConnectionError, the entries of its last page are not returned.
+    :param conn: bound LDAP connection.
+    :param base: base of the LDAP request.
+    :param search_filter: filter of the LDAP request.
+    :param attributes: attributes to retrieve.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param search_scope: scope of the LDAP request.
+    :return: generator of LDAP entries, as (DN, attributes) tuples."""
+
+    cookie = None
+    while True:
+        with STATS.phase("search"):
+            entries, cookie, result = conn.search(base, search_filter, attributes, search_scope, page_size, cookie)
+        if result not in SEARCH_DONE:
+            # A search ended by the server (exceeded size or administrative limit, busy server...) has no cookie either,
+            # it must not be taken for the last page of a complete search.
+            raise ConnectionError(f"The search of {base} failed with result code {result}.")
+        yield from entries
+        if page_size <= 0 or not cookie:
+            break
+
+
+def classify(dn: str, ldap_realm: str) -> str | None:
+    """Classify an LDAP entry based on the attribute of its RDN and on the container it is stored in.
+    :param dn: DN of the entry.
+    :param ldap_realm: realm as a DN suffix, e.g. ,dc=lab,dc=lo.
+    :return: type of the entry, None if the entry is not parsed."""
+
+    if not dn.endswith(ldap_realm):
+        return None
+    # The names of the containers have no escaped comma, the DN can be split from the right.
+    parts = dn[:-len(ldap_realm)].rsplit(",", 2)
+    attribute = parts[0].partition("=")[0].lower()
+    if len(parts) == 3 and (f"{parts[1]},{parts[2]}", attribute) in CLASSES:
+        return CLASSES[(f"{parts[1]},{parts[2]}", attribute)]
+    elif len(parts) > 1:
+        return CLASSES.get((parts[-1], attribute))
+    return None
+
+
+def count_key(kind: str | None, realm_object) -> str:
+    """Returns the key of an entry in the counter of the parsed entries.
+    :param kind: type of the entry, None if it is not parsed.
+    :param realm_object: object built from the entry, None if mandatory attributes are missing or the rule is disabled.
+    :return: type of the entry, "unmatched" or "<type> (skipped)"."""
+
+    if kind is None:
+        return "unmatched"
+    return kind if realm_object is not None else f"{kind} (skipped)"
+
+
+def value(attrs: dict, name: str):
+    """Returns the value of an attribute, or the list of its values if it has several values.
+    :param attrs: attributes of an LDAP entry.
+    :param name: name of the attribute.
+    :return: value of the attribute."""
+
+    values = attrs[name]
+    if isinstance(values, list):
+        return values[0] if len(values) == 1 else values
+    return values
+
+
+def values(attrs: dict, name: str) -> list:
+    """Returns the values of an attribute as a list.
+    :param attrs: attributes of an LDAP entry.
+    :param name: name of the attribute.
+    :return: values of the attribute."""
+
+    values = attrs[name]
+    return list(values) if isinstance(values, list) else [values]
+
+
+def has(attrs: dict, *names: str) -> bool:
+    """Check that an LDAP entry has all the given attributes.
+    :param attrs: attributes of an LDAP entry.
+    :param names: names of the attributes.
+    :return: True if all the attributes are present."""
+
+    return all(name in attrs for name in names)
+
+
+def is_enabled_rule(attrs: dict) -> bool:
+    """Check that an HBAC or sudo rule is enabled.
+    :param attrs: attributes of the rule LDAP entry.
+    :return: True if the rule is enabled."""
+
+    # ldap3 formats the flag as a boolean when it knows the schema, it is the TRUE or FALSE string otherwise.
+    return has(attrs, "ipaUniqueID", "ipaEnabledFlag") and str(value(attrs, "ipaEnabledFlag")).upper() == "TRUE"
+
+
+def set_status(realm_object: Node | LegacyNode, attrs: dict) -> Node | LegacyNode:
+    """Set the description and the status of a node from its LDAP entry.
+    :param realm_object: node to update.
+    :param attrs: attributes of the LDAP entry of the node.
+    :return: the updated node."""
+
+    if "description" in attrs:
+        realm_object.set_desc(value(attrs, "description"))
+    if all(attr not in attrs for attr in ["krbLastPwdChange", "krbPasswordExpiration"]):
+        realm_object.enabled = False
+    return realm_object
+
+
+def build_domain(dn: str, attrs: dict, sid: str) -> Domain | None:
+    """Build a domain from its LDAP entry, None if mandatory attributes are missing."""
+
+    if has(attrs, "cn", "ipaNTDomainGUID", "ipaNTFlatName"):
+        return set_status(Domain(dn, value(attrs, "cn"), value(attrs, "ipaNTDomainGUID"),
+                                 value(attrs, "ipaNTFlatName"), sid), attrs)
+
+
+def build_user(dn: str, attrs: dict, sid: str) -> User | None:
+    """Build a user from its LDAP entry, None if mandatory attributes are missing."""
+
+    if has(attrs, "ipaUniqueID"):
+        return set_status(User(dn, value(attrs, "uid"), value(attrs, "gecos"), value(attrs, "homeDirectory"),
+                               value(attrs, "ipaUniqueID"), value(attrs, "krbCanonicalName"),
+                               value(attrs, "krbPrincipalName"), value(attrs, "loginShell"), value(attrs, "sn"),
+                               value(attrs, "uid"), value(attrs, "uidNumber"), sid), attrs)
+
+
+def build_group(dn: str, attrs: dict, sid: str) -> Group | None:
+    """Build a group or a hostgroup from its LDAP entry, None if it has no member."""
+
+    if has(attrs, "cn", "ipaUniqueID", "member"):
+        return set_status(Group(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), values(attrs, "member"), sid),
+                          attrs)
+
+
+def build_computer(dn: str, attrs: dict, sid: str) -> Computer | None:
+    """Build a computer from its LDAP entry, None if mandatory attributes are missing."""
+
+    if has(attrs, "cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"):
+        return Computer(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), value(attrs, "krbCanonicalName"),
+                        value(attrs, "krbPrincipalName"), value(attrs, "fqdn"), sid)
+
+
+def build_hbac(dn: str, attrs: dict, sid: str) -> HBAC | None:
+    """Build an HBAC from its LDAP entry, None if the rule is disabled."""
+
+    if is_enabled_rule(attrs):
+        return HBAC(*parse_hbac(attrs))
+
+
+def build_sudorule(dn: str, attrs: dict, sid: str) -> Sudoer | None:
+    """Build a sudoer rule from its LDAP entry, None if the rule is disabled."""
+
+    if is_enabled_rule(attrs):
+        return Sudoer(*parse_sudoer(attrs))
+
+
+def build_compact_sudorule(dn: str, attrs: dict, sid: str) -> CompactSudoer | None:
+    """Build a sudoer rule with the compact edge model from its LDAP entry, None if the rule is disabled."""
+
+    if is_enabled_rule(attrs):
+        name = value(attrs, "cn") if "cn" in attrs else value(attrs, "ipaUniqueID")
+        return CompactSudoer(*parse_sudoer(attrs), SudoRule(dn, name, value(attrs, "ipaUniqueID"), sid))
+
+
+def build_service(dn: str, attrs: dict, sid: str) -> tuple | None:
+    """Build the service principal name and the DN of the managing host of a service."""
+
+    if has(attrs, "krbPrincipalName", "managedBy"):
+        return value(attrs, "krbPrincipalName"), value(attrs, "managedBy")
+
+
+def build_hbacservicegroup(dn: str, attrs: dict, sid: str) -> HBACServicesGroup | None:
+    """Build an HBAC service group from its LDAP entry, None if it has no member."""
 
-    conn.search(search_base=base, search_filter="(objectClass=*)", search_scope=SUBTREE, attributes=["*"])
-    data = conn.entries
-    conn.unbind()
+    if has(attrs, "cn", "ipaUniqueID", "member"):
+        return HBACServicesGroup(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), values(attrs, "member"), sid)
 
-    return data
 
+def build_hbacservice(dn: str, attrs: dict, sid: str) -> HBACService | None:
+    """Build an HBAC service from its LDAP entry, None if mandatory attributes are missing."""
 
-def parse(raw: list, realm: str, sid: str) -> tuple:
+    if has(attrs, "cn", "ipaUniqueID"):
+        return HBACService(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), sid)
+
+
+def build_sudocmdgroup(dn: str, attrs: dict, sid: str) -> SudoCmdGroup | None:
+    """Build a sudo command group from its LDAP entry, None if it has no member. Only the docker command group is
+    parsed, the other command groups are skipped."""
+
+    if dn.startswith("cn=docker,") and has(attrs, "cn", "ipaUniqueID", "member"):
+        return SudoCmdGroup(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), values(attrs, "member"), sid)
+
+
+def build_sudocmd(dn: str, attrs: dict, sid: str) -> SudoCmd | None:
+    """Build a sudo command from its LDAP entry, None if mandatory attributes are missing."""
+
+    if has(attrs, "sudoCmd", "ipaUniqueID"):
+        return SudoCmd(dn, value(attrs, "sudoCmd"), value(attrs, "ipaUniqueID"), sid)
+
+
+def build_legacy_domain(dn: str, attrs: dict, sid: str) -> LegacyDomain:
+    """Build a legacy domain from its LDAP entry."""
+
+    return set_status(LegacyDomain(dn, value(attrs, "cn"), value(attrs, "ipaNTDomainGUID"),
+                                   value(attrs, "ipaNTFlatName"), value(attrs, "ipaNTSecurityIdentifier"), sid), attrs)
+
+
+def build_legacy_user(dn: str, attrs: dict, sid: str) -> LegacyUser:
+    """Build a legacy user from its LDAP entry."""
+
+    return set_status(LegacyUser(dn, value(attrs, "uid"), value(attrs, "gecos"), value(attrs, "homeDirectory"),
+                                 value(attrs, "ipaUniqueID"), value(attrs, "ipaNTSecurityIdentifier"),
+                                 value(attrs, "krbCanonicalName"), value(attrs, "krbPrincipalName"),
+                                 value(attrs, "loginShell"), value(attrs, "sn"), value(attrs, "uid"),
+                                 value(attrs, "uidNumber"), sid), attrs)
+
+
+def build_legacy_group(dn: str, attrs: dict, sid: str) -> LegacyGroup | None:
+    """Build a legacy group from its LDAP entry, None if it has no member."""
+
+    if has(attrs, "cn", "ipaUniqueID", "ipaNTSecurityIdentifier", "member"):
+        return set_status(LegacyGroup(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"),
+                                      value(attrs, "ipaNTSecurityIdentifier"), values(attrs, "member"), sid), attrs)
+    return build_legacy_hostgroup(dn, attrs, sid)
+
+
+def build_legacy_hostgroup(dn: str, attrs: dict, sid: str) -> LegacyGroup | None:
+    """Build a legacy hostgroup, or a group without SID, from its LDAP entry, None if it has no member.
+    The SID is set by legacy_parse once the number of entries is known."""
+
+    if has(attrs, "cn", "ipaUniqueID", "member"):
+        return set_status(LegacyGroup(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), "",
+                                      values(attrs, "member"), sid), attrs)
+
+
+def build_legacy_computer(dn: str, attrs: dict, sid: str) -> LegacyComputer | None:
+    """Build a legacy computer from its LDAP entry, None if mandatory attributes are missing.
+    The SID is set by legacy_parse once the number of entries is known."""
+
+    if has(attrs, "cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"):
+        return set_status(LegacyComputer(dn, value(attrs, "cn"), value(attrs, "ipaUniqueID"), "",
+                                         value(attrs, "krbCanonicalName"), value(attrs, "krbPrincipalName"),
+                                         value(attrs, "fqdn"), sid), attrs)
+
+
+BUILDERS = {"domain": build_domain, "user": build_user, "group": build_group, "hostgroup": build_group,
+            "computer": build_computer, "hbac": build_hbac, "sudorule": build_sudorule, "service": build_service,
+            "hbacservicegroup": build_hbacservicegroup, "hbacservice": build_hbacservice,
+            "sudocmdgroup": build_sudocmdgroup, "sudocmd": build_sudocmd}
+
+LEGACY_BUILDERS = BUILDERS | {"domain": build_legacy_domain, "user": build_legacy_user, "group": build_legacy_group,
+                              "hostgroup": build_legacy_hostgroup, "computer": build_legacy_computer}
+
+def build_legacy_twin(kind: str, node: Node | None, dn: str, attrs: dict, sid: str) -> LegacyTwin | LegacyNode | None:
+    """Build the legacy counterpart of a node built for the Opengraph output, with the SID the legacy builders would
+    give it. An entry the Opengraph builders skip gets a complete legacy node if the legacy builders accept it.
+    :param kind: type of the entry.
+    :param node: node built for the Opengraph output, None if it was skipped.
+    :param dn: DN of the entry.
+    :param attrs: attributes of the entry.
+    :param sid: SID of the realm.
+    :return: legacy counterpart, None if the legacy builders skip the entry."""
+
+    if node is None:
+        return LEGACY_BUILDERS[kind](dn, attrs, sid)
+    identifier = ""
+    if kind in ("domain", "user") or (kind == "group" and "ipaNTSecurityIdentifier" in attrs):
+        identifier = value(attrs, "ipaNTSecurityIdentifier")
+    # The legacy computers have the description of their entry, the Opengraph computers have none.
+    desc = None
+    if kind == "computer":
+        desc = str(value(attrs, "description")) if "description" in attrs else ""
+    return LegacyTwin(node, identifier, desc)
+
+
+# Builders replaced by the compact sudo edge model.
+COMPACT_SUDO_BUILDERS = {"sudorule": build_compact_sudorule}
+
+
+def build_batch(batch: list[tuple], ldap_realm: str, sid: str, builders: dict, legacy: bool = False) -> tuple[list, Counter]:
+    """Classify a batch of entries and build their nodes and edges, run in the worker processes of the parallel parse.
+    :param batch: entries as (position, DN, attributes) tuples.
+    :param ldap_realm: realm as a DN suffix, e.g. ,dc=lab,dc=lo.
+    :param sid: SID of the realm.
+    :param builders: builders of the nodes and edges, by type of entry.
+    :param legacy: also build the legacy twins of the domains, users, groups and computers.
+    :return: (position, type, object, legacy twin) of the entries built, and the number of entries of each type."""
+
+    built, counts = [], Counter()
+    for position, dn, attrs in batch:
+        kind = classify(dn, ldap_realm)
+        realm_object = twin = None
+        if kind is not None:
+            realm_object = builders[kind](dn, attrs, sid)
+            if legacy and kind in LEGACY_KINDS:
+                twin = build_legacy_twin(kind, realm_object, dn, attrs, sid)
+            if realm_object is not None or twin is not None:
+                built.append((position, kind, realm_object, twin))
+        counts[count_key(kind, realm_object)] += 1
+    return built, counts
+
+
+def build_parallel(raw: Iterable, ldap_realm: str, sid: str, builders: dict, workers: int, legacy: bool = False) -> list:
+    """Build the nodes and edges of LDAP entries on a pool of worker processes. The entries are sent to the workers by
+    batches, as plain (DN, attributes) tuples, and the objects are returned in the order of the entries. A bounded
+    number of batches is in flight, so that a generator of entries is not held in memory.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :param ldap_realm: realm as a DN suffix, e.g. ,dc=lab,dc=lo.
+    :param sid: SID of the realm.
+    :param builders: builders of the nodes and edges, by type of entry.
+    :param workers: number of worker processes.
+    :param legacy: also build the legacy twins of the domains, users, groups and computers.
+    :return: (position, type, object, legacy twin) of the entries built."""
+
+    entries = ((position, dn, attrs) for position, (dn, attrs) in enumerate(raw))
+    built = []
+    counts = STATS.counter("entries")
+
+    def merge(future):
+        objects, batch_counts = future.result()
+        built.extend(objects)
+        if counts is not None:
+            counts.update(batch_counts)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for batch in batches(entries, lambda: PARSE_BATCH_SIZE):
+            pending.append(executor.submit(build_batch, batch, ldap_realm, sid, builders, legacy))
+            if len(pending) >= 2 * workers:
+                merge(pending.popleft())
+        for future in pending:
+            merge(future)
+    return built
+
+
+# Types of the entries whose legacy counterpart is built by parse_model.
+LEGACY_KINDS = ("domain", "user", "group", "hostgroup", "computer")
+
+
+def buckets(kinds: Iterable[str]) -> dict[str, list]:
+    """Returns an empty list per type of entry, the groups and the hostgroups sharing the same list."""
+
+    parsed = {kind: [] for kind in kinds if kind != "hostgroup"}
+    parsed["hostgroup"] = parsed["group"]
+    return parsed
+
+
+def parse_buckets(raw: Iterable, ldap_realm: str, sid: str, builders: dict, workers: int = 1,
+                  legacy: dict | None = None) -> dict[str, list]:
+    """Classify LDAP entries and build their objects, sorted in one list per type of entry, the groups and the hostgroups
+    sharing the same list.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :param ldap_realm: realm as a DN suffix, e.g. ,dc=lab,dc=lo.
+    :param sid: SID of the realm.
+    :param builders: builders of the nodes and edges, by type of entry.
+    :param workers: number of worker processes building the nodes and edges.
+    :param legacy: lists receiving the legacy twins of the domains, users, groups and computers, by type of entry, None
+    to build no twin. A twin is returned by the same worker as its node, so that it still references it.
+    :return: objects built, by type of entry."""
+
+    parsed = buckets(builders)
+    counts = STATS.counter("entries")
+    if workers > 1:
+        for position, kind, realm_object, twin in build_parallel(raw, ldap_realm, sid, builders, workers, legacy is not None):
+            if realm_object is not None:
+                parsed[kind].append(realm_object)
+            if twin is not None:
+                legacy[kind].append(twin)
+        return parsed
+    for dn, attrs in raw:
+        kind = classify(dn, ldap_realm)
+        realm_object = None
+        if kind is not None:
+            realm_object = builders[kind](dn, attrs, sid)
+            if realm_object is not None:
+                parsed[kind].append(realm_object)
+            if legacy is not None and kind in LEGACY_KINDS:
+                twin = build_legacy_twin(kind, realm_object, dn, attrs, sid)
+                if twin is not None:
+                    legacy[kind].append(twin)
+        if counts is not None:
+            counts[count_key(kind, realm_object)] += 1
+    return parsed
+
+
+def set_spns(computers: list, spns: list):
+    """Add the service principal names of the services to the computers managing them.
+    :param computers: computers of the realm.
+    :param spns: services, as (service principal name, DN of the managing host) tuples."""
+
+    index = DNIndex(computers)
+    for spn, managed_by in spns:
+        if str(managed_by) in index:
+            index[str(managed_by)].set_spn(spn)
+
+
+def parse(raw: Iterable, realm: str, sid: str, compact_sudo: bool = False, workers: int = 1) -> tuple:
     """Parse LDAP data for use in the Opengraph file format.
-    :param raw: list of LDAP entries.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
     :param realm: name of the realm.
     :param sid: SID of the realm.
+    :param compact_sudo: model the sudo rules as SudoRule nodes holding the commands and runas users, linked to their
+    users and hosts.
+    :param workers: number of worker processes building the nodes and edges.
     :return: tuple of domains, users, groups, computers, hbac and membership."""
 
     ldap_realm = "".join([",dc=" + dc for dc in realm.split(".")])
-    domains, users, groups, computers, hbac, sudoer, membership, spns, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = [], [], [], [], [], [], [], [], [], [], [], []
-    for index, entry in enumerate(raw):
-        dn = entry.entry_dn
-        realm_object = None
-        if re.match(f"cn=.+,cn=ad,cn=etc{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaNTDomainGUID", "ipaNTFlatName"]):
-            realm_object = Domain(dn, entry["cn"], entry["ipaNTDomainGUID"], entry["ipaNTFlatName"], sid)
-            domains.append(realm_object)
-        elif re.match(f"uid=.+,cn=users,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID"]):
-            realm_object = User(dn, entry["uid"], entry["gecos"], entry["homeDirectory"], entry["ipaUniqueID"],
-                                entry["krbCanonicalName"], entry["krbPrincipalName"], entry["loginShell"],
-                                entry["sn"], entry["uid"], entry["uidNumber"], sid)
-            users.append(realm_object)
-        elif re.match(f"cn=.+,cn=(hostgroups|groups),cn=accounts{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            realm_object = Group(dn, entry["cn"], entry["ipaUniqueID"], entry["member"], sid)
-            membership.append(Membership(realm_object.member_dn, [realm_object.get_dn()]))
-            groups.append(realm_object)
-        elif re.match(f"fqdn=.+,cn=computers,cn=accounts{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in
-                ["cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"]):
-            computers.append(Computer(dn, entry["cn"], entry["ipaUniqueID"], entry["krbCanonicalName"],
-                                    entry["krbPrincipalName"], entry["fqdn"], sid))
-        elif re.match(f"ipaUniqueID=.+,cn=hbac{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(
-                entry["ipaEnabledFlag"]) == "True":
-            members, hosts, services, ipaid = parse_hbac(entry)
-            hbac.append(HBAC(members, hosts, services, ipaid))
-        elif re.match(f"ipaUniqueID=.+,cn=sudorules,cn=sudo{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(
-                entry["ipaEnabledFlag"]) == "True":
-            members, hosts, commands, asusers, ipaid = parse_sudoer(entry)
-            sudoer.append(Sudoer(members, hosts, commands, asusers, ipaid))
-        elif re.match(f"krbprincipalname=.+,cn=services,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["krbPrincipalName", "managedBy"]):
-            spns.append((entry["krbPrincipalName"], entry["managedBy"]))
-        elif re.match(f"cn=.+,cn=hbacservicegroups,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            hbacservicesgroups.append(HBACServicesGroup(dn, entry["cn"], entry["ipaUniqueID"], entry["member"], sid))
-        elif re.match(f"cn=.+,cn=hbacservices,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID"]):
-            hbacservices.append(HBACService(dn, entry["cn"], entry["ipaUniqueID"], sid))
-        elif re.match(f"cn=docker,cn=sudocmdgroups,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            sudocmdgroups.append(SudoCmdGroup(dn, entry["cn"], entry["ipaUniqueID"], entry["member"], sid))
-        elif re.match(f"ipaUniqueID=.+,cn=sudocmds,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["sudoCmd", "ipaUniqueID"]):
-            sudocmds.append(SudoCmd(dn, entry["sudoCmd"], entry["ipaUniqueID"], sid))
-
-        if realm_object is not None:
-            if "description" in entry.entry_attributes_as_dict.keys():
-                realm_object.set_desc(entry["description"])
-            if all(attr not in entry.entry_attributes_as_dict.keys() for attr in ["krbLastPwdChange", "krbPasswordExpiration"]):
-                realm_object.enabled = False
-
-
-    for spn in spns:
-        for computer in computers:
-            if spn[1] == computer.get_dn():
-                computer.set_spn(spn[0])
+    builders = BUILDERS | COMPACT_SUDO_BUILDERS if compact_sudo else BUILDERS
+    parsed = parse_buckets(raw, ldap_realm, sid, builders, workers)
+    domains, users, groups, computers, hbac, sudoer, spns = (parsed[kind] for kind in ("domain", "user", "group", "computer", "hbac", "sudorule", "service"))
+
+    membership = [Membership(group) for group in groups]
+    set_spns(computers, spns)
 
     logger.info(f"Found {len(domains)} domains.")
     logger.info(f"Found {len(users)} users.")
@@ -106,139 +615,171 @@ def parse(raw: list, realm: str, sid: str) -> tuple:
     logger.info(f"Found {len(hbac)} HBAC.")
     logger.info(f"Found {len(sudoer)} sudoers")
 
-    return domains, users, groups, computers, hbac, sudoer, membership, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds
+    return domains, users, groups, computers, hbac, sudoer, membership, parsed["hbacservicegroup"], parsed["hbacservice"], parsed["sudocmdgroup"], parsed["sudocmd"]
+
+
+def number_objects(objects: list, sid: str):
+    """Give a SID to the legacy objects without one, the hostgroups and the groups and computers without a SID. The RID
+    is derived from the ipaUniqueID of the object, so that it does not depend on the searches run (targeted or of the
+    whole tree) nor on the other entries. A RID already given is replaced by the next free one, in the order of the
+    ipaUniqueID.
+    :param objects: legacy objects without a SID.
+    :param sid: SID of the realm."""
 
+    taken = set()
+    for realm_object in sorted(objects, key=lambda realm_object: realm_object.ipaUniqueID):
+        rid = int.from_bytes(hashlib.sha256(realm_object.ipaUniqueID.encode()).digest()[:4], "big") % SYNTHETIC_RIDS
+        while rid in taken:
+            rid = (rid + 1) % SYNTHETIC_RIDS
+        taken.add(rid)
+        realm_object.ipaNTSecurityIdentifier = f"{sid}-{SYNTHETIC_RIDS + rid}"
 
-def legacy_parse(raw, realm, sid) -> tuple:
+
+def legacy_parse(raw: Iterable, realm: str, sid: str, compact_sudo: bool = False, workers: int = 1) -> tuple:
     """Parse LDAP data for use in the legacy file format.
-    :param raw: list of LDAP entries.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
     :param realm: name of the realm.
     :param sid: SID of the realm.
+    :param compact_sudo: model the sudo rules as SudoRule nodes holding the commands and runas users, linked to their
+    users and hosts.
+    :param workers: number of worker processes building the nodes and edges.
     :return: tuple of domains, users, groups, computers, hbac and membership."""
 
     ldap_realm = "".join([",dc=" + dc for dc in realm.split(".")])
-    domains, users, groups, computers, hbac, sudoer, spns, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = [], [], [], [], [], [], [], [], [], [], []
-    num_objects = len(raw) + 1000
-    for index, entry in enumerate(raw):
-        dn = entry.entry_dn
-        realm_object = None
-        if re.match(f"cn=.+,cn=ad,cn=etc{ldap_realm}", dn):
-            realm_object = LegacyDomain(dn, entry["cn"], entry["ipaNTDomainGUID"], entry["ipaNTFlatName"],
-                                        entry["ipaNTSecurityIdentifier"], sid)
-            domains.append(realm_object)
-        elif re.match(f"uid=.+,cn=users,cn=accounts{ldap_realm}", dn):
-            realm_object = LegacyUser(dn, entry["uid"], entry["gecos"], entry["homeDirectory"], entry["ipaUniqueID"],
-                                      entry["ipaNTSecurityIdentifier"], entry["krbCanonicalName"],
-                                      entry["krbPrincipalName"],
-                                      entry["loginShell"], entry["sn"], entry["uid"], entry["uidNumber"], sid)
-            users.append(realm_object)
-        elif re.match(f"cn=.+,cn=groups,cn=accounts{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in
-                ["cn", "ipaUniqueID", "ipaNTSecurityIdentifier", "member"]):
-            realm_object = LegacyGroup(dn, entry["cn"], entry["ipaUniqueID"], entry["ipaNTSecurityIdentifier"],
-                                       entry["member"], sid)
-            groups.append(realm_object)
-        elif re.match(f"cn=.+,cn=(hostgroups|groups),cn=accounts{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            realm_object = LegacyGroup(dn, entry["cn"], entry["ipaUniqueID"], sid + "-" + str(num_objects + index),
-                                       entry["member"], sid)
-            groups.append(realm_object)
-        elif re.match(f"fqdn=.+,cn=computers,cn=accounts{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in
-                ["cn", "ipaUniqueID", "krbCanonicalName", "krbPrincipalName", "fqdn"]):
-            realm_object = LegacyComputer(dn, entry["cn"], entry["ipaUniqueID"], sid + "-" + str(num_objects + index),
-                                          entry["krbCanonicalName"], entry["krbPrincipalName"], entry["fqdn"], sid)
-            computers.append(realm_object)
-        elif re.match(f"ipaUniqueID=.+,cn=hbac{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(
-                entry["ipaEnabledFlag"]) == "True":
-            members, hosts, services, ipaid = parse_hbac(entry)
-            hbac.append(HBAC(members, hosts, services, ipaid))
-        elif re.match(f"ipaUniqueID=.+,cn=sudorules,cn=sudo{ldap_realm}", dn) and all(
-                attr in entry.entry_attributes_as_dict.keys() for attr in ["ipaUniqueID", "ipaEnabledFlag"]) and str(
-                entry["ipaEnabledFlag"]) == "True":
-            members, hosts, commands, asusers, ipaid = parse_sudoer(entry)
-            sudoer.append(Sudoer(members, hosts, commands, asusers, ipaid))
-        elif re.match(f"krbprincipalname=.+,cn=services,cn=accounts{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["krbPrincipalName", "managedBy"]):
-            spns.append((entry["krbPrincipalName"], entry["managedBy"]))
-        elif re.match(f"cn=.+,cn=hbacservicegroups,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            hbacservicesgroups.append(HBACServicesGroup(dn, entry["cn"], entry["ipaUniqueID"], entry["member"], sid))
-        elif re.match(f"cn=.+,cn=hbacservices,cn=hbac{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID"]):
-            hbacservices.append(HBACService(dn, entry["cn"], entry["ipaUniqueID"], sid))
-        elif re.match(f"cn=docker,cn=sudocmdgroups,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["cn", "ipaUniqueID", "member"]):
-            sudocmdgroups.append(SudoCmdGroup(dn, entry["cn"], entry["ipaUniqueID"], entry["member"], sid))
-        elif re.match(f"ipaUniqueID=.+,cn=sudocmds,cn=sudo{ldap_realm}", dn) and all(attr in entry.entry_attributes_as_dict.keys() for attr in ["sudoCmd", "ipaUniqueID"]):
-            sudocmds.append(SudoCmd(dn, entry["sudoCmd"], entry["ipaUniqueID"], sid))
-
-        if realm_object is not None:
-            if "description" in entry.entry_attributes_as_dict.keys():
-                realm_object.set_desc(entry["description"])
-            if all(attr not in entry.entry_attributes_as_dict.keys() for attr in ["krbLastPwdChange", "krbPasswordExpiration"]):
-                realm_object.enabled = False
-
-
-    for spn in spns:
-        for computer in computers:
-            if spn[1] == computer.get_dn():
-                computer.set_spn(spn[0])
+    builders = LEGACY_BUILDERS | COMPACT_SUDO_BUILDERS if compact_sudo else LEGACY_BUILDERS
+    parsed = parse_buckets(raw, ldap_realm, sid, builders, workers)
+    domains, users, groups, computers = (parsed[kind] for kind in ("domain", "user", "group", "computer"))
+    number_objects([node for node in groups + computers if not node.ipaNTSecurityIdentifier], sid)
+    set_spns(computers, parsed["service"])
 
     logger.info(f"Found {len(domains)} domains.")
     logger.info(f"Found {len(users)} users.")
     logger.info(f"Found {len(groups)} groups.")
     logger.info(f"Found {len(computers)} computer.")
 
-    return domains, users, groups, computers, hbac, sudoer, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds
+    return domains, users, groups, computers, parsed["hbac"], parsed["sudorule"], parsed["hbacservicegroup"], parsed["hbacservice"], parsed["sudocmdgroup"], parsed["sudocmd"]
+
+
+def parse_model(raw: Iterable, realm: str, sid: str, compact_sudo: bool = False, workers: int = 1) -> RealmModel:
+    """Parse LDAP data in a single pass for use in both the Opengraph and the legacy file formats. The legacy nodes are
+    twins of the Opengraph nodes holding their SID, the properties are shared.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :param realm: name of the realm.
+    :param sid: SID of the realm.
+    :param compact_sudo: model the sudo rules as SudoRule nodes holding the commands and runas users, linked to their
+    users and hosts.
+    :param workers: number of worker processes building the nodes, the edges and the legacy twins.
+    :return: model of the realm."""
+
+    ldap_realm = "".join([",dc=" + dc for dc in realm.split(".")])
+    builders = BUILDERS | COMPACT_SUDO_BUILDERS if compact_sudo else BUILDERS
+    legacy = buckets(LEGACY_KINDS)
+    parsed = parse_buckets(raw, ldap_realm, sid, builders, workers, legacy)
+    domains, users, groups, computers, hbac, sudoer, spns = (parsed[kind] for kind in ("domain", "user", "group", "computer", "hbac", "sudorule", "service"))
+    number_objects([twin for twin in legacy["group"] + legacy["computer"] if not twin.ipaNTSecurityIdentifier], sid)
+
+    membership = [Membership(group) for group in groups]
+    # The legacy computers are all twins of the Opengraph computers, the builders skipping the same entries.
+    set_spns(computers, spns)
 
+    logger.info(f"Found {len(domains)} domains.")
+    logger.info(f"Found {len(users)} users.")
+    logger.info(f"Found {len(groups)} groups.")
+    logger.info(f"Found {len(computers)} computer with {len(spns)} services.")
+    logger.info(f"Found {len(hbac)} HBAC.")
+    logger.info(f"Found {len(sudoer)} sudoers")
 
-def parse_hbac(entry: ldap3.abstract.entry.Entry) -> tuple:
+    return RealmModel((domains, users, groups, computers, hbac, sudoer, membership, parsed["hbacservicegroup"],
+                       parsed["hbacservice"], parsed["sudocmdgroup"], parsed["sudocmd"]),
+                      (legacy["domain"], legacy["user"], legacy["group"], legacy["computer"]))
+
+
+def collect_with_sid(server: str, base: str, username: str, password: str, krb_auth: bool, realm: str,
+                     page_size: int = 0, targeted: bool = False, workers: int = 1, replicas: list[str] = None,
+                     backend: str = "ldap3") -> tuple[Iterable, str]:
+    """Collect the entries of a realm and identify its SID. When the entries are retrieved by pages, they are streamed to
+    the parser and the SID is looked up with a dedicated search beforehand.
+    :param server: server to connect to.
+    :param base: base of the LDAP request, leave empty to get all data.
+    :param username: username to use in the LDAP bind, leave empty for anonymous bind.
+    :param password: password to use in the LDAP bind, leave empty for anonymouse bind.
+    :param krb_auth: use Kerberos authentication instead of plaintext.
+    :param realm: name of the realm.
+    :param page_size: size of the pages to retrieve, 0 to retrieve all entries in a single search.
+    :param targeted: run one search per container known to the parser instead of a search of the whole tree.
+    :param workers: number of concurrent connections used by targeted searches.
+    :param replicas: additional servers to spread the targeted searches across.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: LDAP entries, as returned by collect, and SID of the realm."""
+
+    if page_size > 0:
+        realm_dn = ",".join("dc=" + dc for dc in realm.split("."))
+        sid_filter = f"(|(cn={realm})(cn=Default SMB Group))"
+        with STATS.phase("sid"):
+            sid = identify_realm_sid(collect(server, base or realm_dn, username, password, krb_auth,
+                                             search_filter=sid_filter, backend=backend), realm)
+    data = collect(server, base, username, password, krb_auth, page_size, targeted=targeted, workers=workers,
+                   replicas=replicas, backend=backend)
+    if page_size <= 0:
+        with STATS.phase("sid"):
+            sid = identify_realm_sid(data, realm)
+    return data, sid
+
+
+def parse_realm(raw: Iterable, realm: str, sid: str, compact_sudo: bool = False, workers: int = 1,
+                effective: bool = False, legacy: bool = False) -> tuple[RealmModel, list]:
+    """Parse the entries of a realm for the Opengraph output and resolve the member DN of its groups and edges, each
+    step being a phase of the run.
+    :param raw: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :param realm: name of the realm.
+    :param sid: SID of the realm.
+    :param compact_sudo: model the sudo rules as SudoRule nodes holding the commands and runas users, linked to their
+    users and hosts.
+    :param workers: number of worker processes building the nodes and edges.
+    :param effective: add the effective membership edges.
+    :param legacy: also build the legacy nodes, with parse_model.
+    :return: model of the realm, resolved, and its effective membership edges."""
+
+    with STATS.phase("parse"):
+        if legacy:
+            model = parse_model(raw, realm, sid, compact_sudo, workers)
+        else:
+            model = RealmModel(parse(raw, realm, sid, compact_sudo, workers))
+    model.resolve()
+    edges = []
+    if effective:
+        # Only imported when the effective membership is requested.
+        from idmhound.graph.closure import effective_membership
+        with STATS.phase("closure"):
+            edges = effective_membership(model.groups)
+    return model, edges
+
+
+def parse_hbac(attrs: dict) -> tuple:
     """Parse an HBAC LDAP entry.
-    :param entry: HBAC ldap entry.
+    :param attrs: attributes of the HBAC LDAP entry.
     :return: members, hosts, services and ID of the HBAC."""
 
-    if "userCategory" in entry.entry_attributes_as_dict.keys():
-        members = list(entry["userCategory"])
-    else:
-        members = list(entry["memberUser"])
-    if "hostCategory" in entry.entry_attributes_as_dict.keys():
-        hosts = list(entry["hostCategory"])
-    else:
-        hosts = list(entry["memberHost"])
-    if "serviceCategory" in entry.entry_attributes_as_dict.keys():
-        services = list(entry["serviceCategory"])
-    else:
-        services = list(entry["memberService"])
+    members = values(attrs, "userCategory") if "userCategory" in attrs else values(attrs, "memberUser")
+    hosts = values(attrs, "hostCategory") if "hostCategory" in attrs else values(attrs, "memberHost")
+    services = values(attrs, "serviceCategory") if "serviceCategory" in attrs else values(attrs, "memberService")
 
-    return members, hosts, services, entry["ipaUniqueID"]
+    return members, hosts, services, value(attrs, "ipaUniqueID")
 
-def parse_sudoer(entry: ldap3.abstract.entry.Entry) -> tuple:
+def parse_sudoer(attrs: dict) -> tuple:
     """Parse sudoer rules LDAP entry.
-    :param entry: sudoer rules LDAP entry.
+    :param attrs: attributes of the sudoer rules LDAP entry.
     :return: members, hosts, commands, asusers and ID of sudoer rules."""
 
-    if "userCategory" in entry.entry_attributes_as_dict.keys():
-        members = list(entry["userCategory"])
-    elif "memberUser" in entry.entry_attributes_as_dict.keys():
-        members = list(entry["memberUser"])
-    else:
-        members = []
-    if "hostCategory" in entry.entry_attributes_as_dict.keys():
-        hosts = list(entry["hostCategory"])
-    elif "memberHost" in entry.entry_attributes_as_dict.keys():
-        hosts = list(entry["memberHost"])
-    else:
-        hosts = []
-    if "cmdCategory" in entry.entry_attributes_as_dict.keys():
-        commands = list(entry["cmdCategory"])
-    elif "memberAllowCmd" in entry.entry_attributes_as_dict.keys():
-        commands = list(entry["memberAllowCmd"])
-    else:
-        commands = []
-    if "ipaSudoRunAsUserCategory" in entry.entry_attributes_as_dict.keys():
-        asusers = list(entry["ipaSudoRunAsUserCategory"])
-    elif "ipaSudoRunAs" in entry.entry_attributes_as_dict.keys():
-        asusers = list(entry["ipaSudoRunAs"])
-    else:
-        asusers = []
+    members, hosts, commands, asusers = [], [], [], []
+    for attribute, category, member in [(members, "userCategory", "memberUser"),
+                                        (hosts, "hostCategory", "memberHost"),
+                                        (commands, "cmdCategory", "memberAllowCmd"),
+                                        (asusers, "ipaSudoRunAsUserCategory", "ipaSudoRunAs")]:
+        if category in attrs:
+            attribute.extend(values(attrs, category))
+        elif member in attrs:
+            attribute.extend(values(attrs, member))
 
     return members, hosts, commands, asusers, ""
 
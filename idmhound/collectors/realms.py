@@ -0,0 +1,107 @@
+# -*- coding:utf-8 -*-
+
+import logging
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from idmhound.collectors import ldap
+from idmhound.stats import STATS
+
+logger = logging.getLogger()
+
+# Settings of a realm in the configuration file, with their default value.
+SETTINGS = {"domain": None, "domain_controller": None, "username": "", "password": "", "kerberos": False,
+            "base_dn": "", "replicas": []}
+
+
+def load_realms(path: str) -> list[dict]:
+    """Load the realms to collect from a TOML configuration file, one [[realm]] table per realm, e.g.:
+
+        [[realm]]
+        domain = "lab.lo"
+        domain_controller = "idm01.lab.lo"
+        username = "admin"
+        password = "Secret123"
+
+    A realm listing replicas is collected with targeted searches, as with --replicas.
+    :param path: path of the configuration file.
+    :return: list of realm settings."""
+
+    with open(path, "rb") as config:
+        tables = tomllib.load(config).get("realm", [])
+    realms = []
+    for table in tables:
+        unknown = set(table) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown realm settings in {path}: {', '.join(sorted(unknown))}")
+        realm = SETTINGS | table
+        if not realm["domain"] or not realm["domain_controller"]:
+            raise ValueError(f"Each realm of {path} requires a domain and a domain_controller.")
+        if realm["domain"].lower() in (other["domain"].lower() for other in realms):
+            raise ValueError(f"The realm {realm['domain']} is listed several times in {path}.")
+        realms.append(realm)
+    if not realms:
+        raise ValueError(f"No [[realm]] in {path}.")
+    return realms
+
+
+def collect_realm(realm: dict, targeted: bool = True, page_size: int = 0, workers: int = 1,
+                  effective: bool = False, compact_sudo: bool = False, backend: str = "ldap3") -> tuple[list, list]:
+    """Collect, parse and resolve the nodes and edges of a realm.
+    :param realm: settings of the realm.
+    :param targeted: only query the containers and attributes used by IDMHound, implied by the replicas of the realm.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param workers: number of concurrent LDAP searches within the realm.
+    :param effective: add the effective membership edges.
+    :param compact_sudo: model the sudo rules as SudoRule nodes.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: nodes and edges of the realm."""
+
+    domain = realm["domain"]
+    targeted = targeted or bool(realm["replicas"])
+    ldap_realm = "".join([",dc=" + dc for dc in domain.split(".")])
+    bind_dn = f"uid={realm['username']},cn=users,cn=accounts{ldap_realm}"
+    base_dn = (realm["base_dn"] or ldap_realm[1:]) if targeted else realm["base_dn"]
+    logger.info(f"Getting LDAP data of {domain}...")
+    with STATS.phase(f"realm.{domain}"):
+        data, sid = ldap.collect_with_sid(realm["domain_controller"], base_dn, bind_dn, realm["password"],
+                                          realm["kerberos"], domain, page_size, targeted, workers, realm["replicas"],
+                                          backend)
+        logger.info(f"Realm SID of {domain}: {sid}")
+        model, effective_edges = ldap.parse_realm(data, domain, sid, compact_sudo, effective=effective)
+
+    return model.opengraph(effective_edges)
+
+
+def collect_realms(realms: list[dict], targeted: bool = True, page_size: int = 0, workers: int = 1,
+                   effective: bool = False, compact_sudo: bool = False, backend: str = "ldap3") -> tuple[list, list]:
+    """Collect several realms concurrently, one thread per realm, and merge their graphs.
+    The nodes keep their IDs (ipaUniqueID and domain GUID), which are unique across realms and do not depend on the
+    order of the collection. Realms sharing an ID, such as a realm listed under two names, are rejected.
+    :param realms: settings of the realms.
+    :param targeted: only query the containers and attributes used by IDMHound.
+    :param page_size: number of entries per page, 0 to disable paging.
+    :param workers: number of concurrent LDAP searches within each realm.
+    :param effective: add the effective membership edges.
+    :param compact_sudo: model the sudo rules as SudoRule nodes.
+    :param backend: LDAP client library, ldap3 or python-ldap.
+    :return: nodes and edges of all the realms, in the order of the realms.
+    :raise ValueError: when two nodes have the same ID."""
+
+    with ThreadPoolExecutor(max_workers=len(realms)) as executor:
+        futures = [executor.submit(collect_realm, realm, targeted, page_size, workers, effective,
+                                   compact_sudo, backend) for realm in realms]
+        graphs = [future.result() for future in futures]
+
+    nodes, edges, seen = [], [], {}
+    for realm, (realm_nodes, realm_edges) in zip(realms, graphs):
+        for node in realm_nodes:
+            if node.get_id() in seen:
+                raise ValueError(f"{node.get_dn()} of {realm['domain']} has the same ID as {seen[node.get_id()]}.")
+            seen[node.get_id()] = f"{node.get_dn()} of {realm['domain']}"
+        nodes += realm_nodes
+        edges += realm_edges
+    return nodes, edges
+
+
+if __name__ == "__main__":
+    pass
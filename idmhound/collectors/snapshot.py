@@ -0,0 +1,133 @@
+# -*- coding:utf-8 -*-
+
+import base64
+import json
+import mmap
+import os
+import struct
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from typing import BinaryIO
+
+# First record of a snapshot, identifying the format.
+HEADER = {"format": "idmhound-raw", "version": 2}
+
+# Length of a record, before its JSON document.
+LENGTH = struct.Struct("<I")
+
+# Keys of the objects standing for the attribute values JSON cannot represent.
+DATETIME_KEY, BYTES_KEY = "$datetime", "$bytes"
+
+
+def encode_value(value) -> dict:
+    """Encode an attribute value JSON cannot represent: datetimes as ISO 8601 strings, bytes in base64.
+    :param value: value of an attribute, as parsed by the LDAP backend.
+    :return: object standing for the value."""
+
+    if isinstance(value, datetime):
+        return {DATETIME_KEY: value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_KEY: base64.b64encode(value).decode()}
+    raise TypeError(f"Cannot save a value of type {type(value).__name__} to a snapshot.")
+
+
+def decode_value(value: dict):
+    """Decode the objects standing for datetimes and bytes, the other objects are left as they are."""
+
+    if len(value) == 1:
+        if DATETIME_KEY in value:
+            return datetime.fromisoformat(value[DATETIME_KEY])
+        if BYTES_KEY in value:
+            return base64.b64decode(value[BYTES_KEY])
+    return value
+
+
+def to_record(value) -> bytes:
+    """Encode a value as a record: its length on four bytes followed by its JSON document."""
+
+    data = json.dumps(value, default=encode_value, ensure_ascii=False, separators=(",", ":")).encode()
+    return LENGTH.pack(len(data)) + data
+
+
+def write_record(output: BinaryIO, value):
+    """Write a value as a record.
+    :param output: file to write to.
+    :param value: value to write."""
+
+    output.write(to_record(value))
+
+
+def read_record(source: BinaryIO | mmap.mmap):
+    """Read the next record.
+    :param source: file or memory map to read from.
+    :return: value of the record, None at the end of the file."""
+
+    length = source.read(LENGTH.size)
+    if not length:
+        return None
+    if len(length) < LENGTH.size:
+        raise ValueError("Truncated record.")
+    data = source.read(LENGTH.unpack(length)[0])
+    if len(data) < LENGTH.unpack(length)[0]:
+        raise ValueError("Truncated record.")
+    return json.loads(data, object_hook=decode_value)
+
+
+def save_raw(path: str, entries: Iterable) -> Iterable:
+    """Write the collected LDAP entries to a snapshot, one length-prefixed JSON (DN, attributes) record per entry.
+    The attributes are saved as parsed by the LDAP backend, datetimes and bytes included, so that a snapshot parses
+    exactly as the live entries.
+    :param path: path of the snapshot.
+    :param entries: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :return: list of the entries, or a generator of the entries writing the snapshot as it is consumed."""
+
+    if isinstance(entries, list):
+        return list(dump(path, entries))
+    return dump(path, entries)
+
+
+def dump(path: str, entries: Iterable) -> Iterator:
+    """Write LDAP entries to a snapshot as they are consumed.
+    :param path: path of the snapshot.
+    :param entries: list or generator of LDAP entries, as (DN, attributes) tuples.
+    :return: generator of the entries."""
+
+    with open(path, "wb") as output:
+        write_record(output, HEADER)
+        for dn, attributes in entries:
+            write_record(output, (dn, attributes))
+            yield dn, attributes
+
+
+def load_raw(path: str) -> Iterator:
+    """Read the LDAP entries of a snapshot, through a memory map of the file.
+    :param path: path of the snapshot.
+    :return: generator of LDAP entries, as (DN, attributes) tuples."""
+
+    if os.path.getsize(path) == 0:
+        # An empty file cannot be mapped.
+        raise ValueError(f"{path} is not an IDMHound raw snapshot.")
+    with open(path, "rb") as raw, mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        try:
+            header = read_record(mapped)
+        except ValueError:
+            header = None
+        if header != HEADER:
+            raise ValueError(f"{path} is not an IDMHound raw snapshot.")
+        while (record := read_record(mapped)) is not None:
+            dn, attributes = record
+            yield dn, attributes
+
+
+def is_raw(path: str) -> bool:
+    """Tell whether a file is an IDMHound raw snapshot from its first bytes.
+    :param path: path of the file.
+    :return: True if the file is a snapshot."""
+
+    header = to_record(HEADER)
+    with open(path, "rb") as raw:
+        return raw.read(len(header)) == header
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,165 @@
+# -*- coding:utf-8 -*-
+
+from collections.abc import Iterator
+from idmhound.graph.closure import transitive_members
+
+
+def to_mask(positions: list[int]) -> int:
+    """Build a bit vector from the positions of its set bits.
+    :param positions: positions of the bits to set.
+    :return: bit vector as an integer."""
+
+    if not positions:
+        return 0
+    vector = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        vector[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(vector, "little")
+
+
+def to_positions(mask: int) -> Iterator[int]:
+    """Generate the positions of the set bits of a bit vector.
+    :param mask: bit vector as an integer.
+    :return: generator of positions, in increasing order."""
+
+    digits = bin(mask)[:1:-1]
+    position = digits.find("1")
+    while position != -1:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+def service_name(service: str) -> str:
+    """Normalize the name of an HBAC service the way HBACService does."""
+
+    return str(service).replace("-", "")
+
+
+class HBACAccess():
+    """Effective access granted by the enabled HBAC rules, as (user, host, service) triples.
+    The users and hosts of each rule are expanded through nested groups and hostgroups and the "all" categories, and
+    stored as bit vectors over the users and the computers of the realm. Services are the names of the HBAC services,
+    service groups being expanded by member_lookup, and the rules allowing all services being expanded to the HBAC
+    services of the realm. The HBAC rules and the groups must be resolved with member_lookup first, the "all" categories
+    being expanded to all the users or hosts."""
+
+    def __init__(self, hbac: list, users: list, computers: list, groups: list, services: list):
+
+        self.users = users
+        self.computers = computers
+        self.user_bits = {user.get_dn(): position for position, user in enumerate(users)}
+        self.host_bits = {computer.get_dn(): position for position, computer in enumerate(computers)}
+        self.closure = transitive_members(groups)
+        user_positions = {user: position for position, user in enumerate(users)}
+        host_positions = {computer: position for position, computer in enumerate(computers)}
+        user_masks, host_masks = {}, {}
+        names = [service.get_cn() for service in services]
+        self.rules = [(self.expand(rule.starts, user_positions, user_masks),
+                       self.expand(rule.ends, host_positions, host_masks),
+                       list(dict.fromkeys(names if "all" in rule.kinds else rule.kinds))) for rule in hbac]
+
+    def expand(self, nodes: list, positions: dict, masks: dict) -> int:
+        """Expand the members of a rule to a bit vector.
+        :param nodes: resolved members of the rule.
+        :param positions: positions of the users or of the computers, by node.
+        :param masks: bit vectors of the groups already expanded, by group.
+        :return: bit vector of the users or computers."""
+
+        mask = to_mask([positions[node] for node in nodes if node in positions])
+        for node in nodes:
+            if node in self.closure:
+                if node not in masks:
+                    masks[node] = to_mask([positions[member] for member in self.closure[node] if member in positions])
+                mask |= masks[node]
+        return mask
+
+    @staticmethod
+    def find(name: str, nodes: list, bits: dict) -> int:
+        """Find the position of a user or a computer from its DN, ID or name.
+        :param name: DN, ipaUniqueID or name (uid, FQDN) of the node.
+        :param nodes: users or computers.
+        :param bits: positions of the nodes, by DN.
+        :return: position of the node."""
+
+        if name in bits:
+            return bits[name]
+        for position, node in enumerate(nodes):
+            if name in (node.get_id(), node.get_cn()):
+                return position
+        raise KeyError(name)
+
+    @staticmethod
+    def allows(services: list[str], service: str | None) -> bool:
+        """Check that a rule applies to a service, any service if None."""
+
+        return service is None or service_name(service) in services
+
+    def users_of(self, host: str, service: str | None = None) -> list:
+        """Returns the users who can access a host.
+        :param host: DN, ipaUniqueID or FQDN of the host.
+        :param service: name of the HBAC service, None for any service.
+        :return: list of users."""
+
+        bit = 1 << self.find(host, self.computers, self.host_bits)
+        mask = 0
+        for users, hosts, services in self.rules:
+            if hosts & bit and self.allows(services, service):
+                mask |= users
+        return [self.users[position] for position in to_positions(mask)]
+
+    def hosts_of(self, user: str, service: str | None = None) -> list:
+        """Returns the hosts a user can access.
+        :param user: DN, ipaUniqueID or uid of the user.
+        :param service: name of the HBAC service, None for any service.
+        :return: list of computers."""
+
+        bit = 1 << self.find(user, self.users, self.user_bits)
+        mask = 0
+        for users, hosts, services in self.rules:
+            if users & bit and self.allows(services, service):
+                mask |= hosts
+        return [self.computers[position] for position in to_positions(mask)]
+
+    def can_access(self, user: str, host: str, service: str | None = None) -> bool:
+        """Check that a user can access a host.
+        :param user: DN, ipaUniqueID or uid of the user.
+        :param host: DN, ipaUniqueID or FQDN of the host.
+        :param service: name of the HBAC service, None for any service.
+        :return: True if an enabled rule grants the access."""
+
+        user_bit = 1 << self.find(user, self.users, self.user_bits)
+        host_bit = 1 << self.find(host, self.computers, self.host_bits)
+        return any(users & user_bit and hosts & host_bit and self.allows(services, service)
+                   for users, hosts, services in self.rules)
+
+    def triples(self) -> Iterator[tuple]:
+        """Generate the effective access as (user, host, service) triples, without duplicates.
+        :return: generator of (user, computer, service name) tuples."""
+
+        by_service = {}
+        for users, hosts, services in self.rules:
+            # The hosts of a rule are only expanded once, whatever its number of services.
+            positions = list(to_positions(hosts))
+            for service in services:
+                by_service.setdefault(service, []).append((users, positions))
+        for service, rules in by_service.items():
+            # Users allowed on each host, only the hosts of the rules are visited.
+            allowed = {}
+            for users, positions in rules:
+                for position in positions:
+                    allowed[position] = allowed.get(position, 0) | users
+            for position in sorted(allowed):
+                computer = self.computers[position]
+                for user in to_positions(allowed[position]):
+                    yield self.users[user], computer, service
+
+    def keys(self) -> Iterator[tuple]:
+        """Generate the effective access as (kind, start, end) edge keys, like the edges.
+        :return: generator of keys."""
+
+        for user, computer, service in self.triples():
+            yield f"CanAccess_{service}", user.get_id(), computer.get_id()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,80 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.graph.edges import EffectiveMembership
+
+
+def components(children: list[list[int]]) -> list[list[int]]:
+    """Find the strongly connected components of a graph, with an iterative Tarjan algorithm.
+    :param children: successors of each vertex, by position.
+    :return: components, each one listed after all the components reachable from it."""
+
+    order, low, stack, on_stack, found = {}, {}, [], set(), []
+    for root in range(len(children)):
+        if root in order:
+            continue
+        path = [(root, iter(children[root]))]
+        order[root] = low[root] = len(order)
+        stack.append(root)
+        on_stack.add(root)
+        while path:
+            vertex, successors = path[-1]
+            for child in successors:
+                if child not in order:
+                    order[child] = low[child] = len(order)
+                    stack.append(child)
+                    on_stack.add(child)
+                    path.append((child, iter(children[child])))
+                    break
+                elif child in on_stack:
+                    low[vertex] = min(low[vertex], order[child])
+            else:
+                path.pop()
+                if path:
+                    low[path[-1][0]] = min(low[path[-1][0]], low[vertex])
+                if low[vertex] == order[vertex]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == vertex:
+                            break
+                    found.append(component)
+    return found
+
+
+def transitive_members(groups: list) -> dict:
+    """Compute the effective members of nested groups or hostgroups.
+    The groups nested in each other (cycles) are condensed first, and the members of each condensed group are computed
+    once and reused by all the groups it is nested in.
+    :param groups: groups whose members are resolved.
+    :return: effective member nodes of each group, as ordered sets (dict keys), keyed by the group."""
+
+    positions = {group: position for position, group in enumerate(groups)}
+    children = [[positions[member] for member in group.member if member in positions] for group in groups]
+    closure = [None] * len(groups)
+    for component in components(children):
+        members = {}
+        for position in component:
+            members.update(dict.fromkeys(groups[position].member))
+            for child in children[position]:
+                if closure[child] is not None:
+                    members.update(closure[child])
+        for position in component:
+            closure[position] = members
+
+    return dict(zip(groups, closure))
+
+
+def effective_membership(groups: list) -> list[EffectiveMembership]:
+    """Build the effective membership edges of nested groups or hostgroups, linking each member to all the groups it
+    belongs to directly or through nested groups.
+    :param groups: groups whose members are resolved.
+    :return: list of effective membership edges, resolved."""
+
+    return [EffectiveMembership([member for member in members if member is not group], group)
+            for group, members in transitive_members(groups).items()]
+
+
+if __name__ == "__main__":
+    pass
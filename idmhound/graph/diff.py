@@ -0,0 +1,118 @@
+# -*- coding:utf-8 -*-
+
+import gzip
+import io
+import json
+from collections.abc import Iterable
+from datetime import datetime
+from idmhound.graph.output import OutputOptions, ChunkedWriter
+from idmhound.graph.utils import unique_edges
+
+# First bytes of the compressed output files.
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def graph_items(nodes: Iterable, edges: Iterable) -> tuple[dict, dict]:
+    """Convert nodes and edges to their dictionary (JSON) representation, keyed for the comparison.
+    :param nodes: nodes of the graph.
+    :param edges: groups of edges of the graph, once resolved.
+    :return: nodes keyed by ID, and edges keyed by (kind, start, end)."""
+
+    return ({node["id"]: node for node in (node.to_json() for node in nodes)},
+            {edge_key(edge): edge for edge in unique_edges(edges)})
+
+
+def edge_key(edge: dict) -> tuple:
+    """Returns the (kind, start ID, end ID) key of an edge. BloodHound merges the edges of the same kind between the
+    same nodes, the edges produced are therefore unique by this key."""
+
+    return edge["kind"], edge["start"]["value"], edge["end"]["value"]
+
+
+def read_document(path: str) -> dict:
+    """Read an output file, possibly compressed with gzip or zstd.
+    :param path: path of the file.
+    :return: decoded JSON document."""
+
+    with open(path, "rb") as document:
+        data = document.read()
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+    elif data.startswith(ZSTD_MAGIC):
+        # Optional dependency, only required to read zstd compressed files.
+        import zstandard
+        # The parallel writer concatenates one frame per block.
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True).read()
+    return json.loads(data)
+
+
+def load_opengraph(paths: list[str]) -> tuple[dict, dict]:
+    """Load the nodes and edges of a previous Opengraph output, possibly split into chunks.
+    :param paths: paths of the files of the output.
+    :return: nodes keyed by ID, and edges keyed by (kind, start, end)."""
+
+    nodes, edges = {}, {}
+    for path in paths:
+        graph = read_document(path).get("graph", {})
+        for node in graph.get("nodes", []):
+            nodes[node["id"]] = node
+        for edge in graph.get("edges", []):
+            edges[edge_key(edge)] = edge
+    return nodes, edges
+
+
+def compare(previous: dict, current: dict) -> tuple[list, list, list]:
+    """Compare two sets of elements keyed the same way.
+    :param previous: elements of the previous graph, by key.
+    :param current: elements of the current graph, by key.
+    :return: elements added, elements changed (in their current version) and keys of the elements removed."""
+
+    added, changed = [], []
+    for key, element in current.items():
+        if key not in previous:
+            added.append(element)
+        elif previous[key] != element:
+            changed.append(element)
+    removed = [key for key in previous if key not in current]
+    return added, changed, removed
+
+
+class GraphDiff():
+    """Difference between a previous and a current graph: nodes compared by ID (ipaUniqueID, or SID for the domains),
+    a node whose properties differ being changed, and edges by (kind, start, end)."""
+
+    def __init__(self, previous: tuple[dict, dict], current: tuple[dict, dict]):
+
+        self.added_nodes, self.changed_nodes, self.removed_nodes = compare(previous[0], current[0])
+        self.added_edges, self.changed_edges, self.removed_edges = compare(previous[1], current[1])
+        self.unchanged = {"nodes": len(current[0]) - len(self.added_nodes) - len(self.changed_nodes),
+                          "edges": len(current[1]) - len(self.added_edges) - len(self.changed_edges)}
+
+    def summary(self, previous: list[str]) -> dict:
+        """Summarize the difference, with the elements removed.
+        :param previous: paths of the previous graph.
+        :return: summary as a dictionary."""
+
+        return {"previous": previous, "date": datetime.now().isoformat(timespec="seconds"),
+                "nodes": {"added": len(self.added_nodes), "changed": len(self.changed_nodes),
+                          "removed": len(self.removed_nodes), "unchanged": self.unchanged["nodes"]},
+                "edges": {"added": len(self.added_edges), "changed": len(self.changed_edges),
+                          "removed": len(self.removed_edges), "unchanged": self.unchanged["edges"]},
+                "removed": {"nodes": self.removed_nodes,
+                            "edges": [{"kind": kind, "start": start, "end": end}
+                                      for kind, start, end in self.removed_edges]}}
+
+    def save(self, path: str, options: OutputOptions = None) -> list[str]:
+        """Save the nodes and edges added or changed in the Opengraph file format, ready to be ingested.
+        :param path: path of the output file.
+        :param options: compression, splitting, parallel encoding or upload of the file.
+        :return: paths of the files written."""
+
+        writer = ChunkedWriter(path, '{"metadata": {"source_kind": "IDMHound"}, "graph": {', ["nodes", "edges"],
+                               lambda count: "}}", options or OutputOptions())
+        return writer.save([self.added_nodes + self.changed_nodes, self.added_edges + self.changed_edges])
+
+
+if __name__ == "__main__":
+    pass
@@ -1,11 +1,18 @@
 # -*- coding:utf-8 -*-
 import re
+import sys
+from collections.abc import Iterator
 from idmhound.graph.legacy_nodes import *
 from idmhound.graph.nodes import *
+from idmhound.graph.index import DNIndex
 
 
 class Edges():
-    """Represent an edge or a group of edges, abstract class."""
+    """Represent an edge or a group of edges, abstract class.
+    The start and end nodes are referenced by their DN until they are resolved, then by the nodes themselves, whose ID
+    is read when the edges are generated."""
+
+    __slots__ = ("ipaUniqueID", "starts_dn", "ends_dn", "kinds", "desc", "ends", "starts")
 
     def __init__(self, starts: list[str], ends: list[str], kinds: list[str], ipaUniqueID: str):
         self.ipaUniqueID = str(ipaUniqueID)
@@ -22,61 +29,101 @@ class Edges():
 
         self.desc = str(desc)
 
-    def resolve_member_dn(self, accounts: list[Node]):
-        """Build the list of start and end nodes ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
+    def resolve_member_dn(self, index: DNIndex):
+        """Build the lists of start and end nodes based on their DN, the DN are not kept once resolved.
+        :param index: index of the nodes to use to convert the DN to nodes."""
+
+        self.ends = self.resolve(index, self.ends_dn, (LegacyComputer, Computer))
+        self.starts = self.resolve(index, self.starts_dn, (LegacyUser, User))
+        self.starts_dn = self.ends_dn = []
+
+    def ids(self) -> tuple[dict, dict]:
+        """Returns the IDs of the start and end nodes, without duplicates.
+        :return: IDs of the start and end nodes, as ordered sets (dict keys)."""
+
+        return (dict.fromkeys(start.get_id() for start in self.starts),
+                dict.fromkeys(end.get_id() for end in self.ends))
+
+    def keys(self) -> Iterator[tuple]:
+        """Generate the edges as (kind, start, end) keys, without duplicates.
+        :return: generator of keys."""
+
+        starts, ends = self.ids()
+        for kind in dict.fromkeys(self.kinds):
+            kind = sys.intern(kind)
+            for start in starts:
+                for end in ends:
+                    yield kind, start, end
+
+    def to_json(self) -> Iterator[dict]:
+        """Convert the entry to edges as a dictionary (JSON) representation.
+        :return: generator of edges as dictionaries."""
+
+        for key in self.keys():
+            yield self.edge(*key)
+
+    @staticmethod
+    def edge(kind: str, start: str, end: str) -> dict:
+        """Convert an edge to a dictionary (JSON) representation.
+        :param kind: kind of the edge.
+        :param start: ID of the start node.
+        :param end: ID of the end node.
+        :return: edge as a dictionary."""
+
+        return {"kind": kind, "start": {"value": start, "match_by": "id"}, "end": {"value": end, "match_by": "id"}}
 
-        for account in accounts:
-            if account.get_dn() in self.ends_dn or (
-                    "all" in self.ends_dn and isinstance(account, (LegacyComputer, Computer))):
-                self.ends.append(account.get_id())
-            if account.get_dn() in self.starts_dn or (
-                    "all" in self.starts_dn and isinstance(account, (LegacyUser, User))):
-                self.starts.append(account.get_id())
+    @staticmethod
+    def resolve(index: DNIndex, dns: list[str], category: tuple) -> list:
+        """Convert a list of DN to nodes, the "all" category is expanded to all the nodes of the given types.
+        :param index: index of the nodes to use to convert the DN to nodes.
+        :param dns: list of DN to convert.
+        :param category: types of the nodes matched by the "all" category.
+        :return: list of nodes, shared by the rules of the "all" category."""
+
+        if "all" in dns:
+            return index.of_type(category)
+        return index.lookup(dns)
 
 
 class HBAC(Edges):
     """Represent a Host-Based Access Control entry."""
 
+    __slots__ = ()
+
     def __init__(self, starts: list[str], ends: list[str], services: list[str], ipaUniqueID: str):
 
         super().__init__(starts, ends, services, ipaUniqueID)
 
-    def to_json(self) -> list:
-        """Convert an HBAC entry to a list of edges as a dictionary (JSON) representation.
-        :return: edges as a list of dictionary."""
+    def keys(self) -> Iterator[tuple]:
+        """Generate the HBAC edges as (kind, start, end) keys, without duplicates.
+        :return: generator of keys."""
 
-        edges = []
-        for kind in self.kinds:
-            for start in self.starts:
-                for end in self.ends:
-                    edges.append({"kind": f"HBAC_{kind}", "start": {"value": start, "match_by": "id"},
-                                  "end": {"value": end, "match_by": "id"}})
-        return edges
+        starts, ends = self.ids()
+        for kind in dict.fromkeys(self.kinds):
+            kind = sys.intern(f"HBAC_{kind}")
+            for start in starts:
+                for end in ends:
+                    yield kind, start, end
 
-    def resolve_member_dn(self, accounts: list[Node]):
+    def resolve_member_dn(self, index: DNIndex):
         """Build the list of start and end nodes ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
-
-        services = []
-        for account in accounts:
-            if account.get_dn() in self.ends_dn or (
-                    "all" in self.ends_dn and isinstance(account, (LegacyComputer, Computer))):
-                self.ends.append(account.get_id())
-            if account.get_dn() in self.starts_dn or (
-                    "all" in self.starts_dn and isinstance(account, (LegacyUser, User))):
-                self.starts.append(account.get_id())
-            if account.get_dn() in self.kinds and not "all" in self.kinds:
+        :param index: index of the nodes to use to convert the DN to ipaUniqueID."""
+
+        super().resolve_member_dn(index)
+        if not "all" in self.kinds:
+            services = []
+            for account in index.lookup(self.kinds):
                 if isinstance(account, HBACService):
                     services.append(account.get_cn())
                 elif isinstance(account, HBACServicesGroup):
                     services.extend(account.member)
-        if not "all" in self.kinds:
             self.kinds = services
 
 class Sudoer(Edges):
     """Represent a sudoer rights entry."""
 
+    __slots__ = ("asusers_dn", "asusers")
+
     def __init__(self, starts: list[str], ends: list[str], commands: list[str], asusers: list[str], ipaUniqueID: str):
 
         super().__init__(starts, ends, commands, ipaUniqueID)
@@ -84,60 +131,126 @@ class Sudoer(Edges):
         self.asusers = []
 
 
-    def resolve_member_dn(self, accounts: list):
+    def resolve_member_dn(self, index: DNIndex):
         """Build the list of start and end nodes ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
-
-        services = []
-        for account in accounts:
-            if account.get_dn() in self.ends_dn or (
-                    "all" in self.ends_dn and isinstance(account, (LegacyComputer, Computer))):
-                self.ends.append(account.get_id())
-            if account.get_dn() in self.starts_dn or (
-                    "all" in self.starts_dn and isinstance(account, (LegacyUser, User))):
-                self.starts.append(account.get_id())
-            if account.get_dn() in self.kinds and not "all" in self.kinds:
+        :param index: index of the nodes to use to convert the DN to ipaUniqueID."""
+
+        super().resolve_member_dn(index)
+        if not "all" in self.kinds:
+            services = []
+            for account in index.lookup(self.kinds):
                 if isinstance(account, SudoCmd):
                     services.append(account.get_cn())
                 elif isinstance(account, SudoCmdGroup):
                     services.extend(account.member)
-            if account.get_dn() in self.asusers_dn and isinstance(account, (LegacyUser, User, LegacyGroup, Group)) and not "all" in self.asusers:
-                self.asusers.append(account.get_cn())
-
-
+            self.kinds = services
         if "all" in self.asusers_dn:
             self.asusers = self.asusers_dn
-        if not "all" in self.kinds:
-            self.kinds = services
+        else:
+            for account in index.lookup(self.asusers_dn):
+                if isinstance(account, (LegacyUser, User, LegacyGroup, Group)):
+                    self.asusers.append(account.get_cn())
+
+
+    def keys(self) -> Iterator[tuple]:
+        """Generate the sudoer edges as (kind, start, end) keys, without duplicates.
+        :return: generator of keys."""
+
+        starts, ends = self.ids()
+        asusers = dict.fromkeys(self.asusers)
+        for kind in dict.fromkeys(self.kinds):
+            for start in starts:
+                for end in ends:
+                    for asuser in asusers:
+                        yield sys.intern(f"Sudoer_{kind}_as_{asuser}"), start, end
+
+
+class CompactSudoer(Sudoer):
+    """Represent a sudoer rights entry as a SudoRule node holding the commands and the runas users, with one Sudoer edge
+    from each user to the rule and one SudoOn edge from the rule to each host. The edges of a rule do not depend on its
+    commands, and two rules granting access to the same host keep their own properties."""
+
+    __slots__ = ("node",)
+
+    def __init__(self, starts: list[str], ends: list[str], commands: list[str], asusers: list[str], ipaUniqueID: str,
+                 node: SudoRule):
+
+        super().__init__(starts, ends, commands, asusers, ipaUniqueID)
+        self.node = node
+
+    def resolve_member_dn(self, index: DNIndex):
+        """Build the list of start and end nodes ipaUniqueID based on the DN of the nodes, and set the commands and the
+        runas users of the rule node.
+        :param index: index of the nodes to use to convert the DN to ipaUniqueID."""
 
+        super().resolve_member_dn(index)
+        self.node.commands = list(dict.fromkeys(self.kinds))
+        self.node.runas = list(dict.fromkeys(self.asusers))
 
-    def to_json(self) -> list:
-        """Convert a sudoer entry to a list of edges as a dictionary (JSON) representation.
-        :return: edges as a list of dictionary."""
+    def keys(self) -> Iterator[tuple]:
+        """Generate the Sudoer edges to the rule and the SudoOn edges from the rule as (kind, start, end) keys, without
+        duplicates. A rule without command, runas user, user or host grants nothing and has no edge.
+        :return: generator of keys."""
+
+        if not self.kinds or not self.asusers or not self.starts or not self.ends:
+            return
+        rule = self.node.get_id()
+        starts, ends = self.ids()
+        for start in starts:
+            yield "Sudoer", start, rule
+        for end in ends:
+            yield "SudoOn", rule, end
 
-        edges = []
-        for kind in self.kinds:
-            for start in self.starts:
-                for end in self.ends:
-                    for asuser in self.asusers:
-                        edges.append({"kind": f"Sudoer_{kind}_as_{asuser}", "start": {"value": start, "match_by": "id"},
-                                      "end": {"value": end, "match_by": "id"}})
-        return edges
 
 class Membership(Edges):
-    """Represent a membership in a group entry."""
+    """Represent a membership in a group entry, whose start nodes are the members of the resolved group."""
+
+    __slots__ = ()
+
+    def __init__(self, group: Group):
+
+        super().__init__([], [], ["MemberOf"], None)
+        self.ends = [group]
+
+    def resolve_member_dn(self, index: DNIndex):
+        """Share the list of the members of the group, resolved first if needed.
+        :param index: index of the nodes to use to convert the DN to nodes."""
+
+        group = self.ends[0]
+        if group.member_dn:
+            group.resolve_member_dn(index)
+        self.starts = group.member
+
+    def keys(self) -> Iterator[tuple]:
+        """Generate the membership edges as (kind, start, end) keys, without duplicates.
+        :return: generator of keys."""
+
+        starts, ends = self.ids()
+        for start in starts:
+            for end in ends:
+                yield "MemberOf", start, end
+
+class EffectiveMembership(Edges):
+    """Represent the effective membership in a group, directly or through nested groups. The edges are built from the
+    resolved groups, their nodes are already known."""
+
+    __slots__ = ()
+
+    def __init__(self, members: list, group):
 
-    def __init__(self, starts: list[str], ends: list[str]):
+        super().__init__([], [], ["EffectiveMemberOf"], None)
+        self.starts = members
+        self.ends = [group]
 
-        super().__init__(starts, ends, ["MemberOf"], None)
+    def resolve_member_dn(self, index: DNIndex):
+        """The start and end nodes are known, there is nothing to resolve.
+        :param index: index of the nodes, unused."""
 
-    def to_json(self) -> list:
-        """Convert a membership entry to a list of edges as a dictionary (JSON) representation.
-        :return: edges as a list of dictionary."""
+    def keys(self) -> Iterator[tuple]:
+        """Generate the effective membership edges as (kind, start, end) keys, without duplicates.
+        :return: generator of keys."""
 
-        edges = []
-        for start in self.starts:
-            for end in self.ends:
-                edges.append({"kind": f"MemberOf", "start": {"value": start, "match_by": "id"},
-                              "end": {"value": end, "match_by": "id"}})
-        return edges
+        starts, ends = self.ids()
+        for start in starts:
+            for end in ends:
+                yield "EffectiveMemberOf", start, end
@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+"""Index of the nodes by DN, and packed storage of the string attributes of the nodes.
+
+The string attributes of a node are packed in a single string, its record, instead of one string object per attribute:
+the values are joined with the unit separator (U+001F). A value of more than two characters equal to a previous value
+of the record (e.g. krbCanonicalName and krbPrincipalName, cn and uid) is replaced by the record separator (U+001E)
+followed by the character whose code point is the position of that previous value. The attributes of LDAP entries do
+not hold these control characters, a node whose values do is stored as a tuple of its values instead. The attributes are
+read and written by position through Field descriptors, a serialization reads all of them with a single unpack. The DN
+of a node is stored as its RDN, in the record, and the DN of its parent, interned so that the nodes of a container share
+it.
+"""
+import sys
+
+# Separator of the values packed in the record of a node, and marker of a value equal to a previous value of the
+# record, control characters the parsed attributes do not hold.
+SEPARATOR, REFERENCE = "\x1f", "\x1e"
+
+
+def pack(values: list) -> str | tuple:
+    """Pack the string values of a node in a single record, stored as one string instead of one string per value. A
+    value equal to a previous value (e.g. krbPrincipalName and krbCanonicalName) is stored as a reference to it. Values
+    holding a control character of the record are kept as is, in a tuple.
+    :param values: values to pack.
+    :return: record of the values."""
+
+    values = [str(value) for value in values]
+    if any(SEPARATOR in value or REFERENCE in value for value in values):
+        return tuple(values)
+    positions = {}
+    packed = []
+    for position, value in enumerate(values):
+        if len(value) > 2 and value in positions:
+            packed.append(REFERENCE + chr(positions[value]))
+        else:
+            positions.setdefault(value, position)
+            packed.append(value)
+    return SEPARATOR.join(packed)
+
+
+def unpack(record: str | tuple) -> list | tuple:
+    """Unpack the values of a record built by pack.
+    :param record: record of the values.
+    :return: values."""
+
+    if isinstance(record, tuple):
+        return record
+    values = record.split(SEPARATOR)
+    # Only the references are visited, their position is the number of separators before them.
+    reference = record.find(REFERENCE)
+    while reference != -1:
+        values[record.count(SEPARATOR, 0, reference)] = values[ord(record[reference + 1])]
+        reference = record.find(REFERENCE, reference + 2)
+    return values
+
+
+class Field():
+    """Attribute of a node stored at a position of its packed record."""
+
+    __slots__ = ("position",)
+
+    def __init__(self, position: int):
+
+        self.position = position
+
+    def __get__(self, node, owner):
+
+        if node is None:
+            return self
+        if isinstance(node.record, tuple):
+            return node.record[self.position]
+        # Only the value read is resolved, a reference points to a value that is not itself a reference.
+        values = node.record.split(SEPARATOR)
+        value = values[self.position]
+        return values[ord(value[1])] if value[:1] == REFERENCE else value
+
+    def __set__(self, node, value):
+
+        values = list(unpack(node.record))
+        values[self.position] = value
+        node.record = pack(values)
+
+
+def join_dn(rdn: str, parent: str | None) -> str:
+    """Build a DN from its RDN and the DN of its parent, as split by split_dn.
+    :param rdn: RDN.
+    :param parent: parent DN, None for a DN of a single RDN.
+    :return: DN."""
+
+    return rdn if parent is None else f"{rdn},{parent}"
+
+
+def split_dn(dn: str) -> tuple[str, str | None]:
+    """Split a DN into its RDN and the DN of its parent, interned so that it is shared by the nodes of a container.
+    :param dn: DN to split.
+    :return: RDN and parent DN, None for a DN of a single RDN."""
+
+    rdn, separator, parent = str(dn).partition(",")
+    return rdn, sys.intern(parent) if separator else None
+
+
+class DNIndex(dict):
+    """Maps the DN of the nodes of the realm to the nodes, built once per run to resolve the DN of the members."""
+
+    def __init__(self, nodes: list):
+
+        super().__init__((node.get_dn(), node) for node in nodes)
+        self.types = {}
+
+    def lookup(self, dns: list) -> list:
+        """Returns the nodes matching a list of DN, unknown DN are ignored.
+        :param dns: DN of the nodes to look up.
+        :return: list of nodes."""
+
+        return [self[dn] for dn in dns if dn in self]
+
+    def of_type(self, types: tuple) -> list:
+        """Returns the nodes of the given types, used to expand the "all" categories.
+        :param types: types of the nodes to return.
+        :return: list of nodes."""
+
+        if types not in self.types:
+            self.types[types] = [node for node in self.values() if isinstance(node, types)]
+        return self.types[types]
+
+
+if __name__ == "__main__":
+    pass
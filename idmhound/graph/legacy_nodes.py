@@ -1,23 +1,30 @@
 # -*- coding:utf-8 -*-
+import sys
+from idmhound.graph.index import DNIndex, Field, join_dn, pack, split_dn, unpack
+from idmhound.graph.nodes import Computer, Group, User
+
 
 class LegacyNode():
-    """Represents an object of the realm, abstract class."""
+    """Represents an object of the realm, abstract class.
+    The string attributes are packed in a single record, like the attributes of the Opengraph nodes."""
 
-    def __init__(self, dn: str, cn: str, ipaUniqueID: str, ipaNTSecurityIdentifier: str, domainsid: str):
-        self.dn = dn
-        self.cn = str(cn)
-        self.ipaUniqueID = str(ipaUniqueID)
-        self.ipaNTSecurityIdentifier = str(ipaNTSecurityIdentifier)
-        self.desc = ""
-        self.acl = []
-        self.domainsid = str(domainsid)
+    __slots__ = ("parent", "record", "domainsid", "enabled")
+
+    rdn, cn, ipaUniqueID, desc, ipaNTSecurityIdentifier = (Field(position) for position in range(5))
+
+    def __init__(self, dn: str, cn: str, ipaUniqueID: str, ipaNTSecurityIdentifier: str, domainsid: str, *values):
+        # The domain SID is the same for all nodes.
+        rdn, self.parent = split_dn(dn)
+        self.record = pack([rdn, cn, ipaUniqueID, "", ipaNTSecurityIdentifier, *values])
+        self.domainsid = sys.intern(str(domainsid))
+        self.enabled = True
 
 
     def get_dn(self) -> str:
         """Returns the DN of the node.
         :return: DN of the node."""
 
-        return self.dn
+        return join_dn(self.rdn, self.parent)
 
     def get_cn(self) -> str:
         """Returns the DN of the node.
@@ -41,128 +48,202 @@ class LegacyNode():
 class LegacyDomain(LegacyNode):
     """Represents a domain."""
 
+    __slots__ = ()
+
+    ipaNTFlatName = Field(5)
+
     def __init__(self, dn: str, cn: str, ipaNTDomainGUID: str, ipaNTFlatName: str, ipaNTSecurityIdentifier: str, domainsid: str):
 
-        super().__init__(dn, cn, ipaNTDomainGUID, ipaNTSecurityIdentifier, domainsid)
-        self.ipaNTFlatName = str(ipaNTFlatName)
+        super().__init__(dn, cn, ipaNTDomainGUID, ipaNTSecurityIdentifier, domainsid, ipaNTFlatName)
 
     def to_json(self) -> dict:
         """Convert a domain as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"ObjectIdentifier": self.ipaNTSecurityIdentifier,
-                "Properties": {"name": self.ipaNTFlatName,
-                               "domain": self.cn,
+        # The record is unpacked once for all the properties.
+        rdn, cn, ipaUniqueID, desc, ipaNTSecurityIdentifier, ipaNTFlatName = unpack(self.record)
+        return {"ObjectIdentifier": ipaNTSecurityIdentifier,
+                "Properties": {"name": ipaNTFlatName,
+                               "domain": cn,
                                "domainsid": self.domainsid,
-                               "distinguishedname": self.dn,
+                               "distinguishedname": join_dn(rdn, self.parent),
                                "highvalue":True,
-                               "description":self.desc},
-                "Aces": self.acl}
+                               "description":desc},
+                "Aces": []}
 
 
 class LegacyUser(LegacyNode):
     "Represents a user."
 
+    __slots__ = ()
+
+    gecos, homeDirectory, krbCanonicalName, krbPrincipalName, loginShell, sn, uid, uidNumber = (Field(position) for position in range(5, 13))
+
     def __init__(self, dn: str, cn: str, gecos: str, homeDirectory: str, ipaUniqueID: str, ipaNTSecurityIdentifier: str, krbCanonicalName: str, krbPrincipalName: str, loginShell: str, sn: str,
                  uid: str, uidNumber: str, domainsid: str):
 
-        super().__init__(dn, cn, ipaUniqueID, ipaNTSecurityIdentifier, domainsid)
-
-        self.gecos = str(gecos)
-        self.homeDirectory = str(homeDirectory)
-        self.krbCanonicalName = str(krbCanonicalName)
-        self.krbPrincipalName = str(krbPrincipalName)
-        self.loginShell = str(loginShell)
-        self.sn = str(sn)
-        self.uid = str(uid)
-        self.uidNumber = str(uidNumber)
-        self.enabled = True
+        super().__init__(dn, cn, ipaUniqueID, ipaNTSecurityIdentifier, domainsid, gecos, homeDirectory,
+                         krbCanonicalName, krbPrincipalName, loginShell, sn, uid, uidNumber)
 
     def to_json(self) -> dict:
         """Convert a user as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"ObjectIdentifier": self.ipaNTSecurityIdentifier,
-                "Properties": {"name": self.krbCanonicalName,
-                               "distinguishedname": self.dn,
-                               "cn": self.cn,
+        (rdn, cn, ipaUniqueID, desc, ipaNTSecurityIdentifier, gecos, homeDirectory, krbCanonicalName, krbPrincipalName,
+         loginShell, sn, uid, uidNumber) = unpack(self.record)
+        return {"ObjectIdentifier": ipaNTSecurityIdentifier,
+                "Properties": {"name": krbCanonicalName,
+                               "distinguishedname": join_dn(rdn, self.parent),
+                               "cn": cn,
                                "domainsid":self.domainsid,
-                               "gecos": self.gecos,
+                               "gecos": gecos,
                                "enabled": self.enabled,
-                               "homedirectory": self.homeDirectory,
-                               "sn": self.sn,
-                               "uid": self.uid,
-                               "uidNumber": self.uidNumber,
-                               "description": self.desc},
-                "Aces": self.acl}
+                               "homedirectory": homeDirectory,
+                               "sn": sn,
+                               "uid": uid,
+                               "uidNumber": uidNumber,
+                               "description": desc},
+                "Aces": []}
 
 
 
 class LegacyComputer(LegacyNode):
     """Represent a computer."""
 
+    __slots__ = ("spn",)
+
+    krbCanonicalName, krbPrincipalName, fqdn = (Field(position) for position in range(5, 8))
+
     def __init__(self, dn: str, cn: str, ipaUniqueID: str, ipaNTSecurityIdentifier: str, krbCanonicalName: str, krbPrincipalName: str, fqdn: str, domainsid: str):
-        super().__init__(dn, cn, ipaUniqueID, ipaNTSecurityIdentifier, domainsid)
+        super().__init__(dn, cn, ipaUniqueID, ipaNTSecurityIdentifier, domainsid, krbCanonicalName, krbPrincipalName,
+                         fqdn)
+        # Most computers have no service, the list is only created for the first one.
+        self.spn = ()
+
+    @property
+    def hasspn(self) -> bool:
 
-        self.krbCanonicalName = str(krbCanonicalName)
-        self.krbPrincipalName = str(krbPrincipalName)
-        self.fqdn = str(fqdn)
-        self.spn = []
-        self.hasspn = False
+        return bool(self.spn)
 
     def to_json(self) -> dict:
         """Convert a computer as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"ObjectIdentifier": self.ipaNTSecurityIdentifier,
-                "Properties": {"distinguishedname": self.dn,
-                               "name": self.fqdn,
-                               "description": self.desc,
+        rdn, cn, ipaUniqueID, desc, ipaNTSecurityIdentifier, krbCanonicalName, krbPrincipalName, fqdn = unpack(self.record)
+        return {"ObjectIdentifier": ipaNTSecurityIdentifier,
+                "Properties": {"distinguishedname": join_dn(rdn, self.parent),
+                               "name": fqdn,
+                               "description": desc,
                                "domainsid": self.domainsid,
                                "hasspn": self.hasspn,
                                "serviceprincipalnames": "\n".join(self.spn)},
-                "Aces": self.acl}
+                "Aces": []}
 
     def set_spn(self, spn):
         """Add a service principal name to the computer.
         :param spn: service principal name to add."""
 
-        self.hasspn = True
+        if not self.spn:
+            self.spn = []
         self.spn.append(str(spn))
 
 class LegacyGroup(LegacyNode):
     """Represent a group."""
 
+    __slots__ = ("member_dn", "member")
+
     def __init__(self, dn: str, cn: str, ipaUniqueID: str, ipaNTSecurityIdentifier: str, member: list, domainsid: str):
 
         super().__init__(dn, cn, ipaUniqueID, ipaNTSecurityIdentifier, domainsid)
 
-        self.member_dn = list(member)
+        self.member_dn = [str(dn) for dn in member]
         self.member = []
 
-    def resolve_member_dn(self, accounts: list[LegacyNode]):
-        """Build the list of members ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
+    def resolve_member_dn(self, index: DNIndex):
+        """Build the list of the member users, computers and groups based on their DN, the DN are not kept once
+        resolved.
+        :param index: index of the nodes to use to convert the DN to nodes."""
 
-        for account in accounts:
-            if isinstance(account, LegacyUser) and account.get_dn() in self.member_dn:
-                self.member.append({"ObjectIdentifier": account.get_id(), "ObjectType": "User"})
-            elif isinstance(account, LegacyComputer) and account.get_dn() in self.member_dn:
-                self.member.append({"ObjectIdentifier": account.get_id(), "ObjectType": "Computer"})
-            elif isinstance(account, LegacyGroup) and account.get_dn() in self.member_dn:
-                self.member.append({"ObjectIdentifier": account.get_id(), "ObjectType": "Group"})
+        self.member = [account for account in index.lookup(self.member_dn)
+                       if isinstance(account, (LegacyUser, LegacyComputer, LegacyGroup))]
+        self.member_dn = []
 
     def to_json(self) -> dict:
         """Convert a group as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"ObjectIdentifier": self.ipaNTSecurityIdentifier,
-                "Properties": {"distinguishedname": self.dn,
-                               "name": self.cn,
-                               "description": self.desc,
+        rdn, cn, ipaUniqueID, desc, ipaNTSecurityIdentifier = unpack(self.record)
+        return {"ObjectIdentifier": ipaNTSecurityIdentifier,
+                "Properties": {"distinguishedname": join_dn(rdn, self.parent),
+                               "name": cn,
+                               "description": desc,
                                "domainsid":self.domainsid},
-                "Members": self.member,
-                "Aces": self.acl}
+                "Members": members(self.member),
+                "Aces": []}
+
+
+class LegacyTwin():
+    """Legacy counterpart of a node of the Opengraph model, when both formats are produced from a single parse. It only
+    holds what the legacy format adds to the node, its SID and its members (twins of the member nodes), the other
+    properties are read from the node."""
+
+    __slots__ = ("node", "ipaNTSecurityIdentifier", "desc", "member")
+
+    # Properties named differently in the legacy format.
+    RENAMED = {"service krbprincipalname": "serviceprincipalnames"}
+
+    def __init__(self, node, ipaNTSecurityIdentifier: str, desc: str | None = None):
+
+        self.node = node
+        self.ipaNTSecurityIdentifier = str(ipaNTSecurityIdentifier)
+        self.desc = desc
+        self.member = []
+
+    @property
+    def ipaUniqueID(self) -> str:
+
+        return self.node.ipaUniqueID
+
+    def get_dn(self) -> str:
+        """Returns the DN of the node.
+        :return: DN of the node."""
+
+        return self.node.get_dn()
+
+    def get_id(self) -> str:
+        """Returns the SID of the node.
+        :return: SID of the node."""
+
+        return self.ipaNTSecurityIdentifier
+
+    def to_json(self) -> dict:
+        """Convert the node as a dictionary (JSON) representation of the legacy format.
+        :return: node as a dictionary."""
+
+        node = self.node.to_json()
+        properties = {self.RENAMED.get(key, key): value
+                      for key, value in node.get("properties", node.get("Properties", {})).items()}
+        if self.desc is not None:
+            properties["description"] = self.desc
+        document = {"ObjectIdentifier": self.ipaNTSecurityIdentifier, "Properties": properties}
+        if "Group" in node["kinds"]:
+            document["Members"] = members(self.member)
+        document["Aces"] = []
+        return document
+
+
+# Object type of the members of the legacy groups, from the type of their node or of the node of their twin.
+LEGACY_TYPES = {LegacyUser: "User", LegacyComputer: "Computer", LegacyGroup: "Group",
+                User: "User", Computer: "Computer", Group: "Group"}
+
+
+def members(nodes: list) -> list[dict]:
+    """Convert the members of a legacy group to their legacy JSON representation.
+    :param nodes: member nodes, or twins of the member nodes.
+    :return: members as a list of dictionaries."""
+
+    return [{"ObjectIdentifier": node.get_id(),
+             "ObjectType": LEGACY_TYPES[type(node.node if isinstance(node, LegacyTwin) else node)]} for node in nodes]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+from collections.abc import Iterator
+from idmhound.graph.index import DNIndex
+from idmhound.graph.utils import member_lookup, sudo_rules
+from idmhound.stats import STATS
+
+
+class TranslatedEdges():
+    """View of resolved edges whose node IDs are translated, such as the edges of the Opengraph model seen with the
+    SID of the legacy nodes. Edges whose nodes have no translation are skipped."""
+
+    __slots__ = ("edges", "ids")
+
+    def __init__(self, edges, ids: dict):
+
+        self.edges = edges
+        self.ids = ids
+
+    def keys(self) -> Iterator[tuple]:
+        """Generate the translated edges as (kind, start, end) keys.
+        :return: generator of keys."""
+
+        ids = self.ids
+        for kind, start, end in self.edges.keys():
+            if start in ids and end in ids:
+                yield kind, ids[start], ids[end]
+
+    @property
+    def node(self):
+        """Returns the SudoRule node of a compact sudo rule, None for the other edges."""
+
+        return getattr(self.edges, "node", None)
+
+
+class RealmModel():
+    """Nodes and edges of a realm parsed in a single pass over the LDAP entries, from which both the Opengraph and the
+    legacy outputs are produced. The legacy nodes are twins of the Opengraph nodes, holding their SID. The DN are
+    resolved once, against the Opengraph nodes, and the legacy output is a view of the resolved edges translating the
+    ipaUniqueID of the nodes to the SID of their legacy counterpart."""
+
+    def __init__(self, parsed: tuple, legacy: tuple = None):
+
+        (self.domains, self.users, self.groups, self.computers, self.hbac, self.sudoer, self.membership,
+         self.hbacservicesgroups, self.hbacservices, self.sudocmdgroups, self.sudocmds) = parsed
+        self.legacy_domains, self.legacy_users, self.legacy_groups, self.legacy_computers = legacy or ([], [], [], [])
+        self.index = None
+
+    def resolve(self) -> DNIndex:
+        """Resolve the member DN of the groups and of the edges, each list of subjects being a phase of the run.
+        :return: index of the principals."""
+
+        self.index = DNIndex(self.users + self.computers + self.groups + self.hbacservices + self.hbacservicesgroups
+                             + self.sudocmds + self.sudocmdgroups)
+        for name, subjects in [("groups", self.groups), ("membership", self.membership),
+                               ("hbacservicesgroups", self.hbacservicesgroups),
+                               ("hbac", self.hbac), ("sudocmdgroups", self.sudocmdgroups), ("sudoer", self.sudoer)]:
+            with STATS.phase(f"member_lookup.{name}"):
+                member_lookup(self.index, subjects)
+        return self.index
+
+    def opengraph(self, effective: list = None) -> tuple[list, list]:
+        """Returns the nodes and the edges of the Opengraph output.
+        :param effective: effective membership edges to add after the membership edges.
+        :return: nodes and edges."""
+
+        return (self.domains + self.users + self.groups + self.computers + sudo_rules(self.sudoer),
+                self.hbac + self.membership + (effective or []) + self.sudoer)
+
+    def legacy(self) -> tuple:
+        """Returns the nodes and the edges of the legacy output, the members of the legacy groups being set from the
+        resolved membership edges. The model must be resolved first.
+        :return: domains, users, groups, computers, HBAC and sudoer edges."""
+
+        legacy_nodes = {node.get_dn(): node for node in self.legacy_users + self.legacy_computers + self.legacy_groups}
+        ids, twins = {}, {}
+        for node in self.users + self.computers + self.groups:
+            twin = legacy_nodes.get(node.get_dn())
+            if twin is not None:
+                ids[node.get_id()] = twin.get_id()
+                twins[node] = twin
+        # The SudoRule nodes of the compact sudo model keep their ID.
+        ids.update((rule.get_id(), rule.get_id()) for rule in sudo_rules(self.sudoer))
+
+        # The members of the legacy groups are the twins of the members of the resolved groups.
+        for group in self.groups:
+            if group in twins:
+                twins[group].member = [twins[member] for member in group.member if member in twins]
+        return (self.legacy_domains, self.legacy_users, self.legacy_groups, self.legacy_computers,
+                [TranslatedEdges(rule, ids) for rule in self.hbac], [TranslatedEdges(rule, ids) for rule in self.sudoer])
+
+
+if __name__ == "__main__":
+    pass
@@ -1,20 +1,29 @@
 # -*- coding:utf-8 -*-
+import sys
+from idmhound.graph.index import DNIndex, Field, join_dn, pack, split_dn, unpack
+
 
 class Node():
-    """Represents an object of the realm, abstract class."""
+    """Represents an object of the realm, abstract class.
+    The string attributes of the node are packed in a single record, read and written through Field attributes. The DN
+    is stored as its RDN, in the record, and the DN of its container, shared by the nodes of the container."""
 
-    def __init__(self, dn: str, cn: str, ipaUniqueID: str, domainsid: str):
-        self.dn = dn
-        self.cn = str(cn)
-        self.ipaUniqueID = str(ipaUniqueID)
-        self.desc = ""
-        self.domainsid = str(domainsid)
+    __slots__ = ("parent", "record", "domainsid", "enabled")
+
+    rdn, cn, ipaUniqueID, desc = (Field(position) for position in range(4))
+
+    def __init__(self, dn: str, cn: str, ipaUniqueID: str, domainsid: str, *values):
+        # The domain SID is the same for all nodes.
+        rdn, self.parent = split_dn(dn)
+        self.record = pack([rdn, cn, ipaUniqueID, "", *values])
+        self.domainsid = sys.intern(str(domainsid))
+        self.enabled = True
 
     def get_dn(self) -> str:
         """Returns the DN of the node.
         :return: DN of the node."""
 
-        return self.dn
+        return join_dn(self.rdn, self.parent)
 
     def get_cn(self) -> str:
         """Returns the CN of the node.
@@ -37,60 +46,62 @@ class Node():
 class Domain(Node):
     """Represents a domain."""
 
+    __slots__ = ()
+
+    ipaNTFlatName = Field(4)
+
     def __init__(self, dn: str, cn: str, ipaNTDomainGUID: str, ipaNTFlatName: str, domainsid: str):
 
-        super().__init__(dn, cn, ipaNTDomainGUID, domainsid)
-        self.ipaNTFlatName = str(ipaNTFlatName)
+        super().__init__(dn, cn, ipaNTDomainGUID, domainsid, ipaNTFlatName)
 
     def to_json(self) -> dict:
         """Convert a domain as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"id": self.ipaUniqueID, "Properties": {"name": self.ipaNTFlatName,
-                                                       "domain": self.cn,
-                                                       "domainsid": self.domainsid,
-                                                       "distinguishedname": self.dn,
-                                                       "highvalue":True,
-                                                       "description":self.desc
-                                                       },
+        # The record is unpacked once for all the properties.
+        rdn, cn, ipaUniqueID, desc, ipaNTFlatName = unpack(self.record)
+        return {"id": ipaUniqueID, "Properties": {"name": ipaNTFlatName,
+                                                  "domain": cn,
+                                                  "domainsid": self.domainsid,
+                                                  "distinguishedname": join_dn(rdn, self.parent),
+                                                  "highvalue":True,
+                                                  "description":desc
+                                                  },
                 "kinds": ["Domain"]}
 
 
 class User(Node):
     "Represents a user."
 
+    __slots__ = ()
+
+    gecos, homeDirectory, krbCanonicalName, krbPrincipalName, loginShell, sn, uid, uidNumber = (Field(position) for position in range(4, 12))
+
     def __init__(self, dn: str, cn: str, gecos: str, homeDirectory: str, ipaUniqueID: str, krbCanonicalName: str, krbPrincipalName: str, loginShell: str, sn: str,
                  uid: str, uidNumber: str, domainsid: str):
 
-        super().__init__(dn, cn, ipaUniqueID, domainsid)
-
-        self.gecos = str(gecos)
-        self.homeDirectory = str(homeDirectory)
-        self.krbCanonicalName = str(krbCanonicalName)
-        self.krbPrincipalName = str(krbPrincipalName)
-        self.loginShell = str(loginShell)
-        self.sn = str(sn)
-        self.uid = str(uid)
-        self.uidNumber = str(uidNumber)
-        self.enabled = True
+        super().__init__(dn, cn, ipaUniqueID, domainsid, gecos, homeDirectory, krbCanonicalName, krbPrincipalName,
+                         loginShell, sn, uid, uidNumber)
 
 
     def to_json(self) -> dict:
         """Convert a user as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"id": self.ipaUniqueID,
-                "properties": {"name": self.krbCanonicalName,
-                               "distinguishedname": self.dn,
-                               "cn": self.cn,
+        (rdn, cn, ipaUniqueID, desc, gecos, homeDirectory, krbCanonicalName, krbPrincipalName, loginShell, sn, uid,
+         uidNumber) = unpack(self.record)
+        return {"id": ipaUniqueID,
+                "properties": {"name": krbCanonicalName,
+                               "distinguishedname": join_dn(rdn, self.parent),
+                               "cn": cn,
                                "domainsid":self.domainsid,
-                               "gecos": self.gecos,
+                               "gecos": gecos,
                                "enabled": self.enabled,
-                               "homedirectory": self.homeDirectory,
-                               "sn": self.sn,
-                               "uid": self.uid,
-                               "uidNumber": self.uidNumber,
-                               "description": self.desc},
+                               "homedirectory": homeDirectory,
+                               "sn": sn,
+                               "uid": uid,
+                               "uidNumber": uidNumber,
+                               "description": desc},
                 "kinds": ["User"]}
 
 
@@ -98,24 +109,30 @@ class User(Node):
 class Computer(Node):
     """Represent a computer."""
 
+    __slots__ = ("spn",)
+
+    krbCanonicalName, krbPrincipalName, fqdn = (Field(position) for position in range(4, 7))
+
     def __init__(self, dn: str, cn: str, ipaUniqueID: str, krbCanonicalName: str, krbPrincipalName: str, fqdn: str, domainsid: str):
 
-        super().__init__(dn, cn, ipaUniqueID, domainsid)
+        super().__init__(dn, cn, ipaUniqueID, domainsid, krbCanonicalName, krbPrincipalName, fqdn)
+        # Most computers have no service, the list is only created for the first one.
+        self.spn = ()
+
+    @property
+    def hasspn(self) -> bool:
 
-        self.krbCanonicalName = str(krbCanonicalName)
-        self.krbPrincipalName = str(krbPrincipalName)
-        self.fqdn = str(fqdn)
-        self.spn = []
-        self.hasspn = False
+        return bool(self.spn)
 
     def to_json(self) -> dict:
         """Convert a computer as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"id": self.ipaUniqueID,
-                "properties": {"distinguishedname": self.dn,
-                               "name": self.fqdn,
-                               "description": self.desc,
+        rdn, cn, ipaUniqueID, desc, krbCanonicalName, krbPrincipalName, fqdn = unpack(self.record)
+        return {"id": ipaUniqueID,
+                "properties": {"distinguishedname": join_dn(rdn, self.parent),
+                               "name": fqdn,
+                               "description": desc,
                                "domainsid": self.domainsid,
                                "hasspn": self.hasspn,
                                "service krbprincipalname": "\n".join(self.spn)},
@@ -125,43 +142,48 @@ class Computer(Node):
         """Add a service principal name to the computer.
         :param spn: service principal name to add."""
 
-        self.hasspn = True
+        if not self.spn:
+            self.spn = []
         self.spn.append(str(spn))
 
 
 class Group(Node):
     """Represent a group."""
 
+    __slots__ = ("member_dn", "member")
+
     def __init__(self, dn: str, cn: str, ipaUniqueID: str, member: list, domainsid: str):
 
         super().__init__(dn, cn, ipaUniqueID, domainsid)
 
-        self.member_dn = list(member)
+        self.member_dn = [str(dn) for dn in member]
         self.member = []
 
-    def resolve_member_dn(self, accounts: list[Node]):
-        """Build the list of members ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
+    def resolve_member_dn(self, index: DNIndex):
+        """Build the list of the member nodes based on their DN, the DN are not kept once resolved.
+        :param index: index of the nodes to use to convert the DN to nodes."""
 
-        for account in accounts:
-            if isinstance(account, (User,Computer)) and account.get_dn() in self.member_dn:
-                self.member.append(account.get_id())
+        self.member = index.lookup(self.member_dn)
+        self.member_dn = []
 
 
     def to_json(self) -> dict:
         """Convert a group as a dictionary (JSON) representation.
         :return: edges as a list of dictionary."""
 
-        return {"id": self.ipaUniqueID,
-                "Properties": {"distinguishedname": self.dn,
-                               "name": self.cn,
-                               "description": self.desc,
+        rdn, cn, ipaUniqueID, desc = unpack(self.record)
+        return {"id": ipaUniqueID,
+                "Properties": {"distinguishedname": join_dn(rdn, self.parent),
+                               "name": cn,
+                               "description": desc,
                                "domainsid": self.domainsid},
                 "kinds": ["Group"]}
 
 class HBACService(Node):
     """Represents an HBACService."""
 
+    __slots__ = ()
+
     def __init__(self, dn: str, cn: str, ipaUniqueID:str, domainsid:str):
 
         cn = str(cn).replace("-", "")
@@ -170,24 +192,28 @@ class HBACService(Node):
 class HBACServicesGroup(Node):
     """Represents an HBACServicesGroup."""
 
+    __slots__ = ("member_dn", "member")
+
     def __init__(self, dn: str, cn: str, ipaUniqueID: str, member: list, domainsid: str):
 
         super().__init__(dn, cn, ipaUniqueID, domainsid)
 
-        self.member_dn = list(member)
+        self.member_dn = [str(dn) for dn in member]
         self.member = []
 
-    def resolve_member_dn(self, accounts: list[Node]):
+    def resolve_member_dn(self, index: DNIndex):
         """Build the list of members ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
+        :param index: index of the nodes to use to convert the DN to ipaUniqueID."""
 
-        for account in accounts:
-            if isinstance(account, (HBACService)) and account.get_dn() in self.member_dn:
+        for account in index.lookup(self.member_dn):
+            if isinstance(account, HBACService):
                 self.member.append(account.get_cn())
 
 class SudoCmd(Node):
     """Represents an SudoCmd."""
 
+    __slots__ = ()
+
     def __init__(self, dn: str, cn: str, ipaUniqueID:str, domainsid:str):
 
         cn = str(cn).replace("-", "")
@@ -195,19 +221,48 @@ class SudoCmd(Node):
 class SudoCmdGroup(Node):
     """Represent a group of sudo commands."""
 
+    __slots__ = ("member_dn", "member")
+
     def __init__(self, dn: str, cn:str, ipaUniqueID: str, member: list, domainsid: str):
 
         super().__init__(dn, cn, ipaUniqueID, domainsid)
-        self.member_dn = list(member)
+        self.member_dn = [str(dn) for dn in member]
         self.member = []
 
-    def resolve_member_dn(self, accounts: list[Node]):
+    def resolve_member_dn(self, index: DNIndex):
         """Build the list of members ipaUniqueID based on the DN of the nodes.
-        :param accounts: list of accounts to use to convert the DN to ipaUniqueID."""
+        :param index: index of the nodes to use to convert the DN to ipaUniqueID."""
 
-        for account in accounts:
-            if isinstance(account, (SudoCmd)) and account.get_dn() in self.member_dn:
+        for account in index.lookup(self.member_dn):
+            if isinstance(account, SudoCmd):
                 self.member.append(account.get_cn())
 
+
+class SudoRule(Node):
+    """Represent a sudo rule of the compact sudo model, linking its users to its hosts with the commands and the runas
+    users as properties."""
+
+    __slots__ = ("commands", "runas")
+
+    def __init__(self, dn: str, cn: str, ipaUniqueID: str, domainsid: str):
+
+        super().__init__(dn, cn, ipaUniqueID, domainsid)
+        self.commands = []
+        self.runas = []
+
+    def to_json(self) -> dict:
+        """Convert a sudo rule as a dictionary (JSON) representation.
+        :return: sudo rule as a dictionary."""
+
+        rdn, cn, ipaUniqueID, desc = unpack(self.record)
+        return {"id": ipaUniqueID,
+                "properties": {"name": cn,
+                               "distinguishedname": join_dn(rdn, self.parent),
+                               "description": desc,
+                               "domainsid": self.domainsid,
+                               "commands": self.commands,
+                               "runas": self.runas},
+                "kinds": ["SudoRule"]}
+
 if __name__ == "__main__":
-    pass
\ No newline at end of file
+    pass
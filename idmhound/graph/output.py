@@ -0,0 +1,232 @@
+# -*- coding:utf-8 -*-
+
+import gzip
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# Number of items encoded together, by a worker process when the encoding is parallel.
+BATCH_SIZE = 5000
+
+# Room left in a chunk limited in size for the end of the document.
+TAIL_SIZE = 512
+
+EXTENSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+# Default compression levels, the defaults of zlib and zstd: the highest gzip level is several times slower for files
+# a few percent smaller.
+LEVELS = {"gzip": 6, "zstd": 3}
+
+
+class OutputOptions():
+    """Options of the output files: compression, splitting into chunks, parallel encoding, and upload of the documents
+    instead of writing them to files."""
+
+    def __init__(self, compression: str | None = None, max_items: int = 0, max_bytes: int = 0, workers: int = 1,
+                 uploader=None, level: int | None = None):
+
+        self.compression = compression
+        self.level = level
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.uploader = uploader
+
+    def split(self) -> bool:
+        """Check if the output files are split into chunks."""
+
+        return self.max_items > 0 or self.max_bytes > 0
+
+
+def compress(data: bytes, compression: str | None, level: int | None = None) -> bytes:
+    """Compress data as a standalone gzip member or zstd frame. Members and frames can be concatenated, the
+    concatenation decompresses to the concatenation of the data.
+    :param data: data to compress.
+    :param compression: gzip, zstd or None.
+    :param level: compression level, None for the default level of the compression.
+    :return: compressed data."""
+
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=level or LEVELS["gzip"], mtime=0)
+    elif compression == "zstd":
+        # Optional dependency, only required when zstd compression is requested.
+        import zstandard
+        return zstandard.ZstdCompressor(level=level or LEVELS["zstd"]).compress(data)
+    return data
+
+
+def encode(items: list, compression: str | None, separated: bool = False, level: int | None = None) -> bytes:
+    """Encode items as elements of a JSON array, run in the worker processes.
+    :param items: items to encode.
+    :param compression: gzip, zstd or None.
+    :param separated: start with a comma, the items following others in the array.
+    :param level: compression level, None for the default level of the compression.
+    :return: encoded items, separated by commas."""
+
+    text = ", ".join(json.dumps(item) for item in items)
+    return compress((", " + text if separated else text).encode(), compression, level)
+
+
+def batches(items: Iterable, size: Callable[[], int]) -> Iterator[list]:
+    """Group items in lists, the size of each list being given by a function."""
+
+    items = iter(items)
+    while batch := list(islice(items, size())):
+        yield batch
+
+
+class ChunkedWriter():
+    """Write a JSON document made of arrays of items, such as the nodes and the edges of an Opengraph file, possibly
+    compressed and split into several complete documents (chunks).
+    The document is written as its head, the arrays in order and its tail, which may depend on the number of items of
+    the chunk. Each batch of items but the first of an array carries its separator, and the text between the arrays is
+    gathered until the next batch or the tail, so that few gzip members or zstd frames are written."""
+
+    def __init__(self, path: str, head: str, arrays: list[str], tail: Callable[[int], str], options: OutputOptions):
+
+        self.path = path
+        self.head = head
+        self.arrays = arrays
+        self.tail = tail
+        self.options = options
+        self.paths = []
+        self.output = None
+        self.pending = ""
+        self.total_items, self.total_bytes = 0, 0
+
+    def open(self):
+        """Start a new chunk."""
+
+        root, extension = os.path.splitext(self.path)
+        if self.options.split():
+            path = f"{root}_{len(self.paths) + 1:03d}{extension}{EXTENSIONS[self.options.compression]}"
+        else:
+            path = self.path + EXTENSIONS[self.options.compression]
+        self.paths.append(path)
+        # Uploaded documents are only held in memory, up to the size of a chunk.
+        self.output = open(path, "wb") if self.options.uploader is None else io.BytesIO()
+        self.size, self.count, self.array, self.first = 0, 0, -1, True
+        self.pending = self.head
+
+    def write_text(self, text: str):
+
+        self.write(compress(text.encode(), self.options.compression, self.options.level))
+
+    def write(self, data: bytes):
+
+        if self.pending:
+            text, self.pending = self.pending, ""
+            self.write_text(text)
+        self.output.write(data)
+        self.size += len(data)
+
+    def enter(self, array: int):
+        """Move to an array of the document, closing the previous ones. The text is written with the next data."""
+
+        while self.array < array:
+            if self.array >= 0:
+                self.pending += "], "
+            self.array += 1
+            self.pending += f'"{self.arrays[self.array]}": ['
+            self.first = True
+
+    def close(self):
+        """Finish the current chunk."""
+
+        if self.output is None:
+            return
+        self.enter(len(self.arrays) - 1)
+        text, self.pending = self.pending + "]" + self.tail(self.count), ""
+        self.write_text(text)
+        if self.options.uploader is not None:
+            self.options.uploader.submit(os.path.basename(self.paths[-1]), self.output.getvalue())
+        self.output.close()
+        self.output = None
+
+    def add(self, array: int, items: list, data: bytes, separated: bool):
+        """Add encoded items to an array, starting a new chunk if the current one would be too large.
+        :param array: position of the array in the document.
+        :param items: items added.
+        :param data: encoded items.
+        :param separated: the encoded items start with a comma."""
+
+        count = len(items)
+        if self.output is not None and self.count and (
+                (self.options.max_items and self.count + count > self.options.max_items) or
+                (self.options.max_bytes and self.size + len(data) + TAIL_SIZE > self.options.max_bytes)):
+            self.close()
+        if self.output is None:
+            self.open()
+        self.enter(array)
+        if separated and self.first:
+            # First items of a new chunk, encoded again without the separator.
+            data = encode(items, self.options.compression, False, self.options.level)
+        self.write(data)
+        self.first = False
+        self.count += count
+        self.total_items += count
+        self.total_bytes += len(data)
+
+    def batch_size(self) -> int:
+        """Returns the number of items to encode together. When the size of the chunks is limited, batches are about
+        an eighth of a chunk, based on the size of the items already encoded."""
+
+        size = min(BATCH_SIZE, self.options.max_items or BATCH_SIZE)
+        if self.options.max_bytes:
+            if not self.total_bytes:
+                return min(size, 100)
+            size = min(size, max(1, self.options.max_bytes * self.total_items // (8 * self.total_bytes)))
+        return size
+
+    def save(self, arrays: list[Iterable]) -> list[str]:
+        """Encode and write the items of the arrays of the document, in worker processes if requested.
+        :param arrays: items of each array of the document.
+        :return: paths of the files written."""
+
+        # The batches following the first one of an array are encoded with their separator.
+        tasks = ((array, batch, number > 0) for array, items in enumerate(arrays)
+                 for number, batch in enumerate(batches(items, self.batch_size)))
+        compression, level = self.options.compression, self.options.level
+        if self.options.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.options.workers) as executor:
+                # A bounded number of batches is in flight, so that the items are not all held in memory.
+                pending = deque()
+                for array, batch, separated in tasks:
+                    pending.append((array, batch, executor.submit(encode, batch, compression, separated, level),
+                                    separated))
+                    if len(pending) >= 2 * self.options.workers:
+                        position, batch, future, separated = pending.popleft()
+                        self.add(position, batch, future.result(), separated)
+                for position, batch, future, separated in pending:
+                    self.add(position, batch, future.result(), separated)
+        else:
+            for array, batch, separated in tasks:
+                self.add(array, batch, encode(batch, compression, separated, level), separated)
+        if self.output is None:
+            # Empty document.
+            self.open()
+        self.close()
+        return self.paths
+
+
+def bundle(path: str, paths: list[str]) -> str:
+    """Bundle files into a zip archive and remove them.
+    :param path: path of the archive.
+    :param paths: files to bundle.
+    :return: path of the archive."""
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for member in paths:
+            archive.write(member, os.path.basename(member))
+    for member in paths:
+        os.remove(member)
+    return path
+
+
+if __name__ == "__main__":
+    pass
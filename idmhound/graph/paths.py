@@ -0,0 +1,286 @@
+# -*- coding:utf-8 -*-
+
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+from fnmatch import fnmatchcase
+from itertools import accumulate
+from idmhound.graph.diff import read_document
+
+# Edges traversed by default: memberships and the access granted by the HBAC and sudo rules.
+DEFAULT_KINDS = ("MemberOf", "EffectiveMemberOf", "HBAC_*", "Sudoer*", "SudoOn", "CanAccess_*")
+
+# Edges between principals: memberships, and the Sudoer edges linking users to the SudoRule nodes of the compact sudo
+# model. Every other edge traversed grants access to a host or a hostgroup.
+PRINCIPAL_KINDS = ("MemberOf", "EffectiveMemberOf", "Sudoer")
+
+
+def adjacency(count: int, starts: array, ends: array, kinds: array) -> tuple[array, array, array]:
+    """Build the compressed sparse row (CSR) adjacency of a set of edges.
+    :param count: number of nodes.
+    :param starts: position of the start node of each edge.
+    :param ends: position of the end node of each edge.
+    :param kinds: number of the kind of each edge.
+    :return: offsets of the successors of each node, successors of all the nodes one node after the other (the
+    successors of the node at position i are successors[offsets[i]:offsets[i + 1]]) and kinds of the matching edges."""
+
+    degrees = Counter(starts)
+    offsets = array("I", accumulate((degrees[position] for position in range(count)), initial=0))
+    # Sorting is stable, the successors of a node keep the order of its edges.
+    order = sorted(range(len(starts)), key=starts.__getitem__)
+    return offsets, array("I", map(ends.__getitem__, order)), array("I", map(kinds.__getitem__, order))
+
+
+class PathGraph():
+    """In-memory graph of the nodes and edges of a realm, to answer reachability and shortest path queries offline.
+    The nodes are numbered in the order they are added and the edges are stored as CSR adjacency arrays of node
+    positions, in both directions and split between membership edges and access edges (HBAC and sudo rules). The
+    Sudoer edges to the SudoRule nodes of the compact sudo model are followed as memberships, the rule granting access
+    to its hosts: user -Sudoer-> rule -SudoOn-> host.
+    The HBAC and sudo rules of IdM grant access to hostgroups as well as to hosts, so a path may end with memberships
+    followed backwards after an access edge: user -MemberOf-> group -HBAC_sshd-> hostgroup <-MemberOf- host. The
+    searches therefore run over (node, side) states, a node being on the principal side until an access edge is crossed
+    and on the host side afterwards. Call build once all the nodes and edges are added."""
+
+    def __init__(self, kinds: Iterable[str] = DEFAULT_KINDS):
+
+        self.patterns = list(kinds)
+        self.positions = {}
+        self.nodes = []
+        self.names = {}
+        self.kinds = []
+        self.kind_numbers = {}
+        self.edges = {True: (array("I"), array("I"), array("I")), False: (array("I"), array("I"), array("I"))}
+        self.member = self.members = self.access = self.granted = None
+
+    def __len__(self) -> int:
+
+        return len(self.nodes)
+
+    def position(self, node_id: str) -> int:
+        """Returns the position of a node from its ID, the node being added if it is unknown."""
+
+        if node_id not in self.positions:
+            self.positions[node_id] = len(self.nodes)
+            self.nodes.append({"id": node_id, "properties": {}, "kinds": []})
+        return self.positions[node_id]
+
+    def add_nodes(self, nodes: Iterable[dict]):
+        """Add nodes in their dictionary (JSON) representation.
+        :param nodes: nodes to add."""
+
+        for node in nodes:
+            # Domains and groups spell their properties with a capital letter.
+            properties = node.get("properties", node.get("Properties", {}))
+            self.nodes[self.position(node["id"])] = {"id": node["id"], "properties": properties,
+                                                     "kinds": node.get("kinds", [])}
+
+    def add_edges(self, keys: Iterable[tuple]):
+        """Add edges, the edges whose kind is not traversed being skipped.
+        :param keys: edges as (kind, start ID, end ID) keys."""
+
+        positions, destinations = self.positions, {}
+        for kind, start_id, end_id in keys:
+            if kind not in destinations:
+                destinations[kind] = self.destination(kind)
+            destination = destinations[kind]
+            if destination is not None:
+                starts, ends, kinds, number = destination
+                start, end = positions.get(start_id), positions.get(end_id)
+                starts.append(self.position(start_id) if start is None else start)
+                ends.append(self.position(end_id) if end is None else end)
+                kinds.append(number)
+
+    def destination(self, kind: str) -> tuple | None:
+        """Returns the arrays holding the edges of a kind and the number of the kind, None if the kind is not traversed."""
+
+        if kind not in self.kind_numbers:
+            traversed = any(fnmatchcase(kind, pattern) for pattern in self.patterns)
+            self.kind_numbers[kind] = len(self.kinds) if traversed else None
+            if traversed:
+                self.kinds.append(kind)
+        if self.kind_numbers[kind] is None:
+            return None
+        return *self.edges[kind in PRINCIPAL_KINDS], self.kind_numbers[kind]
+
+    def build(self):
+        """Build the adjacency arrays and the index of the names once all the nodes and edges are added, the edges added
+        are released."""
+
+        count = len(self.nodes)
+        starts, ends, kinds = self.edges[True]
+        self.member, self.members = adjacency(count, starts, ends, kinds), adjacency(count, ends, starts, kinds)
+        starts, ends, kinds = self.edges[False]
+        self.access, self.granted = adjacency(count, starts, ends, kinds), adjacency(count, ends, starts, kinds)
+        self.edges = None
+        self.names = {}
+        for position, node in enumerate(self.nodes):
+            for field in ("distinguishedname", "name", "cn", "uid"):
+                value = node["properties"].get(field)
+                if isinstance(value, str) and value:
+                    self.names.setdefault(value.lower(), position)
+
+    def edge_count(self) -> int:
+        """Returns the number of edges traversed."""
+
+        return len(self.member[1]) + len(self.access[1])
+
+    def find(self, name: str) -> int:
+        """Find the position of a node from its ID, DN or name.
+        :param name: ID, or distinguished name, name, cn or uid of the node, case insensitive.
+        :return: position of the node."""
+
+        if name in self.positions:
+            return self.positions[name]
+        try:
+            return self.names[name.lower()]
+        except KeyError:
+            raise KeyError(name) from None
+
+    def describe(self, position: int) -> str:
+        """Returns the name of a node, or its ID if it has none."""
+
+        node = self.nodes[position]
+        return node["properties"].get("name") or node["id"]
+
+    def moves(self, reverse: bool) -> tuple[list, list]:
+        """Returns the adjacency arrays followed from each side, with the side they lead to.
+        Forward, the principal side follows the memberships, and the access edges to the host side where the hosts are
+        found by following the memberships of the hostgroups backwards. Backwards, the opposite."""
+
+        if reverse:
+            return [(self.members, 0)], [(self.granted, 0), (self.member, 1)]
+        return [(self.member, 0), (self.access, 1)], [(self.members, 1)]
+
+    def search(self, sources: list[int], reverse: bool = False, targets: set = None) -> tuple[array, list[int]]:
+        """Breadth-first search over the (node, side) states, the state of a node being 2 * position + side.
+        :param sources: states to start from.
+        :param reverse: follow the edges backwards.
+        :param targets: states ending the search once one of them is reached, None to explore all the reachable states.
+        :return: predecessor of each state (a source being its own predecessor, -1 if not reached) and states reached,
+        closest first."""
+
+        moves = self.moves(reverse)
+        parents = array("i", [-1]) * (2 * len(self.nodes))
+        for source in sources:
+            parents[source] = source
+        reached, frontier = list(sources), list(sources)
+        while frontier:
+            following = []
+            for state in frontier:
+                node = state >> 1
+                for (offsets, successors, _), side in moves[state & 1]:
+                    for successor in successors[offsets[node]:offsets[node + 1]]:
+                        successor = successor << 1 | side
+                        if parents[successor] == -1:
+                            parents[successor] = state
+                            following.append(successor)
+                            if targets is not None and successor in targets:
+                                return parents, reached + following
+            reached += following
+            frontier = following
+        return parents, reached
+
+    def select(self, states: list[int], origin: int, kinds: Iterable[str] = None) -> list[int]:
+        """Returns the nodes of the states reached by a search, without duplicates and without the node it started from.
+        :param states: states reached.
+        :param origin: position of the node the search started from.
+        :param kinds: kinds of the nodes to return (User, Group, Computer...), None for all.
+        :return: positions of the nodes."""
+
+        kinds = set(kinds) if kinds else None
+        found = dict.fromkeys(state >> 1 for state in states)
+        found.pop(origin, None)
+        return [position for position in found if kinds is None or not kinds.isdisjoint(self.nodes[position]["kinds"])]
+
+    def reachable(self, source: str, kinds: Iterable[str] = None) -> list[int]:
+        """Returns the nodes a node can reach: the groups it belongs to, and the hosts and hostgroups it can access.
+        :param source: ID, DN or name of the node.
+        :param kinds: kinds of the nodes to return (User, Group, Computer...), None for all.
+        :return: positions of the nodes, closest first."""
+
+        start = self.find(source)
+        return self.select(self.search([start << 1])[1], start, kinds)
+
+    def reaching(self, target: str, kinds: Iterable[str] = None) -> list[int]:
+        """Returns the nodes that can reach a node: the members of a group, or the principals that can access a host.
+        :param target: ID, DN or name of the node.
+        :param kinds: kinds of the nodes to return (User, Group, Computer...), None for all.
+        :return: positions of the nodes, closest first."""
+
+        end = self.find(target)
+        _, states = self.search([end << 1, end << 1 | 1], reverse=True)
+        # A search starts on the principal side, the nodes reached backwards on the host side cannot start a path.
+        return self.select([state for state in states if not state & 1], end, kinds)
+
+    def shortest_path(self, source: str, target: str) -> list[tuple]:
+        """Find a shortest path between two nodes.
+        :param source: ID, DN or name of the start node.
+        :param target: ID, DN or name of the end node.
+        :return: edges of the path as (start position, kind, end position) tuples in the direction of the edges (the
+        last ones pointing backwards when a host is reached through a hostgroup), an empty list if there is no path."""
+
+        start, end = self.find(source), self.find(target)
+        targets = {end << 1, end << 1 | 1}
+        if start == end:
+            return []
+        parents, _ = self.search([start << 1], targets=targets)
+        state = next((state for state in targets if parents[state] != -1), None)
+        path = []
+        while state is not None and parents[state] != state:
+            previous = parents[state]
+            if previous & 1:
+                # Membership of a hostgroup, followed backwards from the hostgroup.
+                path.append((state >> 1, self.kind(self.member, state >> 1, previous >> 1), previous >> 1))
+            else:
+                edges = self.access if state & 1 else self.member
+                path.append((previous >> 1, self.kind(edges, previous >> 1, state >> 1), state >> 1))
+            state = previous
+        return path[::-1]
+
+    def kind(self, edges: tuple, start: int, end: int) -> str:
+        """Returns the kind of the first edge between two nodes.
+        :param edges: adjacency arrays holding the edge.
+        :param start: position of the start node.
+        :param end: position of the end node.
+        :return: kind of the edge."""
+
+        offsets, successors, kinds = edges
+        for index in range(offsets[start], offsets[start + 1]):
+            if successors[index] == end:
+                return self.kinds[kinds[index]]
+        raise KeyError((start, end))
+
+
+def parsed_graph(nodes: list, edges: list, kinds: Iterable[str] = DEFAULT_KINDS) -> PathGraph:
+    """Build the path graph of parsed nodes and edges.
+    :param nodes: nodes of the realm.
+    :param edges: groups of edges of the realm, once resolved.
+    :param kinds: patterns of the kinds of the edges to traverse.
+    :return: path graph, built."""
+
+    graph = PathGraph(kinds)
+    graph.add_nodes(node.to_json() for node in nodes)
+    graph.add_edges(key for group in edges for key in group.keys())
+    graph.build()
+    return graph
+
+
+def opengraph_graph(paths: list[str], kinds: Iterable[str] = DEFAULT_KINDS) -> PathGraph:
+    """Build the path graph of an Opengraph output, possibly split into chunks and compressed.
+    :param paths: paths of the files of the output.
+    :param kinds: patterns of the kinds of the edges to traverse.
+    :return: path graph, built."""
+
+    graph = PathGraph(kinds)
+    for path in paths:
+        document = read_document(path).get("graph", {})
+        graph.add_nodes(document.get("nodes", []))
+        graph.add_edges((edge["kind"], edge["start"]["value"], edge["end"]["value"])
+                        for edge in document.get("edges", []))
+    graph.build()
+    return graph
+
+
+if __name__ == "__main__":
+    pass
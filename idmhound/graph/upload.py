@@ -0,0 +1,207 @@
+# -*- coding:utf-8 -*-
+
+import base64
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+logger = logging.getLogger()
+
+# Statuses after which a request is sent again: rate limiting and server errors.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BloodHoundClient():
+    """Client of the file upload API of BloodHound CE. Requests are signed with an API token (ID and key) or carry a
+    JWT, and are sent over persistent connections, one per thread, reused from request to request."""
+
+    def __init__(self, url: str, token_id: str = "", token_key: str = "", jwt: str = "", retries: int = 3,
+                 backoff: float = 1.0, timeout: float = 300, verify: bool = True):
+
+        url = urlsplit(url)
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.prefix = url.path.rstrip("/")
+        self.token_id = token_id
+        self.token_key = token_key
+        self.jwt = jwt
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.context = ssl.create_default_context() if verify else ssl._create_unverified_context()
+        self.local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        """Returns the persistent connection of the current thread, opening it if needed."""
+
+        if getattr(self.local, "connection", None) is None:
+            if self.scheme == "https":
+                self.local.connection = http.client.HTTPSConnection(self.host, timeout=self.timeout,
+                                                                    context=self.context)
+            else:
+                self.local.connection = http.client.HTTPConnection(self.host, timeout=self.timeout)
+        return self.local.connection
+
+    def reset(self):
+        """Close the connection of the current thread, a new one is opened by the next request."""
+
+        if getattr(self.local, "connection", None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+
+    def headers(self, method: str, uri: str, body: bytes, content_type: str) -> dict:
+        """Build the headers of a request, signing it when an API token is used.
+        :param method: HTTP method.
+        :param uri: path of the request.
+        :param body: body of the request.
+        :param content_type: type of the body.
+        :return: headers."""
+
+        headers = {"User-Agent": "idmhound", "Content-Type": content_type}
+        if self.jwt:
+            headers["Authorization"] = f"Bearer {self.jwt}"
+        elif self.token_id:
+            # Signature scheme of the BloodHound API: the key signs the request, then the hour of the request date,
+            # then the body.
+            digester = hmac.new(self.token_key.encode(), f"{method}{uri}".encode(), hashlib.sha256)
+            date = datetime.now().astimezone().isoformat("T")
+            digester = hmac.new(digester.digest(), date[:13].encode(), hashlib.sha256)
+            digester = hmac.new(digester.digest(), body, hashlib.sha256)
+            headers.update({"Authorization": f"bhesignature {self.token_id}", "RequestDate": date,
+                            "Signature": base64.b64encode(digester.digest()).decode()})
+        return headers
+
+    def request(self, method: str, path: str, body: bytes = b"", content_type: str = "application/json") -> dict:
+        """Send a request, again after a backoff if the connection fails or the server is unavailable.
+        :param method: HTTP method.
+        :param path: path of the API endpoint.
+        :param body: body of the request.
+        :param content_type: type of the body.
+        :return: decoded JSON response, empty if the response has no body."""
+
+        uri = self.prefix + path
+        for attempt in range(self.retries + 1):
+            try:
+                connection = self.connection()
+                connection.request(method, uri, body, self.headers(method, uri, body, content_type))
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as exception:
+                error = str(exception) or type(exception).__name__
+                self.reset()
+            else:
+                if response.status < 300:
+                    return json.loads(data) if data else {}
+                error = f"HTTP {response.status} {response.reason}: {data[:200].decode(errors='replace')}"
+                if response.status not in RETRY_STATUSES:
+                    raise ConnectionError(f"{method} {uri} failed with {error}")
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"{method} {uri} failed ({error}), retrying in {delay:g}s ({attempt + 1}/{self.retries}).")
+                time.sleep(delay)
+        raise ConnectionError(f"{method} {uri} failed after {self.retries + 1} attempts: {error}")
+
+    def start(self) -> int:
+        """Start a file upload job.
+        :return: ID of the job."""
+
+        return self.request("POST", "/api/v2/file-upload/start")["data"]["id"]
+
+    def upload(self, job: int, data: bytes):
+        """Upload a JSON file to a job.
+        :param job: ID of the job.
+        :param data: content of the file."""
+
+        self.request("POST", f"/api/v2/file-upload/{job}", data)
+
+    def end(self, job: int):
+        """End a file upload job, its files are then ingested.
+        :param job: ID of the job."""
+
+        self.request("POST", f"/api/v2/file-upload/{job}/end")
+
+
+class Uploader():
+    """Upload the documents produced by the output writers as files of BloodHound CE upload jobs, on a bounded pool of
+    threads. At most twice as many documents as threads are held in memory. Used as a context manager, the uploader is
+    closed when the run succeeds and aborted when it fails."""
+
+    def __init__(self, client: BloodHoundClient, workers: int = 2):
+
+        self.client = client
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(2 * workers)
+        self.futures = []
+        self.job = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, kind, error, traceback):
+
+        if error is None:
+            self.close()
+        else:
+            self.abort()
+
+    def submit(self, name: str, data: bytes):
+        """Queue a document for upload, waiting while too many documents are in flight.
+        :param name: name of the document, for the logs.
+        :param data: content of the document."""
+
+        if self.job is None:
+            self.job = self.client.start()
+            logger.info(f"Started BloodHound upload job {self.job}.")
+        self.slots.acquire()
+        self.futures.append(self.executor.submit(self.send, self.job, name, data))
+
+    def send(self, job: int, name: str, data: bytes):
+
+        try:
+            self.client.upload(job, data)
+            logger.info(f"Uploaded {name} ({len(data)} bytes) to job {job}.")
+        finally:
+            self.slots.release()
+
+    def flush(self):
+        """Wait for the documents in flight and end the current job, the next documents are uploaded to a new job."""
+
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+        if self.job is not None:
+            self.client.end(self.job)
+            logger.info(f"Ended BloodHound upload job {self.job}.")
+            self.job = None
+
+    def close(self):
+        """Upload the remaining documents, end the job and stop the threads."""
+
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+    def abort(self):
+        """Drop the documents not sent yet and stop the threads, without ending the current job: the API has no call to
+        cancel a job, and a job never ended is not ingested."""
+
+        self.executor.shutdown(cancel_futures=True)
+        self.futures = []
+        if self.job is not None:
+            logger.warning(f"Aborted BloodHound upload job {self.job}, its files will not be ingested.")
+            self.job = None
+
+
+if __name__ == "__main__":
+    pass
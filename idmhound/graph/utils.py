@@ -4,14 +4,21 @@ import re
 import json
 import logging
 from datetime import datetime
+from collections.abc import Iterable, Iterator
+from idmhound.graph.edges import Edges
+from idmhound.graph.index import DNIndex
+from idmhound.graph.output import OutputOptions, ChunkedWriter
+from idmhound.stats import STATS
 
 logger = logging.getLogger()
 
-def member_lookup(principals: list, subjects: list):
+def member_lookup(principals: list | DNIndex, subjects: list):
     """Convert the DN of an account to its SID for graphing.
-    :param principals: principals to resolve the DN.
+    :param principals: principals to resolve the DN, or an index of the principals shared between lookups.
     :param subjects: subjects whose DN should be resolved."""
 
+    if not isinstance(principals, DNIndex):
+        principals = DNIndex(principals)
     for subject in subjects:
         subject.resolve_member_dn(principals)
 
@@ -37,9 +44,7 @@ def to_opengraph(nodes: list, edges: list) -> dict:
     :return: Opengraph JSON containing the converted objects."""
 
     formatted_nodes = [node.to_json() for node in nodes]
-    formatted_edges = []
-    for edge in edges:
-        formatted_edges.extend(edge.to_json())
+    formatted_edges = list(unique_edges(edges))
     return {"metadata": {"source_kind": "IDMHound"}, "graph": {"nodes": formatted_nodes, "edges": formatted_edges}}
 
 
@@ -48,58 +53,129 @@ def to_opengraph_hbac(data: list) -> dict:
     :param data: list of HBAC.
     :return: Opengraph JSON containing the converted HBAC."""
 
-    opengraph = []
-    for entry in data:
-        opengraph.extend(entry.to_json())
-    return {"graph": {"nodes": [], "edges": opengraph}}
+    return {"graph": {"nodes": [], "edges": list(unique_edges(data))}}
+
+
+def unique_edges(edges: Iterable) -> Iterator[dict]:
+    """Convert groups of edges to edges as dictionaries, skipping the edges already produced by another group.
+    :param edges: groups of edges (HBAC, sudoer, membership) to convert.
+    :return: generator of edges as dictionaries."""
+
+    seen = set()
+    counts = STATS.counter("edges")
+    for edge in edges:
+        for key in edge.keys():
+            if key not in seen:
+                seen.add(key)
+                if counts is not None:
+                    counts[key[0]] += 1
+                yield Edges.edge(*key)
+
+
+def sudo_rules(sudoer: Iterable) -> list:
+    """Returns the SudoRule nodes of the compact sudo rules, to save along with the edges linking them.
+    :param sudoer: sudo rules, possibly seen through translated edges.
+    :return: list of SudoRule nodes, empty with the expanded sudo model."""
+
+    return [rule.node for rule in sudoer if getattr(rule, "node", None) is not None]
 
 
 def identify_realm_sid(data: list, realm: str) -> str:
     """Identify the SID of the realm.
-    :param data: list of LDAP entry to parse.
+    :param data: list of LDAP entry to parse, as (DN, attributes) tuples.
     :param realm: name of the realm.
     :return: SID of the realm."""
 
     ldap_realm = "".join([",dc=" + dc for dc in realm.split(".")])
-    for entry in data:
-        if re.match(f"cn={realm},cn=ad,cn=etc{ldap_realm}", entry.entry_dn) and "ipaNTSecurityIdentifier" in entry.entry_attributes_as_dict.keys():
-            sid = str(entry["ipaNTSecurityIdentifier"])
-            return sid
-        elif re.match(f"cn=Default SMB Group,cn=groups,cn=accounts{ldap_realm}", entry.entry_dn) and "ipaNTSecurityIdentifier" in entry.entry_attributes_as_dict.keys():
+    for dn, attrs in data:
+        if re.match(f"cn={realm},cn=ad,cn=etc{ldap_realm}", dn) and "ipaNTSecurityIdentifier" in attrs:
+            sid = attrs["ipaNTSecurityIdentifier"]
+            return str(sid[0] if isinstance(sid, list) else sid)
+        elif re.match(f"cn=Default SMB Group,cn=groups,cn=accounts{ldap_realm}", dn) and "ipaNTSecurityIdentifier" in attrs:
             logger.warning(f"Cannot reliably identify the domain SID. An LDAP anonymous bind was likely used. Graphable data will be limited.")
-            sid = str(entry["ipaNTSecurityIdentifier"])
+            sid = attrs["ipaNTSecurityIdentifier"]
+            sid = str(sid[0] if isinstance(sid, list) else sid)
             sid = "-".join(sid.split("-")[:-1])
             return sid
     else:
         raise ValueError("Cannot identify realm SID.")
 
 
-def legacy_save(domains, users, groups, computers, hbac, sudoer):
+def save_opengraph(path: str, nodes: Iterable, edges: Iterable, options: OutputOptions = None) -> list[str]:
+    """Save objects in the Opengraph file format, encoding nodes and edges as they are produced.
+    :param path: path of the output file.
+    :param nodes: nodes to save.
+    :param edges: edges to save.
+    :param options: compression, splitting and parallel encoding of the file.
+    :return: paths of the files written."""
+
+    writer = ChunkedWriter(path, '{"metadata": {"source_kind": "IDMHound"}, "graph": {', ["nodes", "edges"],
+                           lambda count: "}}", options or OutputOptions())
+    return writer.save([(node.to_json() for node in nodes), STATS.timed("edge_expansion", unique_edges(edges))])
+
+
+def save_json(path: str, data: Iterable, object_type: str, options: OutputOptions = None) -> list[str]:
+    """Save objects in the legacy file format, encoding them as they are produced.
+    :param path: path of the output file.
+    :param data: objects to save.
+    :param object_type: type of the objects to save.
+    :param options: compression, splitting and parallel encoding of the file.
+    :return: paths of the files written."""
+
+    def tail(count: int) -> str:
+        return ', "meta": ' + json.dumps({"methods": 0, "type": object_type, "count": count, "version": 5}) + "}"
+
+    writer = ChunkedWriter(path, "{", ["data"], tail, options or OutputOptions())
+    return writer.save([(entry.to_json() for entry in data)])
+
+
+def save_opengraph_hbac(path: str, data: Iterable, options: OutputOptions = None, nodes: Iterable = ()) -> list[str]:
+    """Save HBAC or sudoer edges in the Opengraph file format, encoding them as they are produced.
+    :param path: path of the output file.
+    :param data: HBAC or sudoer to save.
+    :param options: compression, splitting and parallel encoding of the file.
+    :param nodes: nodes to save with the edges, the SudoRule nodes of the compact sudo model.
+    :return: paths of the files written."""
+
+    writer = ChunkedWriter(path, '{"graph": {', ["nodes", "edges"], lambda count: "}}", options or OutputOptions())
+    return writer.save([(node.to_json() for node in nodes), STATS.timed("edge_expansion", unique_edges(data))])
+
+
+def save_opengraph_access(path: str, access: Iterable, options: OutputOptions = None) -> list[str]:
+    """Save the effective HBAC access in the Opengraph file format. The triples are unique, they are encoded as they
+    are produced without keeping track of the edges already written.
+    :param path: path of the output file.
+    :param access: effective HBAC access.
+    :param options: compression, splitting and parallel encoding of the file.
+    :return: paths of the files written."""
+
+    writer = ChunkedWriter(path, '{"graph": {', ["nodes", "edges"], lambda count: "}}", options or OutputOptions())
+    return writer.save([[], STATS.timed("edge_expansion", (Edges.edge(*key) for key in access.keys()))])
+
+
+def legacy_save(domains, users, groups, computers, hbac, sudoer, options: OutputOptions = None) -> list[str]:
     """Save data in the legacy file format.
     :param domains: domains in legacy JSON format.
     :param users: users in legacy JSON format.
     :param groups: groups in legacy JSON format.
     :param computers: computers in legacy JSON format.
     :param hbac: HBAC in Opengraph format.
-    :param sudoer: Sudoer in Opengraph format."""
+    :param sudoer: Sudoer in Opengraph format.
+    :param options: compression, splitting, parallel encoding or upload of the files.
+    :return: paths of the files written."""
 
     now = datetime.now().strftime("%Y%m%d%H%M%S")
-    logger.info(f"Saved domains to legacy file format: domains_{now}.json")
-    logger.info(f"Saved users to legacy file format: users_{now}.json")
-    logger.info(f"Saved groups to legacy file format: groups_{now}.json")
-    logger.info(f"Saved computers to legacy file format: computers_{now}.json")
-    logger.info(f"Saved HBAC to Opengraph file format: hbac_{now}.json")
-    logger.info(f"Saved sudoer to Opengraph file format: sudoer_{now}.json")
-
-    with open(f"domains_{now}.json", "w") as output:
-        output.write(json.dumps(to_json(domains, "domains")))
-    with open(f"users_{now}.json", "w") as output:
-        output.write(json.dumps(to_json(users, "users")))
-    with open(f"groups_{now}.json", "w") as output:
-        output.write(json.dumps(to_json(groups, "groups")))
-    with open(f"computers_{now}.json", "w") as output:
-        output.write(json.dumps(to_json(computers, "computers")))
-    with open(f"hbac_{now}.json", "w") as output:
-        output.write(json.dumps(to_opengraph_hbac(hbac)))
-    with open(f"sudoer_{now}.json", "w") as output:
-        output.write(json.dumps(to_opengraph_hbac(sudoer)))
\ No newline at end of file
+    paths = []
+    paths += save_json(f"domains_{now}.json", domains, "domains", options)
+    paths += save_json(f"users_{now}.json", users, "users", options)
+    paths += save_json(f"groups_{now}.json", groups, "groups", options)
+    paths += save_json(f"computers_{now}.json", computers, "computers", options)
+    if options is not None and options.uploader is not None:
+        # The nodes are ingested before the edges, which would otherwise create duplicated nodes.
+        options.uploader.flush()
+    paths += save_opengraph_hbac(f"hbac_{now}.json", hbac, options)
+    paths += save_opengraph_hbac(f"sudoer_{now}.json", sudoer, options, sudo_rules(sudoer))
+    if options is None or options.uploader is None:
+        for path in paths:
+            logger.info(f"Saved {path}")
+    return paths
@@ -1,64 +1,355 @@
 # -*- coding:utf -*-
 
-import json
 from idmhound.graph.utils import *
+from idmhound.graph.output import OutputOptions, bundle
 from idmhound.collectors import ldap
+from idmhound.collectors.backends import BACKENDS
+from idmhound.stats import STATS
 import argparse
+import cProfile
+import contextlib
+import importlib.util
+import json
 import logging
+import os
 import sys
 from datetime import datetime
 
 
 def main():
 
-    parser = argparse.ArgumentParser(add_help=True, description="Bloodhound collector for FreeIPA/Red Hat IdM environment.")
-    parser.add_argument("-d", "--domain", action="store", required=True, help="Domain / realm to query.")
+    if sys.argv[1:2] == ["query"]:
+        # Offline queries of a graph already collected, with their own options.
+        from idmhound import query
+        return query.main(sys.argv[2:])
+    parser = argparse.ArgumentParser(add_help=True, description="Bloodhound collector for FreeIPA/Red Hat IdM environment. Run \"idmhound query -h\" for the offline path queries.")
+    parser.add_argument("-d", "--domain", action="store", default="", help="Domain / realm to query, required unless --realms is used.")
     parser.add_argument("-u", "--username", action="store", default="", help="Username to query the realm.")
     parser.add_argument("-p", "--password", action="store", default="", help="Password of the account to query the realm.")
-    parser.add_argument("-dc", "--domain-controller", action="store", required=True, help="Server to query.")
+    parser.add_argument("-dc", "--domain-controller", action="store", default="", help="Server to query, required unless --from-raw is used.")
     parser.add_argument("-dn", "--base-dn", action="store", default="", help="Base DN to query.")
+    parser.add_argument("--realms", action="store", default="", metavar="CONFIG", help="Collect the realms listed in a TOML file concurrently and merge them into a single Opengraph file.")
     parser.add_argument("-l", "--legacy", action="store_true", default=False, help="Output the file in the legacy Bloodhound format.")
+    parser.add_argument("-b", "--both-formats", action="store_true", default=False, help="Output the files in both the Opengraph and the legacy Bloodhound formats, from a single parse.")
+    parser.add_argument("--backend", action="store", choices=list(BACKENDS), default="ldap3", help="LDAP client library: ldap3 (default, pure Python) or python-ldap (libldap, faster on large searches, requires the python-ldap package).")
     parser.add_argument("-k", "--kerberos", action="store_true", default=False, help="Use kerberos authentication.")
+    parser.add_argument("-t", "--targeted", action="store_true", default=False, help="Only query the containers and attributes used by IDMHound.")
+    parser.add_argument("-w", "--workers", action="store", type=int, default=1, help="Number of concurrent LDAP searches, implies --targeted.")
+    parser.add_argument("-r", "--replicas", action="store", nargs="+", default=[], help="Additional IdM replicas to spread the LDAP searches across, implies --targeted.")
+    parser.add_argument("-ps", "--page-size", action="store", type=int, default=0, help="Retrieve the LDAP entries by pages of the given size and parse them as they arrive (0 to disable).")
+    parser.add_argument("--parse-workers", action="store", type=int, default=1, help="Number of worker processes parsing the LDAP entries, by batches (Opengraph, legacy and both formats).")
+    parser.add_argument("-i", "--incremental", action="store", default="", metavar="STATE", help="Only retrieve the entries changed since the previous run, keeping the realm in the given local state store. Only the collection is incremental: the whole graph is parsed and written again from all the stored entries, at the cost of a full run.")
+    parser.add_argument("--watermark", action="store", choices=["modifyTimestamp", "entryUSN"], default="modifyTimestamp", help="Attribute used to detect the changed entries in incremental mode (default: modifyTimestamp).")
+    parser.add_argument("--checkpoint", action="store", default="", metavar="SPOOL", help="Spool the collected entries to a file, checkpointing the progress after each page and reconnecting when the connection drops (the targeted searches run sequentially).")
+    parser.add_argument("--resume", action="store_true", default=False, help="Finish the interrupted collection of --checkpoint instead of starting over.")
+    parser.add_argument("--retries", action="store", type=int, default=5, help="Number of reconnections attempted in a row by a checkpointed collection (default: 5).")
+    parser.add_argument("--save-raw", action="store", default="", metavar="SNAPSHOT", help="Save the collected LDAP entries to a snapshot file.")
+    parser.add_argument("--from-raw", action="store", default="", metavar="SNAPSHOT", help="Parse the LDAP entries of a snapshot file instead of querying the realm.")
+    parser.add_argument("-e", "--effective-membership", action="store_true", default=False, help="Add EffectiveMemberOf edges from each principal to all the groups and hostgroups it belongs to through nested groups (Opengraph only).")
+    parser.add_argument("--sudo-model", action="store", choices=["expanded", "compact"], default="expanded", help="Sudoer edges: one kind per command and runas user (expanded, default), or one SudoRule node per rule holding the commands and runas users, linked to its users by Sudoer edges and to its hosts by SudoOn edges (compact).")
+    parser.add_argument("--diff", action="store", nargs="+", default=[], metavar="PREVIOUS", help="Only write the nodes and edges added or changed since a previous Opengraph output (all its files, if split into chunks) or raw snapshot, and a summary of the changes including the removed ones.")
+    parser.add_argument("-a", "--hbac-access", action="store_true", default=False, help="Evaluate the HBAC rules down to (user, host, service) triples and save them as CanAccess edges.")
+    parser.add_argument("--who-can-access", action="store", default="", metavar="[SERVICE/]HOST", help="Log the users allowed to access a host by the HBAC rules, through a service or any service.")
+    parser.add_argument("-c", "--compress", action="store", choices=["gzip", "zstd"], default=None, help="Compress the output files (zstd requires the zstandard package).")
+    parser.add_argument("--compress-level", action="store", type=int, default=None, help="Compression level (default: 6 for gzip, 3 for zstd).")
+    parser.add_argument("--chunk-items", action="store", type=int, default=0, help="Split the output files into chunks of at most this number of nodes and edges.")
+    parser.add_argument("--chunk-size", action="store", type=float, default=0, help="Split the output files into chunks of at most this size, in MB.")
+    parser.add_argument("--output-workers", action="store", type=int, default=1, help="Number of worker processes encoding and compressing the output files.")
+    parser.add_argument("-z", "--zip", action="store_true", default=False, help="Bundle the legacy output files in a zip archive.")
+    parser.add_argument("--upload", action="store", default="", metavar="URL", help="Upload the output to the file upload API of a BloodHound CE instance instead of writing files.")
+    parser.add_argument("--token-id", action="store", default=os.environ.get("BLOODHOUND_TOKEN_ID", ""), help="ID of the BloodHound API token (default: $BLOODHOUND_TOKEN_ID).")
+    parser.add_argument("--token-key", action="store", default=os.environ.get("BLOODHOUND_TOKEN_KEY", ""), help="Key of the BloodHound API token (default: $BLOODHOUND_TOKEN_KEY).")
+    parser.add_argument("--jwt", action="store", default=os.environ.get("BLOODHOUND_JWT", ""), help="JWT of a BloodHound session, instead of an API token (default: $BLOODHOUND_JWT).")
+    parser.add_argument("--upload-workers", action="store", type=int, default=2, help="Number of concurrent uploads (default: 2).")
+    parser.add_argument("--insecure", action="store_true", default=False, help="Do not verify the TLS certificate of the BloodHound instance.")
+    parser.add_argument("--stats", action="store", default="", metavar="FILE", help="Write the time, CPU time and peak memory of each phase, and counters of the entries and edges, to a JSON file.")
+    parser.add_argument("--trace-memory", action="store_true", default=False, help="Also measure the peak memory allocated in each phase of the main thread with tracemalloc (slower), the phases run by worker threads are not measured.")
+    parser.add_argument("--profile", action="store", default="", metavar="FILE", help="Profile the run with cProfile and write the statistics to a file.")
     args = parser.parse_args()
+    # The modules of the optional features are only imported by the runs using them.
+    if args.realms:
+        from idmhound.collectors.realms import load_realms
+        try:
+            args.realm_list = load_realms(args.realms)
+        except (OSError, ValueError) as error:
+            parser.error(f"invalid realms configuration: {error}")
+        if args.legacy or args.both_formats or args.incremental or args.checkpoint or args.save_raw or args.from_raw or args.hbac_access or args.who_can_access:
+            parser.error("--realms cannot be used with --legacy, --both-formats, --incremental, --checkpoint, --save-raw, --from-raw or the HBAC access evaluation")
+        args.domain = ",".join(realm["domain"] for realm in args.realm_list)
+    elif not args.domain:
+        parser.error("the following arguments are required: -d/--domain")
+    elif not args.domain_controller and not args.from_raw:
+        parser.error("the following arguments are required: -dc/--domain-controller")
+    if args.diff and args.legacy:
+        parser.error("--diff cannot be used with --legacy")
+    if args.diff or args.from_raw:
+        from idmhound.collectors.snapshot import is_raw
+        missing = [path for path in [args.from_raw] + args.diff if path and not os.path.isfile(path)]
+        if missing:
+            parser.error(f"no such file: {', '.join(missing)}")
+    if args.from_raw and not is_raw(args.from_raw):
+        parser.error(f"{args.from_raw} is not an IDMHound raw snapshot")
+    if args.diff and is_raw(args.diff[0]) and (args.realms or len(args.diff) > 1):
+        parser.error("--diff accepts a single raw snapshot, of the realm given with -d")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    if args.checkpoint and (args.incremental or args.from_raw):
+        parser.error("--checkpoint cannot be used with --incremental or --from-raw")
+    if args.upload and not (args.jwt or (args.token_id and args.token_key)):
+        parser.error("--upload requires --token-id and --token-key, or --jwt")
+    if args.upload and (args.compress or args.zip):
+        parser.error("--upload cannot be used with --compress or --zip")
+    if args.compress == "zstd" and importlib.util.find_spec("zstandard") is None:
+        parser.error("zstd compression requires the zstandard package")
+    if importlib.util.find_spec(BACKENDS[args.backend].module) is None:
+        parser.error(f"the {args.backend} backend requires the {args.backend} package")
+    args.targeted = args.targeted or args.workers > 1 or bool(args.replicas)
 
     logging.basicConfig(stream=sys.stdout, encoding="utf-8", filemode="w", level=logging.INFO,
                         format="{asctime} - {levelname}: {message}", style="{", datefmt="%d-%m-%Y %H:%M:%S")
     logger = logging.getLogger()
 
+    if args.stats:
+        STATS.enable(args.trace_memory)
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    options = output_options(args)
+    # The upload job is ended once the run succeeds, and aborted if it fails.
+    with STATS.phase("total"), options.uploader or contextlib.nullcontext():
+        if args.realms:
+            run_realms(args, options)
+        else:
+            run(args, options)
+    if args.profile:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        logger.info(f"Profile saved to {args.profile}.")
+    if args.stats:
+        STATS.save(args.stats, args.domain)
+        logger.info(f"Statistics saved to {args.stats}.")
+
+
+def output_options(args: argparse.Namespace) -> OutputOptions:
+    """Build the options of the output files from the command line. When uploading, the documents are split into chunks
+    of 50 MB unless another size is given.
+    :param args: arguments of the command line.
+    :return: options of the output files."""
+
+    uploader = None
+    max_bytes = int(args.chunk_size * 2 ** 20)
+    if args.upload:
+        # Only imported when uploading, with the TLS and HTTP modules it needs.
+        from idmhound.graph.upload import BloodHoundClient, Uploader
+        client = BloodHoundClient(args.upload, args.token_id, args.token_key, args.jwt, verify=not args.insecure)
+        uploader = Uploader(client, args.upload_workers)
+        max_bytes = max_bytes or 50 * 2 ** 20
+    return OutputOptions(args.compress, args.chunk_items, max_bytes, args.output_workers, uploader, args.compress_level)
+
+
+def run(args: argparse.Namespace, options: OutputOptions):
+    """Collect, parse and save the data of a realm.
+    :param args: arguments of the command line.
+    :param options: compression, splitting, parallel encoding or upload of the output files."""
+
+    logger = logging.getLogger()
     logger.info(f"Getting LDAP data of {args.domain}...")
     ldap_realm = "".join([",dc=" + dc for dc in args.domain.split(".")])
     bind_dn = f"uid={args.username},cn=users,cn=accounts{ldap_realm}"
-    data = ldap.collect(args.domain_controller, args.base_dn, bind_dn, args.password, args.kerberos)
-    logger.info(f"Found {len(data)} LDAP entries.")
-    sid = identify_realm_sid(data, args.domain)
+    base_dn = (args.base_dn or ldap_realm[1:]) if args.targeted else args.base_dn
+    with STATS.phase("collect"):
+        if args.from_raw:
+            from idmhound.collectors.snapshot import load_raw
+            # The snapshot is read twice through a memory map, the entries are streamed to the parser.
+            sid = find_sid(load_raw(args.from_raw), args.domain)
+            data = load_raw(args.from_raw)
+            logger.info(f"Reading LDAP entries from {args.from_raw}.")
+        elif args.incremental:
+            from idmhound.collectors.incremental import collect_incremental
+            data = collect_incremental(args.incremental, args.domain_controller, args.base_dn or ldap_realm[1:], bind_dn, args.password, args.kerberos, args.page_size, args.watermark, args.backend)
+            logger.info(f"Found {len(data)} LDAP entries in {args.incremental}.")
+            sid = find_sid(data, args.domain)
+        elif args.checkpoint:
+            from idmhound.collectors.checkpoint import collect_resumable
+            from idmhound.collectors.snapshot import load_raw
+            data = collect_resumable(args.checkpoint, args.domain_controller, base_dn, bind_dn, args.password, args.kerberos, args.page_size, targeted=args.targeted, resume=args.resume, retries=args.retries, backend=args.backend)
+            logger.info(f"Reading LDAP entries from {args.checkpoint}.")
+            sid = find_sid(load_raw(args.checkpoint), args.domain)
+        else:
+            # Paged entries are streamed to the parser, the SID being looked up with a dedicated search beforehand.
+            data, sid = ldap.collect_with_sid(args.domain_controller, base_dn, bind_dn, args.password, args.kerberos, args.domain, args.page_size, args.targeted, args.workers, args.replicas, args.backend)
+            if args.page_size > 0:
+                logger.info(f"Streaming LDAP entries by pages of {args.page_size}.")
+            else:
+                logger.info(f"Found {len(data)} LDAP entries.")
     logger.info(f"Realm SID: {sid}")
+    if args.save_raw:
+        from idmhound.collectors.snapshot import save_raw
+        logger.info(f"Saving LDAP entries to {args.save_raw}.")
+        data = save_raw(args.save_raw, data)
 
     logger.info("Parsing LDAP data...")
-    if args.legacy:
-        domains, users, groups, computers, hbac, sudoer, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = ldap.legacy_parse(data, args.domain, sid)
-        member_lookup(users + computers + groups, groups)
-        member_lookup(hbacservices, hbacservicesgroups)
-        member_lookup(users + computers + groups +hbacservices + hbacservicesgroups, hbac)
-        member_lookup(sudocmds, sudocmdgroups)
-        member_lookup(users + computers + groups + sudocmds + sudocmdgroups, sudoer)
+    if args.both_formats:
+        export_both(args, data, sid, options)
+    elif args.legacy:
+        with STATS.phase("parse"):
+            domains, users, groups, computers, hbac, sudoer, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = ldap.legacy_parse(data, args.domain, sid, args.sudo_model == "compact", args.parse_workers)
+        index = DNIndex(users + computers + groups + hbacservices + hbacservicesgroups + sudocmds + sudocmdgroups)
+        lookup(index, groups=groups, hbacservicesgroups=hbacservicesgroups, hbac=hbac, sudocmdgroups=sudocmdgroups, sudoer=sudoer)
+        if args.hbac_access or args.who_can_access:
+            evaluate_access(args, hbac, users, computers, groups, hbacservices, options)
         logger.info("Save output to legacy JSON file format.")
-        legacy_save(domains, users, groups, computers, hbac, sudoer)
+        with STATS.phase("serialization"):
+            paths = legacy_save(domains, users, groups, computers, hbac, sudoer, options)
+            if args.zip:
+                archive = bundle(f"idmhound_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip", paths)
+                logger.info(f"Bundled legacy files to {archive}")
     else:
-        domains, users, groups, computers, hbac, sudoer, membership, hbacservicesgroups, hbacservices, sudocmdgroups, sudocmds = ldap.parse(data, args.domain, sid)
-        member_lookup(users + computers + groups, membership)
-        member_lookup(hbacservices, hbacservicesgroups)
-        member_lookup(users + computers + groups +hbacservices + hbacservicesgroups, hbac)
-        member_lookup(sudocmds, sudocmdgroups)
-        member_lookup(users + computers + groups + sudocmds + sudocmdgroups, sudoer)
+        model, effective = ldap.parse_realm(data, args.domain, sid, args.sudo_model == "compact", args.parse_workers, args.effective_membership)
+        if args.hbac_access or args.who_can_access:
+            evaluate_access(args, model.hbac, model.users, model.computers, model.groups, model.hbacservices, options)
         now = datetime.now().strftime("%Y%m%d%H%M%S")
         logger.info(f"Save output to Opengraph file format: idmhound_{now}.json")
 
-        with open(f"idmhound_{now}.json","w") as output:
-            output.write(json.dumps(to_opengraph(domains+users+groups+computers, hbac+membership+sudoer)))
+        with STATS.phase("serialization"):
+            save_graph(args, f"idmhound_{now}.json", *model.opengraph(effective), options)
+
+
+def export_both(args: argparse.Namespace, data: Iterable, sid: str, options: OutputOptions):
+    """Parse the data of a realm once and save it in both the Opengraph and the legacy file formats.
+    :param args: arguments of the command line.
+    :param data: LDAP entries of the realm.
+    :param sid: SID of the realm.
+    :param options: compression, splitting and parallel encoding of the output files."""
+
+    logger = logging.getLogger()
+    model, effective = ldap.parse_realm(data, args.domain, sid, args.sudo_model == "compact", args.parse_workers, args.effective_membership, legacy=True)
+    if args.hbac_access or args.who_can_access:
+        evaluate_access(args, model.hbac, model.users, model.computers, model.groups, model.hbacservices, options)
+    now = datetime.now().strftime("%Y%m%d%H%M%S")
+    logger.info(f"Save output to Opengraph file format: idmhound_{now}.json")
+
+    with STATS.phase("serialization"):
+        save_graph(args, f"idmhound_{now}.json", *model.opengraph(effective), options)
+        logger.info("Save output to legacy JSON file format.")
+        paths = legacy_save(*model.legacy(), options)
+        if args.zip:
+            archive = bundle(f"idmhound_{now}.zip", paths)
+            logger.info(f"Bundled legacy files to {archive}")
+
+
+def run_realms(args: argparse.Namespace, options: OutputOptions):
+    """Collect several realms concurrently and save them in a single Opengraph file.
+    :param args: arguments of the command line.
+    :param options: compression, splitting, parallel encoding or upload of the output file."""
+
+    logger = logging.getLogger()
+    from idmhound.collectors.realms import collect_realms
+    logger.info(f"Collecting {len(args.realm_list)} realms: {args.domain}")
+    with STATS.phase("collect"):
+        nodes, edges = collect_realms(args.realm_list, args.targeted, args.page_size, args.workers, args.effective_membership,
+                                      args.sudo_model == "compact", args.backend)
+    now = datetime.now().strftime("%Y%m%d%H%M%S")
+    logger.info(f"Save output to Opengraph file format: idmhound_{now}.json")
+
+    with STATS.phase("serialization"):
+        save_graph(args, f"idmhound_{now}.json", nodes, edges, options)
+
+
+def save_graph(args: argparse.Namespace, path: str, nodes: list, edges: list, options: OutputOptions):
+    """Save the Opengraph output or, in diff mode, the nodes and edges changed since the previous graph and a summary of
+    the changes.
+    :param args: arguments of the command line.
+    :param path: path of the output file.
+    :param nodes: nodes of the graph.
+    :param edges: edges of the graph, once resolved.
+    :param options: compression, splitting, parallel encoding or upload of the output files."""
+
+    logger = logging.getLogger()
+    if not args.diff:
+        save_opengraph(path, nodes, edges, options)
+        return
+    from idmhound.graph.diff import GraphDiff, graph_items
+    with STATS.phase("diff"):
+        delta = GraphDiff(previous_graph(args), graph_items(nodes, edges))
+    path = path.replace("idmhound_", "idmhound_diff_")
+    logger.info(f"Save the changes to Opengraph file format: {path}")
+    delta.save(path, options)
+    summary = delta.summary(args.diff)
+    with open(path.removesuffix(".json") + "_summary.json", "w") as output:
+        json.dump(summary, output, indent=2)
+    for element in ["nodes", "edges"]:
+        counts = summary[element]
+        logger.info(f"{counts['added']} {element} added, {counts['changed']} changed, {counts['removed']} removed and {counts['unchanged']} unchanged.")
+
+
+def previous_graph(args: argparse.Namespace) -> tuple[dict, dict]:
+    """Load the previous graph of diff mode, from Opengraph output files or from a raw snapshot parsed with the options
+    of the current run.
+    :param args: arguments of the command line.
+    :return: nodes keyed by ID, and edges keyed by (kind, start, end)."""
+
+    from idmhound.graph.diff import graph_items, load_opengraph
+    from idmhound.collectors.snapshot import is_raw, load_raw
+    logger = logging.getLogger()
+    if not is_raw(args.diff[0]):
+        logger.info(f"Reading the previous graph from {', '.join(args.diff)}.")
+        return load_opengraph(args.diff)
+    logger.info(f"Parsing the previous graph from {args.diff[0]}.")
+    # The model holds all the entries parsed, the snapshot is read once.
+    data = list(load_raw(args.diff[0]))
+    sid = find_sid(data, args.domain)
+    model, effective = ldap.parse_realm(data, args.domain, sid, args.sudo_model == "compact", effective=args.effective_membership)
+    return graph_items(*model.opengraph(effective))
+
+
+def evaluate_access(args: argparse.Namespace, hbac: list, users: list, computers: list, groups: list, services: list,
+                    options: OutputOptions):
+    """Evaluate the effective HBAC access, save it and answer the access query of the command line.
+    :param args: arguments of the command line.
+    :param hbac: HBAC rules, once resolved.
+    :param users: users of the realm.
+    :param computers: computers of the realm.
+    :param groups: groups and hostgroups of the realm.
+    :param services: HBAC services of the realm.
+    :param options: compression, splitting and parallel encoding of the output file."""
+
+    from idmhound.graph.access import HBACAccess
+    logger = logging.getLogger()
+    with STATS.phase("hbac_access"):
+        access = HBACAccess(hbac, users, computers, groups, services)
+    if args.who_can_access:
+        service, _, host = args.who_can_access.rpartition("/")
+        try:
+            allowed = access.users_of(host, service or None)
+            logger.info(f"{len(allowed)} users can access {host} through {service or 'any service'}: {', '.join(user.get_cn() for user in allowed)}")
+        except KeyError:
+            logger.error(f"Unknown host: {host}")
+    if args.hbac_access:
+        path = f"hbac_access_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+        logger.info(f"Save effective HBAC access to Opengraph file format: {path}")
+        with STATS.phase("serialization"):
+            save_opengraph_access(path, access, options)
+
+
+def find_sid(data: Iterable, realm: str) -> str:
+    """Identify the SID of the realm, as a phase of the run.
+    :param data: LDAP entries to parse.
+    :param realm: name of the realm.
+    :return: SID of the realm."""
 
+    with STATS.phase("sid"):
+        return identify_realm_sid(data, realm)
 
 
+def lookup(index: DNIndex, **subjects: list):
+    """Resolve the member DN of the subjects, each list of subjects being a phase of the run.
+    :param index: index of the principals.
+    :param subjects: lists of subjects, by name."""
 
+    for name, objects in subjects.items():
+        with STATS.phase(f"member_lookup.{name}"):
+            member_lookup(index, objects)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.graph.paths import DEFAULT_KINDS, PathGraph, opengraph_graph, parsed_graph
+from idmhound.graph.utils import identify_realm_sid
+from idmhound.collectors import ldap
+from idmhound.collectors.snapshot import is_raw, load_raw
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+
+def main(argv: list[str] = None):
+
+    parser = argparse.ArgumentParser(prog="idmhound query", add_help=True, description="Answer reachability and shortest path queries offline, on an Opengraph output or a raw snapshot.")
+    parser.add_argument("opengraph", action="store", nargs="*", metavar="OPENGRAPH", help="Files of an Opengraph output (all its files, if split into chunks), possibly compressed.")
+    parser.add_argument("--from-raw", action="store", default="", metavar="SNAPSHOT", help="Parse the LDAP entries of a snapshot file instead of reading an Opengraph output.")
+    parser.add_argument("-d", "--domain", action="store", default="", help="Domain / realm of the snapshot, required with --from-raw.")
+    parser.add_argument("-e", "--effective-membership", action="store_true", default=False, help="Add the EffectiveMemberOf edges when parsing the snapshot.")
+    parser.add_argument("--sudo-model", action="store", choices=["expanded", "compact"], default="expanded", help="Sudo model of the parsed snapshot, as with the collection.")
+    parser.add_argument("--kinds", action="store", nargs="+", default=list(DEFAULT_KINDS), metavar="PATTERN", help=f"Kinds of the edges to traverse, shell-style patterns (default: {' '.join(DEFAULT_KINDS)}).")
+    parser.add_argument("--path", action="append", nargs=2, default=[], metavar=("SOURCE", "TARGET"), help="Find a shortest path from a node to another.")
+    parser.add_argument("--reach", action="append", default=[], metavar="SOURCE", help="List the nodes a node can reach: its groups and the hosts it can access.")
+    parser.add_argument("--who", action="append", default=[], metavar="TARGET", help="List the nodes that can reach a node: the members of a group or the users who can access a host.")
+    parser.add_argument("--type", action="store", nargs="+", default=[], metavar="KIND", help="Only list the nodes of these kinds (User, Group, Computer...).")
+    parser.add_argument("-o", "--output", action="store", default="", metavar="FILE", help="Write the answers to a JSON file.")
+    parser.add_argument("--fail-if-found", action="store_true", default=False, help="Exit with status 1 if a path or a node is found, to use the queries as a policy check.")
+    args = parser.parse_args(argv)
+    if bool(args.opengraph) == bool(args.from_raw):
+        parser.error("either Opengraph files or --from-raw is required")
+    if args.from_raw and not args.domain:
+        parser.error("--from-raw requires -d/--domain")
+    missing = [path for path in args.opengraph + [args.from_raw] if path and not os.path.isfile(path)]
+    if missing:
+        parser.error(f"no such file: {', '.join(missing)}")
+    if args.from_raw and not is_raw(args.from_raw):
+        parser.error(f"{args.from_raw} is not an IDMHound raw snapshot")
+    if not (args.path or args.reach or args.who):
+        parser.error("at least one of --path, --reach or --who is required")
+
+    logging.basicConfig(stream=sys.stdout, encoding="utf-8", filemode="w", level=logging.INFO,
+                        format="{asctime} - {levelname}: {message}", style="{", datefmt="%d-%m-%Y %H:%M:%S")
+    logger = logging.getLogger()
+
+    start = time.perf_counter()
+    graph = load_graph(args)
+    logger.info(f"Loaded {len(graph)} nodes and {graph.edge_count()} edges in {time.perf_counter() - start:.2f} s.")
+
+    answers = []
+    for source, target in args.path:
+        answers.append(answer(graph, "path", lambda: shortest_path(graph, source, target), source=source, target=target))
+    for source in args.reach:
+        answers.append(answer(graph, "reach", lambda: nodes(graph, graph.reachable(source, args.type)), source=source))
+    for target in args.who:
+        answers.append(answer(graph, "who", lambda: nodes(graph, graph.reaching(target, args.type)), target=target))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(answers, output, indent=2)
+        logger.info(f"Answers saved to {args.output}.")
+    if args.fail_if_found and any(query.get("result") for query in answers):
+        sys.exit(1)
+
+
+def load_graph(args: argparse.Namespace) -> PathGraph:
+    """Build the path graph from the Opengraph output or the raw snapshot of the command line.
+    :param args: arguments of the command line.
+    :return: path graph."""
+
+    logger = logging.getLogger()
+    if args.opengraph:
+        logger.info(f"Reading the graph from {', '.join(args.opengraph)}.")
+        return opengraph_graph(args.opengraph, args.kinds)
+    logger.info(f"Parsing the graph from {args.from_raw}.")
+    # The model holds all the entries parsed, the snapshot is read once.
+    data = list(load_raw(args.from_raw))
+    sid = identify_realm_sid(data, args.domain)
+    model, effective = ldap.parse_realm(data, args.domain, sid, args.sudo_model == "compact",
+                                        effective=args.effective_membership)
+    return parsed_graph(*model.opengraph(effective), args.kinds)
+
+
+def answer(graph: PathGraph, query: str, solve, **nodes: str) -> dict:
+    """Answer a query and log the answer.
+    :param graph: path graph.
+    :param query: type of the query: path, reach or who.
+    :param solve: function answering the query.
+    :param nodes: source and target nodes of the query, as given on the command line.
+    :return: query and its result, as a dictionary."""
+
+    logger = logging.getLogger()
+    start = time.perf_counter()
+    try:
+        result = solve()
+    except KeyError as error:
+        logger.error(f"Unknown node: {error.args[0]}")
+        return {"query": query} | nodes | {"error": f"Unknown node: {error.args[0]}"}
+    elapsed = (time.perf_counter() - start) * 1000
+    if query == "path" and result:
+        steps = [graph.describe(graph.find(nodes["source"]))]
+        for edge in result:
+            steps.append(f"-[{edge['kind']}]-> {edge['end']}" if edge["forward"] else f"<-[{edge['kind']}]- {edge['start']}")
+        logger.info(f"Path from {nodes['source']} to {nodes['target']} ({len(result)} edges, {elapsed:.1f} ms): {' '.join(steps)}")
+    elif query == "path":
+        logger.info(f"No path from {nodes['source']} to {nodes['target']} ({elapsed:.1f} ms).")
+    elif query == "reach":
+        logger.info(f"{nodes['source']} can reach {len(result)} nodes ({elapsed:.1f} ms): {', '.join(node['name'] for node in result)}")
+    else:
+        logger.info(f"{len(result)} nodes can reach {nodes['target']} ({elapsed:.1f} ms): {', '.join(node['name'] for node in result)}")
+    return {"query": query} | nodes | {"result": result}
+
+
+def shortest_path(graph: PathGraph, source: str, target: str) -> list[dict]:
+    """Find a shortest path and convert its edges to dictionaries.
+    :param graph: path graph.
+    :param source: ID, DN or name of the start node.
+    :param target: ID, DN or name of the end node.
+    :return: edges of the path, with the names of their nodes and whether the path follows them forward."""
+
+    path, edges = graph.shortest_path(source, target), []
+    previous = graph.find(source)
+    for start, kind, end in path:
+        edges.append({"kind": kind, "start": graph.describe(start), "end": graph.describe(end),
+                      "start_id": graph.nodes[start]["id"], "end_id": graph.nodes[end]["id"], "forward": start == previous})
+        previous = end if start == previous else start
+    return edges
+
+
+def nodes(graph: PathGraph, positions: list[int]) -> list[dict]:
+    """Convert node positions to dictionaries with the ID, name and kinds of the nodes."""
+
+    return [{"id": graph.nodes[position]["id"], "name": graph.describe(position), "kinds": graph.nodes[position]["kinds"]}
+            for position in positions]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+# -*- coding:utf-8 -*-
+
+import json
+import os
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak RSS is then not reported.
+    resource = None
+
+
+def max_rss() -> int | None:
+    """Returns the peak resident set size of the process so far, in bytes."""
+
+    if resource is None:
+        return None
+    # Linux reports kilobytes.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def current_rss() -> int | None:
+    """Returns the current resident set size of the process, in bytes, None where /proc is not available."""
+
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory() -> tuple[int | None, int | None]:
+    """Returns the current and the peak resident set size of the process, in bytes."""
+
+    return current_rss(), max_rss()
+
+
+class Stats():
+    """Collect the wall time, CPU time and memory of the phases of a run, and counters of the parsed objects.
+    Disabled by default, the instrumented code then only pays for a test. Phases may be nested and run several times,
+    their measures are summed and a phase includes the phases nested in it.
+    The memory of a phase is the RSS of the process when it starts and when it ends, and the growth of the peak RSS
+    of the process during the phase, the peak RSS being cumulative. tracemalloc has a single peak for the whole process,
+    so the traced peak is only measured for the phases run by the main thread: the phases run by worker threads, such as
+    the concurrent searches or the realms collected in parallel, would reset it under the phases of the other threads."""
+
+    def __init__(self):
+
+        self.enabled = False
+        self.trace_memory = False
+        self.phases = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, trace_memory: bool = False):
+        """Start collecting statistics.
+        :param trace_memory: also measure the peak of the memory allocated by Python in each phase of the main thread,
+        with tracemalloc."""
+
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory:
+            tracemalloc.start()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure a phase of the run.
+        :param name: name of the phase."""
+
+        if not self.enabled:
+            yield
+            return
+        peaks = self.local.__dict__.setdefault("peaks", [])
+        traced = self.trace_memory and threading.current_thread() is threading.main_thread()
+        if traced:
+            # The peak of the enclosing phase is saved before the peak is reset for this phase.
+            if peaks:
+                peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+            peaks.append(0)
+            tracemalloc.reset_peak()
+        rss = memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = None
+            if traced:
+                peak = max(tracemalloc.get_traced_memory()[1], peaks.pop())
+                if peaks:
+                    peaks[-1] = max(peaks[-1], peak)
+            self.record(name, wall, cpu, peak, rss, memory())
+
+    def timed(self, name: str, items: Iterable) -> Iterable:
+        """Measure the time spent producing the items of a generator, as a phase.
+        :param name: name of the phase.
+        :param items: generator to measure.
+        :return: generator of the same items."""
+
+        if not self.enabled:
+            return items
+        return self.iterate(name, iter(items))
+
+    def iterate(self, name: str, items: Iterator) -> Iterator:
+        """Generator behind timed, the phase is recorded once the generator is exhausted or closed."""
+
+        wall = cpu = 0.0
+        rss = memory()
+        try:
+            while True:
+                start, start_cpu = time.perf_counter(), time.process_time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    wall += time.perf_counter() - start
+                    cpu += time.process_time() - start_cpu
+                yield item
+        finally:
+            self.record(name, wall, cpu, None, rss, memory())
+
+    def record(self, name: str, wall: float, cpu: float, peak: int | None, start: tuple, end: tuple):
+        """Add the measures of a run of a phase.
+        :param name: name of the phase.
+        :param wall: wall time, in seconds.
+        :param cpu: CPU time of the process, in seconds.
+        :param peak: peak of the memory allocated by Python, in bytes.
+        :param start: current and peak RSS of the process when the phase started, in bytes.
+        :param end: current and peak RSS of the process when the phase ended, in bytes."""
+
+        with self.lock:
+            phase = self.phases.setdefault(name, {"calls": 0, "wall_time": 0.0, "cpu_time": 0.0, "rss_start": start[0],
+                                                  "rss_end": None, "max_rss_growth": None})
+            phase["calls"] += 1
+            phase["wall_time"] += wall
+            phase["cpu_time"] += cpu
+            # A phase run several times reports the RSS when its first run started and its last run ended, and the sum
+            # of the growths of the peak RSS.
+            phase["rss_end"] = end[0]
+            if start[1] is not None and end[1] is not None:
+                phase["max_rss_growth"] = (phase["max_rss_growth"] or 0) + end[1] - start[1]
+            if peak is not None:
+                phase["traced_peak"] = max(phase.get("traced_peak", 0), peak)
+
+    def counter(self, name: str) -> Counter | None:
+        """Returns a counter to update, None if the statistics are disabled.
+        :param name: name of the counter.
+        :return: counter."""
+
+        if not self.enabled:
+            return None
+        with self.lock:
+            return self.counters.setdefault(name, Counter())
+
+    def save(self, path: str, realm: str):
+        """Save the statistics to a JSON file.
+        :param path: path of the file.
+        :param realm: name of the realm."""
+
+        report = {"realm": realm, "date": datetime.now().isoformat(timespec="seconds"), "max_rss": max_rss(),
+                  "phases": self.phases, "counters": {name: dict(counter) for name, counter in self.counters.items()}}
+        with open(path, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+# Statistics of the run, shared by the collectors, the parsers and the writers.
+STATS = Stats()
+
+
+if __name__ == "__main__":
+    pass
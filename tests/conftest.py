@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from idmhound.collectors import ldap
+
+REALM = "lab.lo"
+SID = "S-1-5-21-1-2-3"
+SUFFIX = "dc=lab,dc=lo"
+
+
+def user(uid: str) -> tuple:
+
+    return (f"uid={uid},cn=users,cn=accounts,{SUFFIX}",
+            {"uid": [uid], "gecos": [uid.title()], "homeDirectory": [f"/home/{uid}"], "ipaUniqueID": [f"id-{uid}"],
+             "ipaNTSecurityIdentifier": [f"{SID}-{1000 + len(uid)}"], "krbCanonicalName": [f"{uid}@LAB.LO"],
+             "krbPrincipalName": [f"{uid}@LAB.LO"], "loginShell": ["/bin/bash"], "sn": [uid.title()],
+             "uidNumber": [str(1000 + len(uid))], "krbLastPwdChange": ["20240101000000Z"]})
+
+
+def group(cn: str, members: list[str], container: str = "groups") -> tuple:
+
+    return f"cn={cn},cn={container},cn=accounts,{SUFFIX}", {"cn": [cn], "ipaUniqueID": [f"id-{cn}"], "member": members}
+
+
+def computer(fqdn: str) -> tuple:
+
+    return (f"fqdn={fqdn},cn=computers,cn=accounts,{SUFFIX}",
+            {"cn": [fqdn], "ipaUniqueID": [f"id-{fqdn}"], "krbCanonicalName": [f"host/{fqdn}@LAB.LO"],
+             "krbPrincipalName": [f"host/{fqdn}@LAB.LO"], "fqdn": [fqdn]})
+
+
+def service(cn: str) -> tuple:
+
+    return f"cn={cn},cn=hbacservices,cn=hbac,{SUFFIX}", {"cn": [cn], "ipaUniqueID": [f"id-{cn}"]}
+
+
+def rule(name: str, enabled: bool = True, **members: list[str]) -> tuple:
+
+    return (f"ipaUniqueID=id-{name},cn=hbac,{SUFFIX}",
+            {"ipaUniqueID": [f"id-{name}"], "ipaEnabledFlag": ["TRUE" if enabled else "FALSE"]} | members)
+
+
+def dn(entry: tuple) -> str:
+
+    return entry[0]
+
+
+@pytest.fixture
+def entries() -> list:
+    """Small realm: alice is a member of ops through the nested admins group, bob of ops, carol of no group."""
+
+    alice, bob, carol, dave = (user(uid) for uid in ("alice", "bob", "carol", "dave"))
+    admins = group("admins", [dn(alice)])
+    ops = group("ops", [dn(bob), dn(admins)])
+    web01, db01 = computer("web01.lab.lo"), computer("db01.lab.lo")
+    web = group("web", [dn(web01)], "hostgroups")
+    sshd, login = service("sshd"), service("login")
+    domain = (f"cn={REALM},cn=ad,cn=etc,{SUFFIX}",
+              {"cn": [REALM], "ipaNTDomainGUID": ["id-domain"], "ipaNTFlatName": ["LAB"],
+               "ipaNTSecurityIdentifier": [SID]})
+    return [domain, alice, bob, carol, dave, admins, ops, web01, db01, web, sshd, login,
+            rule("ops_web", memberUser=[dn(ops)], memberHost=[dn(web)], memberService=[dn(sshd)]),
+            rule("carol_all", memberUser=[dn(carol)], hostCategory=["all"], serviceCategory=["all"]),
+            rule("dave_all", enabled=False, memberUser=[dn(dave)], hostCategory=["all"], serviceCategory=["all"])]
+
+
+@pytest.fixture
+def model(entries: list):
+    """Model of the small realm, resolved, with its effective membership edges."""
+
+    return ldap.parse_realm(entries, REALM, SID, effective=True)
@@ -0,0 +1,43 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.graph.access import HBACAccess
+
+
+def access(model) -> HBACAccess:
+
+    realm, _ = model
+    return HBACAccess(realm.hbac, realm.users, realm.computers, realm.groups, realm.hbacservices)
+
+
+def test_can_access_through_nested_groups(model):
+
+    evaluation = access(model)
+    assert evaluation.can_access("alice", "web01.lab.lo", "sshd")
+    assert evaluation.can_access("bob", "web01.lab.lo")
+    assert not evaluation.can_access("alice", "web01.lab.lo", "login")
+    assert not evaluation.can_access("alice", "db01.lab.lo")
+
+
+def test_can_access_all_categories(model):
+
+    evaluation = access(model)
+    assert evaluation.can_access("carol", "db01.lab.lo", "login")
+    assert evaluation.can_access("carol", "web01.lab.lo", "sshd")
+    assert not evaluation.can_access("carol", "db01.lab.lo", "ftp")
+    # The rule of dave is disabled.
+    assert not evaluation.can_access("dave", "web01.lab.lo")
+
+
+def test_triples(model):
+
+    triples = {(user.get_cn(), computer.fqdn, service) for user, computer, service in access(model).triples()}
+    assert triples == {("alice", "web01.lab.lo", "sshd"), ("bob", "web01.lab.lo", "sshd"),
+                       ("carol", "web01.lab.lo", "sshd"), ("carol", "web01.lab.lo", "login"),
+                       ("carol", "db01.lab.lo", "sshd"), ("carol", "db01.lab.lo", "login")}
+
+
+def test_users_and_hosts_of(model):
+
+    evaluation = access(model)
+    assert {user.get_cn() for user in evaluation.users_of("web01.lab.lo", "sshd")} == {"alice", "bob", "carol"}
+    assert [computer.fqdn for computer in evaluation.hosts_of("bob")] == ["web01.lab.lo"]
@@ -0,0 +1,80 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from idmhound.collectors import ldap
+from idmhound.collectors.backends import Ldap3Backend, PythonLdapBackend
+
+SID = "S-1-5-21-1-2-3"
+
+# Default HBAC rule of FreeIPA, whose attributes are stored with lowercase names.
+ALLOW_ALL = ("ipaUniqueID=5e3e5a56-1b7f-11ee-a6e2-525400a3e8c1,cn=hbac,dc=lab,dc=lo",
+             {"cn": ["allow_all"], "ipauniqueid": ["5e3e5a56-1b7f-11ee-a6e2-525400a3e8c1"], "ipaenabledflag": [True],
+              "usercategory": ["all"], "hostcategory": ["all"], "servicecategory": ["all"],
+              "accessruletype": ["allow"]})
+
+
+class Connection():
+    """Connection of ldap3 answering every search with the same entries."""
+
+    def __init__(self, entries: list):
+
+        self.response = [{"type": "searchResEntry", "dn": dn, "attributes": attrs} for dn, attrs in entries]
+        self.result = {"result": 0}
+
+    def search(self, **kwargs):
+
+        pass
+
+
+def ldap3_search(entries: list) -> list:
+
+    backend = Ldap3Backend("idm.lab.lo")
+    backend.conn = Connection(entries)
+    return backend.search("cn=hbac,dc=lab,dc=lo", "(ipaEnabledFlag=TRUE)", ["*"])[0]
+
+
+def test_attribute_names_are_canonical():
+
+    (dn, attrs), = ldap3_search([ALLOW_ALL])
+    assert dn == ALLOW_ALL[0]
+    assert {"ipaUniqueID", "ipaEnabledFlag", "userCategory", "hostCategory", "serviceCategory"} <= set(attrs)
+    # The names the parser does not read are kept as returned.
+    assert "accessruletype" in attrs
+
+
+def test_lowercase_rule_is_parsed():
+
+    parsed = ldap.parse(ldap3_search([ALLOW_ALL]), "lab.lo", SID)
+    hbac = parsed[4]
+    assert len(hbac) == 1
+    assert hbac[0].starts_dn == ["all"] and hbac[0].ends_dn == ["all"] and hbac[0].kinds == ["all"]
+
+
+def test_python_ldap_attribute_names_match_ldap3():
+
+    python_ldap = pytest.importorskip("ldap")
+
+    class LDAPObject():
+        """Connection of python-ldap answering every search with the same entries, in a single response."""
+
+        def __init__(self, entries: list):
+
+            self.entries = [(dn, {name: [str(value).upper().encode() if isinstance(value, bool) else value.encode()
+                                         for value in values] for name, values in attrs.items()})
+                            for dn, attrs in entries]
+
+        def search_ext(self, *args, **kwargs):
+
+            return 1
+
+        def result3(self, message, all=1):
+
+            return python_ldap.RES_SEARCH_RESULT, self.entries, message, []
+
+    backend = PythonLdapBackend("idm.lab.lo")
+    backend.conn = LDAPObject([ALLOW_ALL])
+    (dn, attrs), = backend.search("cn=hbac,dc=lab,dc=lo", "(ipaEnabledFlag=TRUE)", ["*"])[0]
+    (_, expected), = ldap3_search([ALLOW_ALL])
+    assert dn == ALLOW_ALL[0]
+    assert list(attrs) == list(expected)
+    assert attrs["ipaEnabledFlag"] == ["TRUE"]
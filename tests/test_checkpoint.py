@@ -0,0 +1,82 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from idmhound.collectors import checkpoint
+
+ENTRIES = [(f"uid=user{index},cn=users,cn=accounts,dc=lab,dc=lo", {"uid": [f"user{index}"]}) for index in range(5)]
+
+
+class Dropped(Exception):
+    """Connection lost."""
+
+
+class TicketExpired(Exception):
+    """Kerberos bind failing with an expired ticket."""
+
+
+class Backend():
+    """Backend whose connections are scripted by the test."""
+
+    @staticmethod
+    def errors() -> tuple:
+
+        return Dropped,
+
+    @staticmethod
+    def kerberos_errors() -> tuple:
+
+        return TicketExpired,
+
+
+class Connection():
+    """Connection returning ENTRIES by pages of two, dropped after a number of pages."""
+
+    bound = True
+
+    def __init__(self, pages: int = None):
+
+        self.pages = pages
+
+    def search(self, base, search_filter, attributes, scope, page_size, cookie):
+
+        if self.pages == 0:
+            raise Dropped("connection reset")
+        if self.pages is not None:
+            self.pages -= 1
+        start = int(cookie or 0)
+        end = start + page_size
+        return ENTRIES[start:end], str(end).encode() if end < len(ENTRIES) else None, 0
+
+    def unbind(self):
+
+        pass
+
+
+def collect(monkeypatch, path: str, connections: list, resume: bool = False) -> list:
+
+    def connect(*args):
+
+        connection = connections.pop(0)
+        if isinstance(connection, Exception):
+            raise connection
+        return connection
+
+    monkeypatch.setitem(checkpoint.BACKENDS, "fake", Backend)
+    monkeypatch.setattr(checkpoint, "connect", connect)
+    return list(checkpoint.collect_resumable(path, "idm01.lab.lo", "dc=lab,dc=lo", krb_auth=True, page_size=2,
+                                             resume=resume, backoff=0, backend="fake"))
+
+
+def test_reconnects_after_a_drop(tmp_path, monkeypatch):
+
+    assert collect(monkeypatch, str(tmp_path / "spool"), [Connection(pages=1), Connection()]) == ENTRIES
+
+
+def test_expired_ticket_stops_and_resumes(tmp_path, monkeypatch):
+
+    path = str(tmp_path / "spool")
+    with pytest.raises(ConnectionError, match="renew"):
+        collect(monkeypatch, path, [Connection(pages=2), TicketExpired("Ticket expired")])
+    # The pages collected before the ticket expired are kept.
+    assert list(checkpoint.load_raw(path)) == ENTRIES[:4]
+    assert collect(monkeypatch, path, [Connection()], resume=True) == ENTRIES
@@ -0,0 +1,41 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.graph.closure import effective_membership, transitive_members
+
+
+class Group():
+    """Group whose members are resolved."""
+
+    def __init__(self, *member):
+
+        self.member = list(member)
+
+
+def test_nested_groups(model):
+
+    realm, _ = model
+    groups = {group.get_cn(): group for group in realm.groups}
+    closure = transitive_members(realm.groups)
+    assert {member.get_cn() for member in closure[groups["admins"]]} == {"alice"}
+    assert {member.get_cn() for member in closure[groups["ops"]]} == {"alice", "bob", "admins"}
+
+
+def test_cycle():
+
+    inner, outer = Group("user1"), Group("user2")
+    inner.member.append(outer)
+    outer.member.append(inner)
+    top = Group(outer, "user3")
+    closure = transitive_members([top, outer, inner])
+    assert set(closure[inner]) == set(closure[outer]) == {inner, outer, "user1", "user2"}
+    assert set(closure[top]) == {inner, outer, "user1", "user2", "user3"}
+
+
+def test_effective_membership_excludes_the_group():
+
+    inner, outer = Group("user1"), Group("user2")
+    inner.member.append(outer)
+    outer.member.append(inner)
+    edges = {edge.ends[0]: edge.starts for edge in effective_membership([inner, outer])}
+    assert set(edges[inner]) == {outer, "user1", "user2"}
+    assert set(edges[outer]) == {inner, "user1", "user2"}
@@ -0,0 +1,49 @@
+# -*- coding:utf-8 -*-
+
+import copy
+from idmhound.collectors import ldap
+from idmhound.graph.diff import GraphDiff, compare, graph_items, load_opengraph
+
+REALM, SID = "lab.lo", "S-1-5-21-1-2-3"
+
+
+def graph(entries: list) -> tuple[dict, dict]:
+
+    model, effective = ldap.parse_realm(entries, REALM, SID)
+    return graph_items(*model.opengraph(effective))
+
+
+def test_compare():
+
+    added, changed, removed = compare({"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 4, "d": 5})
+    assert (added, changed, removed) == ([5], [4], ["c"])
+
+
+def test_unchanged_graph(entries):
+
+    diff = GraphDiff(graph(entries), graph(entries))
+    assert not (diff.added_nodes or diff.changed_nodes or diff.removed_nodes)
+    assert not (diff.added_edges or diff.changed_edges or diff.removed_edges)
+
+
+def test_changed_graph(entries, tmp_path):
+
+    current = copy.deepcopy(entries)
+    users = {attrs["uid"][0]: attrs for dn, attrs in current if "uid" in attrs}
+    users["carol"]["gecos"] = ["Carol Changed"]
+    # dave leaves the realm, bob leaves the ops group.
+    current = [(dn, attrs) for dn, attrs in current if attrs is not users["dave"]]
+    ops = next(attrs for dn, attrs in current if attrs.get("cn") == ["ops"])
+    ops["member"] = [member for member in ops["member"] if not member.startswith("uid=bob,")]
+
+    diff = GraphDiff(graph(entries), graph(current))
+    assert diff.added_nodes == []
+    assert [node["id"] for node in diff.changed_nodes] == ["id-carol"]
+    assert diff.removed_nodes == ["id-dave"]
+    assert diff.added_edges == []
+    assert ("MemberOf", "id-bob", "id-ops") in diff.removed_edges
+    assert all("id-dave" not in (edge["start"]["value"], edge["end"]["value"]) for edge in diff.changed_edges)
+
+    paths = diff.save(str(tmp_path / "diff.json"))
+    nodes, edges = load_opengraph(paths)
+    assert list(nodes) == ["id-carol"] and edges == {}
@@ -0,0 +1,35 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.collectors import ldap
+from idmhound.graph.utils import unique_edges
+
+SUFFIX = "dc=lab,dc=lo"
+
+
+def keys(edges) -> list[tuple]:
+
+    return [(edge["kind"], edge["start"]["value"], edge["end"]["value"]) for edge in unique_edges(edges)]
+
+
+def test_hbac_edges_are_unique(entries):
+
+    # Rule granting carol again a part of what carol_all grants.
+    entries.append((f"ipaUniqueID=id-carol_web,cn=hbac,{SUFFIX}",
+                    {"ipaUniqueID": ["id-carol_web"], "ipaEnabledFlag": ["TRUE"],
+                     "memberUser": [f"uid=carol,cn=users,cn=accounts,{SUFFIX}"],
+                     "memberHost": [f"fqdn=web01.lab.lo,cn=computers,cn=accounts,{SUFFIX}"],
+                     "memberService": [f"cn=sshd,cn=hbacservices,cn=hbac,{SUFFIX}", f"cn=sshd,cn=hbacservices,cn=hbac,{SUFFIX}"]}))
+    model, _ = ldap.parse_realm(entries, "lab.lo", "S-1-5-21-1-2-3")
+    hbac = keys(model.hbac)
+    assert len(hbac) == len(set(hbac))
+    assert set(hbac) == {("HBAC_sshd", "id-ops", "id-web"), ("HBAC_sshd", "id-carol", "id-web01.lab.lo"),
+                         ("HBAC_all", "id-carol", "id-web01.lab.lo"), ("HBAC_all", "id-carol", "id-db01.lab.lo")}
+
+
+def test_membership_edges(model):
+
+    realm, effective = model
+    assert set(keys(realm.membership)) == {("MemberOf", "id-alice", "id-admins"), ("MemberOf", "id-bob", "id-ops"),
+                                           ("MemberOf", "id-admins", "id-ops"),
+                                           ("MemberOf", "id-web01.lab.lo", "id-web")}
+    assert ("EffectiveMemberOf", "id-alice", "id-ops") in keys(effective)
@@ -0,0 +1,50 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.collectors.incremental import StateStore, newest, to_watermark
+from datetime import datetime, timezone
+
+
+def test_merge_and_reload(tmp_path):
+
+    path = str(tmp_path / "lab.state")
+    with StateStore(path) as store:
+        store.update("cn=admins,cn=groups", 2, {"cn": ["admins"]})
+        store.update("uid=alice,cn=users", 1, {"uid": ["alice"]})
+        store.update("uid=bob,cn=users", 1, {"uid": ["bob"]})
+        store.set_watermark("modifyTimestamp", "20240101000000Z", "idm01")
+
+    with StateStore(path) as store:
+        assert store.get_watermark("modifyTimestamp", "idm02") == "20240101000000Z"
+        # A changed entry replaces the stored one, a deleted entry is removed.
+        store.update("uid=alice,cn=users", 1, {"uid": ["alice"], "sn": ["Liddell"]})
+        store.delete(["uid=bob,cn=users"])
+        store.set_watermark("modifyTimestamp", "20240102000000Z", "idm01")
+
+    with StateStore(path) as store:
+        # The entries are in the order of the containers.
+        assert store.entries() == [("uid=alice,cn=users", {"uid": ["alice"], "sn": ["Liddell"]}),
+                                   ("cn=admins,cn=groups", {"cn": ["admins"]})]
+        assert store.get_watermark("entryUSN", "idm01") is None
+
+
+def test_entry_usn_is_local_to_the_server(tmp_path):
+
+    with StateStore(str(tmp_path / "lab.state")) as store:
+        store.set_watermark("entryUSN", "42", "idm01")
+        assert store.get_watermark("entryUSN", "idm01") == "42"
+        assert store.get_watermark("entryUSN", "idm02") is None
+
+
+def test_unreadable_store_is_ignored(tmp_path):
+
+    path = tmp_path / "lab.state"
+    path.write_bytes(b"not a store")
+    with StateStore(str(path)) as store:
+        assert store.entries() == [] and store.get_watermark("modifyTimestamp", "idm01") is None
+
+
+def test_watermarks():
+
+    assert to_watermark([datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)]) == "20240102030405Z"
+    assert newest(["9", "10"], "entryUSN") == "10"
+    assert newest(["20240101000000Z", "20231231000000Z"], "modifyTimestamp") == "20240101000000Z"
@@ -0,0 +1,35 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.graph.index import join_dn, pack, split_dn, unpack
+from idmhound.graph.nodes import User
+
+
+def test_pack_round_trip():
+
+    values = ["uid=alice", "alice", "6a3b9f3c", "", "alice@LAB.LO", "alice@LAB.LO", "alice", "1001"]
+    record = pack(values)
+    assert isinstance(record, str)
+    assert unpack(record) == values
+
+
+def test_pack_control_characters():
+
+    values = ["cn=a", "a\x1fb", "id", ""]
+    assert list(unpack(pack(values))) == values
+
+
+def test_fields():
+
+    user = User("uid=alice,cn=users,cn=accounts,dc=lab,dc=lo", "alice", "Alice", "/home/alice", "6a3b9f3c",
+                "alice@LAB.LO", "alice@LAB.LO", "/bin/bash", "Liddell", "alice", "1001", "S-1-5-21-1")
+    assert (user.cn, user.krbPrincipalName, user.uid, user.uidNumber) == ("alice", "alice@LAB.LO", "alice", "1001")
+    user.set_desc("admin")
+    assert user.desc == "admin" and user.krbCanonicalName == "alice@LAB.LO"
+    assert user.get_dn() == "uid=alice,cn=users,cn=accounts,dc=lab,dc=lo"
+    assert user.to_json()["properties"]["distinguishedname"] == user.get_dn()
+
+
+def test_split_dn():
+
+    assert join_dn(*split_dn("cn=g,cn=groups,dc=lab,dc=lo")) == "cn=g,cn=groups,dc=lab,dc=lo"
+    assert split_dn("dc=lo") == ("dc=lo", None)
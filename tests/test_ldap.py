@@ -0,0 +1,37 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from idmhound.collectors.ldap import classify
+
+SUFFIX = ",dc=lab,dc=lo"
+
+
+@pytest.mark.parametrize("dn, kind", [
+    ("cn=lab.lo,cn=ad,cn=etc", "domain"),
+    ("uid=alice,cn=users,cn=accounts", "user"),
+    ("cn=admins,cn=groups,cn=accounts", "group"),
+    ("cn=web,cn=hostgroups,cn=accounts", "hostgroup"),
+    ("fqdn=web01.lab.lo,cn=computers,cn=accounts", "computer"),
+    ("krbprincipalname=HTTP/web01.lab.lo@LAB.LO,cn=services,cn=accounts", "service"),
+    ("ipaUniqueID=5e3e5a56,cn=hbac", "hbac"),
+    ("cn=Sudo,cn=hbacservicegroups,cn=hbac", "hbacservicegroup"),
+    ("cn=sshd,cn=hbacservices,cn=hbac", "hbacservice"),
+    ("ipaUniqueID=6a3b9f3c,cn=sudorules,cn=sudo", "sudorule"),
+    ("cn=docker,cn=sudocmdgroups,cn=sudo", "sudocmdgroup"),
+    ("ipaUniqueID=7c4d0a4d,cn=sudocmds,cn=sudo", "sudocmd"),
+])
+def test_classify(dn, kind):
+
+    assert classify(dn + SUFFIX, SUFFIX) == kind
+
+
+@pytest.mark.parametrize("dn", [
+    "cn=users,cn=accounts" + SUFFIX,
+    "cn=admins,cn=groups,cn=accounts,dc=other,dc=lo",
+    "uid=alice,cn=staged users,cn=accounts,cn=provisioning" + SUFFIX,
+    "cn=alice,cn=users,cn=accounts" + SUFFIX,
+    "dc=lab,dc=lo",
+])
+def test_classify_unmatched(dn):
+
+    assert classify(dn, SUFFIX) is None
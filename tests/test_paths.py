@@ -0,0 +1,51 @@
+# -*- coding:utf-8 -*-
+
+from idmhound.collectors import ldap
+from idmhound.graph.paths import parsed_graph
+
+
+def graph(model):
+
+    realm, effective = model
+    return parsed_graph(*realm.opengraph(effective))
+
+
+def names(graph, positions: list[int]) -> set:
+
+    return {graph.describe(position) for position in positions}
+
+
+def path(graph, source: str, target: str) -> list[tuple]:
+
+    return [(graph.describe(start), kind, graph.describe(end)) for start, kind, end in graph.shortest_path(source, target)]
+
+
+def test_shortest_path_through_a_hostgroup(model):
+
+    # ops accesses the web hostgroup, web01 is a member of web.
+    assert path(graph(model), "alice", "web01.lab.lo") == [("alice@LAB.LO", "EffectiveMemberOf", "ops"),
+                                                           ("ops", "HBAC_sshd", "web"),
+                                                           ("web01.lab.lo", "MemberOf", "web")]
+
+
+def test_shortest_path_through_nested_groups(entries):
+
+    paths = graph(ldap.parse_realm(entries, "lab.lo", "S-1-5-21-1-2-3"))
+    assert path(paths, "alice", "web01.lab.lo") == [("alice@LAB.LO", "MemberOf", "admins"), ("admins", "MemberOf", "ops"),
+                                                    ("ops", "HBAC_sshd", "web"), ("web01.lab.lo", "MemberOf", "web")]
+
+
+def test_reachable_and_reaching(model):
+
+    paths = graph(model)
+    assert names(paths, paths.reachable("alice", ["Computer"])) == {"web01.lab.lo"}
+    assert names(paths, paths.reachable("carol", ["Computer"])) == {"web01.lab.lo", "db01.lab.lo"}
+    assert {paths.nodes[position]["properties"]["uid"] for position in paths.reaching("web01.lab.lo", ["User"])} == \
+           {"alice", "bob", "carol"}
+    assert paths.reaching("db01.lab.lo", ["Group"]) == []
+
+
+def test_no_path(model):
+
+    paths = graph(model)
+    assert paths.shortest_path("dave", "web01.lab.lo") == []
@@ -0,0 +1,62 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from idmhound.collectors import ldap, realms
+
+REALM = "lab.lo"
+SID = "S-1-5-21-1-2-3"
+
+
+def write(tmp_path, config: str) -> str:
+
+    path = tmp_path / "realms.toml"
+    path.write_text(config)
+    return str(path)
+
+
+def test_load_realms(tmp_path):
+
+    path = write(tmp_path, '[[realm]]\ndomain = "lab.lo"\ndomain_controller = "idm01.lab.lo"\nreplicas = ["idm02.lab.lo"]\n'
+                           '[[realm]]\ndomain = "dev.lo"\ndomain_controller = "idm01.dev.lo"\n')
+    lab, dev = realms.load_realms(path)
+    assert lab["replicas"] == ["idm02.lab.lo"] and dev["replicas"] == [] and dev["kerberos"] is False
+
+
+def test_duplicate_realm_is_rejected(tmp_path):
+
+    path = write(tmp_path, '[[realm]]\ndomain = "lab.lo"\ndomain_controller = "idm01.lab.lo"\n'
+                           '[[realm]]\ndomain = "LAB.LO"\ndomain_controller = "idm02.lab.lo"\n')
+    with pytest.raises(ValueError, match="several times"):
+        realms.load_realms(path)
+
+
+def test_duplicate_ids_are_rejected(entries, monkeypatch):
+
+    def collect_realm(realm, *args):
+
+        model, effective = ldap.parse_realm(entries, REALM, SID)
+        return model.opengraph(effective)
+
+    monkeypatch.setattr(realms, "collect_realm", collect_realm)
+    nodes, _ = realms.collect_realms([{"domain": REALM}])
+    assert len({node.get_id() for node in nodes}) == len(nodes)
+    # The same realm under two names.
+    with pytest.raises(ValueError, match="same ID"):
+        realms.collect_realms([{"domain": REALM}, {"domain": "alias.lo"}])
+
+
+def test_replicas_imply_targeted(monkeypatch):
+
+    calls = []
+
+    def collect_with_sid(server, base, username, password, krb_auth, domain, page_size, targeted, workers, replicas,
+                         backend):
+
+        calls.append((base, targeted, replicas))
+        raise ConnectionError
+
+    monkeypatch.setattr(ldap, "collect_with_sid", collect_with_sid)
+    realm = realms.SETTINGS | {"domain": REALM, "domain_controller": "idm01.lab.lo", "replicas": ["idm02.lab.lo"]}
+    with pytest.raises(ConnectionError):
+        realms.collect_realm(realm, targeted=False)
+    assert calls == [("dc=lab,dc=lo", True, ["idm02.lab.lo"])]
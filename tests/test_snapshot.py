@@ -0,0 +1,35 @@
+# -*- coding:utf-8 -*-
+
+import pytest
+from datetime import datetime, timezone
+from idmhound.collectors.snapshot import is_raw, load_raw, save_raw
+
+
+def test_round_trip(tmp_path, entries):
+
+    path = str(tmp_path / "lab.raw")
+    # Values as formatted by ldap3: datetimes, bytes and single values.
+    entries = entries + [("cn=raw,dc=lab,dc=lo", {"modifyTimestamp": [datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)],
+                                                  "ipaNTSecurityIdentifier": "S-1-5-21-1-2-3-1000",
+                                                  "jpegPhoto": [b"\xff\xd8\xff\x00"], "description": ["été"]})]
+    assert save_raw(path, entries) == entries
+    assert is_raw(path)
+    assert list(load_raw(path)) == entries
+
+
+def test_streamed_entries(tmp_path, entries):
+
+    path = str(tmp_path / "lab.raw")
+    # A generator is written as it is consumed.
+    assert list(save_raw(path, iter(entries))) == entries
+    assert list(load_raw(path)) == entries
+
+
+@pytest.mark.parametrize("content", [b"", b'{"graph": {}}'])
+def test_not_a_snapshot(tmp_path, content):
+
+    path = tmp_path / "lab.json"
+    path.write_bytes(content)
+    assert not is_raw(str(path))
+    with pytest.raises(ValueError):
+        list(load_raw(str(path)))
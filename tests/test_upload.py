@@ -0,0 +1,86 @@
+# -*- coding:utf-8 -*-
+
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from idmhound.graph.upload import BloodHoundClient, Uploader
+
+
+class Handler(BaseHTTPRequestHandler):
+    """File upload API of BloodHound CE, failing the first request of each file with 503."""
+
+    def do_POST(self):
+
+        body = self.rfile.read(int(self.headers["Content-Length"] or 0))
+        self.server.requests.append((self.path, self.headers.get("Authorization"), body))
+        if not self.path.startswith("/api/v2/file-upload/"):
+            self.reply(404)
+        elif self.path.endswith("/start"):
+            self.reply(200, {"data": {"id": 7}})
+        elif self.path.endswith("/end"):
+            self.reply(200)
+        elif self.server.failures.pop(body, 0):
+            self.reply(503)
+        else:
+            self.reply(202)
+
+    def reply(self, status: int, data: dict = None):
+
+        body = json.dumps(data).encode() if data else b""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+
+        pass
+
+
+@pytest.fixture
+def server():
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.requests, server.failures = [], {}
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server, **kwargs) -> BloodHoundClient:
+
+    return BloodHoundClient(f"http://127.0.0.1:{server.server_port}/", backoff=0, **kwargs)
+
+
+def test_upload_job(server):
+
+    server.failures[b'{"nodes": 2}'] = 1
+    with Uploader(client(server, token_id="id", token_key="key")) as uploader:
+        uploader.submit("part 1", b'{"nodes": 1}')
+        uploader.submit("part 2", b'{"nodes": 2}')
+    paths = [path for path, _, _ in server.requests]
+    assert paths[0] == "/api/v2/file-upload/start" and paths[-1] == "/api/v2/file-upload/7/end"
+    # The file failing with 503 is sent again.
+    assert sorted(body for path, _, body in server.requests if path == "/api/v2/file-upload/7") == \
+           [b'{"nodes": 1}', b'{"nodes": 2}', b'{"nodes": 2}']
+    assert all(authorization == "bhesignature id" for _, authorization, _ in server.requests)
+
+
+def test_failed_run_does_not_end_the_job(server):
+
+    with pytest.raises(RuntimeError):
+        with Uploader(client(server, jwt="token")) as uploader:
+            uploader.submit("part 1", b'{"nodes": 1}')
+            raise RuntimeError
+    assert "/api/v2/file-upload/7/end" not in [path for path, _, _ in server.requests]
+    assert server.requests[0][1] == "Bearer token"
+
+
+def test_client_errors_are_not_retried(server):
+
+    with pytest.raises(ConnectionError, match="404"):
+        client(server).request("POST", "/api/v2/missing")
+    assert len(server.requests) == 1